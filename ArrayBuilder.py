@@ -0,0 +1,146 @@
+# from HFSS_Python.HFSSLibrary import getEditor, getObjectRegistry, flushBooleans, name_handler # <--- uncomment this if importing submodule
+# from HFSS_Python.EmagDevices import rectangular_patch # <--- uncomment this if importing submodule
+from HFSSLibrary import getEditor, getObjectRegistry, flushBooleans, name_handler # <-- Comment this out if importing submodule
+from EmagDevices import rectangular_patch # <-- Comment this out if importing submodule
+
+#Arrays built from one element
+#The element (substrate, patch, feed, subtractions, boundaries and port) is drawn
+#once and then copied by a single DuplicateAlongLine/DuplicateAroundAxis per array
+#axis. DuplicateAssignments copies its ports and boundaries along with the
+#objects, so an N element array costs a handful of COM calls instead of N builds.
+#
+#HFSS names the copies of X as X_1, X_2... taking the next free suffix, copied
+#ports and boundaries are named the same way. The builders return those names
+#as one ArrayElement per copy, the original element first. Object names come from
+#the design's ObjectRegistry, port and boundary names from the element's own.
+#
+#	element = patchElement(oDesign, 28.6, 38, 8.3, 0, 60, 71, 1.5748, "FR4_epoxy", "mm", "Global", "Patch")
+#	elements = linearArray(oDesign, element, [60, 0, 0], 8, "mm")
+#	edit_sources(oDesign, portNames(elements), ...)
+
+
+#Names making up one element of an array
+class ArrayElement(object):
+
+	def __init__(self, objects, ports=(), boundaries=()):
+		self.objects = list(objects)
+		self.ports = list(ports)
+		self.boundaries = list(boundaries)
+
+	def __repr__(self):
+		return '<ArrayElement objects=%r ports=%r boundaries=%r>' % (self.objects, self.ports, self.boundaries)
+
+
+#Draws one rectangular_patch and names its boundaries, ready to be duplicated
+def patchElement(oDesign, patch_length, patch_width, probe_x, probe_y, substrate_length, substrate_width, substrate_height, substrate_material, units, cs, name):
+	[excitation, object_names] = rectangular_patch(oDesign, patch_length, patch_width, probe_x, probe_y, substrate_length,
+												   substrate_width, substrate_height, substrate_material, units, cs, name)
+	#Patch, ground plane and outer conductor of the feed carry finite conductivity boundaries
+	boundaries = ["Bound_"+name, "Bound_"+object_names[2], "Bound_"+object_names[4]]
+	#The wave port sheet is named like its port and has to be copied with the rest
+	return ArrayElement(object_names + [excitation], [excitation], boundaries)
+
+#Ports of every element, in array order, e.g. the source list of edit_sources
+def portNames(elements):
+	return [port for element in elements for port in element.ports]
+
+
+#Copies element count-1 times along vector
+#Returns the count elements of the line, element first
+def linearArray(oDesign, element, vector, count, units):
+	copies = _duplicateAlongLine(oDesign, [element], vector, count, units)
+	return [element] + [copy[0] for copy in copies]
+
+#Copies element along vector_1 and the resulting row along vector_2
+#Returns rows[j][i], element j along vector_2 and i along vector_1
+def gridArray(oDesign, element, vector_1, count_1, vector_2, count_2, units):
+	row = linearArray(oDesign, element, vector_1, count_1, units)
+	copies = _duplicateAlongLine(oDesign, row, vector_2, count_2, units)
+	return [row] + copies
+
+#Copies element count-1 times around axis ("X", "Y" or "Z" of the working CS)
+#angle between neighbours defaults to a full circle, as for the cylindrical arrays
+#Returns the count elements of the circle, element first
+def circularArray(oDesign, element, axis, count, angle=None):
+	if angle is None:
+		angle = 360.0/count
+	[angle_str, name] = name_handler(oDesign, [angle], 'deg', '')
+	oEditor = getEditor(oDesign)
+	flushBooleans(oDesign, element.objects)
+	copies = _copyNames(oDesign, [element], count)[0]
+	oEditor.DuplicateAroundAxis(
+		[
+			"NAME:Selections",
+			"Selections:="	, _selections([element]),
+			"NewPartsModelFlag:="	, "Model"
+		],
+		[
+			"NAME:DuplicateAroundAxisParameters",
+			"CreateNewObjects:="	, True,
+			"WhichAxis:="		, axis,
+			"AngleStr:="		, angle_str,
+			"NumClones:="		, str(count)
+		],
+		[
+			"NAME:Options",
+			"DuplicateAssignments:=", True
+		])
+	return [element] + copies
+
+
+#One DuplicateAlongLine for all objects of elements
+#Returns copies[k][e], copy k+1 of elements[e]
+def _duplicateAlongLine(oDesign, elements, vector, count, units):
+	[xStr, yStr, zStr, name] = name_handler(oDesign, vector, units, '')
+	oEditor = getEditor(oDesign)
+	flushBooleans(oDesign, [name for element in elements for name in element.objects])
+	per_element = _copyNames(oDesign, elements, count)
+	oEditor.DuplicateAlongLine(
+		[
+			"NAME:Selections",
+			"Selections:="	, _selections(elements),
+			"NewPartsModelFlag:="	, "Model"
+		],
+		[
+			"NAME:DuplicateToAlongLineParameters",
+			"CreateNewObjects:="	, True,
+			"XComponent:="		, xStr,
+			"YComponent:="		, yStr,
+			"ZComponent:="		, zStr,
+			"NumClones:="		, str(count)
+		],
+		[
+			"NAME:Options",
+			"DuplicateAssignments:=", True
+		])
+	return [list(copy) for copy in zip(*per_element)] if per_element else []
+
+def _selections(elements):
+	return ",".join(name for element in elements for name in element.objects)
+
+#Names HFSS gives the count-1 copies of each element, per element
+#Taken before the duplicate is made, the copies must not count as existing names
+def _copyNames(oDesign, elements, count):
+	objects = getObjectRegistry(oDesign)
+	taken_assignments = set(name for element in elements for name in element.ports + element.boundaries)
+	copies = []
+	for element in elements:
+		object_clones = [[objects.cloneName(name) for k in range(count-1)] for name in element.objects]
+		ports = [_cloneNames(taken_assignments, name, count-1) for name in element.ports]
+		boundaries = [_cloneNames(taken_assignments, name, count-1) for name in element.boundaries]
+		copies.append([ArrayElement([clones[k] for clones in object_clones],
+									[clones[k] for clones in ports],
+									[clones[k] for clones in boundaries]) for k in range(count-1)])
+	return copies
+
+#Next free name_1, name_2... for the copied ports and boundaries
+def _cloneNames(taken, name, count):
+	clones = []
+	suffix = 1
+	for k in range(count):
+		while '%s_%d' % (name, suffix) in taken:
+			suffix += 1
+		clone = '%s_%d' % (name, suffix)
+		taken.add(clone)
+		clones.append(clone)
+	return clones
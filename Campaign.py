@@ -0,0 +1,258 @@
+import os
+import itertools
+import threading
+import traceback
+import socket
+from multiprocessing.connection import Listener, Client
+
+try:
+	import pandas as pd
+except ImportError:
+	#Only needed to hand tables in and results out as DataFrames
+	pd = None
+
+#Parametric campaigns spread over worker machines
+#A Campaign takes a table of design-variable combinations (list of dicts, dict
+#of columns or DataFrame), splits it into jobs of chunk_size rows and hands
+#them to workers connecting over multiprocessing.connection (TCP, authkey).
+#Each worker runs evaluate(row) for the rows of its job, typically building
+#and solving the design on its own HFSS desktop and returning the exported
+#results. Failed jobs, and jobs of workers that disconnect, are retried up to
+#max_retries times; the results of every row are merged at the end, rows of
+#jobs that failed for good carry the error instead.
+#
+#Connections unpickle what they receive, so anyone holding the authkey can run
+#code on the scheduler and the workers. The scheduler listens on localhost unless
+#given another address, and the authkey has to be a secret shared with the workers:
+#
+#	authkey = os.urandom(32)		# handed to the workers out of band
+#	On the scheduler:	results = Campaign(table, chunk_size=4).serve(('0.0.0.0', 6000), authkey)
+#	On each worker:	runWorker(('scheduler-host', 6000), authkey, solve_variation)
+
+#Key under which the rows of failed jobs carry the error of their last attempt
+ERROR_KEY = 'error'
+
+
+#Full factorial table: product(length=[1, 2], width=[3, 4]) gives 4 rows
+def product(**variables):
+	names = list(variables)
+	return [dict(zip(names, values)) for values in itertools.product(*(variables[name] for name in names))]
+
+def _tableRows(table):
+	if hasattr(table, 'to_dict'):
+		return table.to_dict('records')
+	if isinstance(table, dict):
+		names = list(table)
+		return [dict(zip(names, values)) for values in zip(*(table[name] for name in names))]
+	return [dict(row) for row in table]
+
+
+class CampaignJob(object):
+
+	def __init__(self, job_id, rows):
+		self.job_id = job_id
+		self.rows = rows
+		self.attempts = 0
+		self.results = None
+		self.errors = []
+
+
+class Campaign(object):
+
+	def __init__(self, table, chunk_size=1, max_retries=2):
+		rows = _tableRows(table)
+		self.jobs = [CampaignJob(job_id, rows[start:start+chunk_size])
+					 for job_id, start in enumerate(range(0, len(rows), chunk_size))]
+		self.max_retries = max_retries
+		self.pending = list(reversed(self.jobs))
+		self.running = {}
+		self.failed = []
+		self.condition = threading.Condition()
+		self.listener = None
+		self.authkey = None
+
+	#Every job has results or has run out of retries
+	def finished(self):
+		return len(self.running) == 0 and len(self.pending) == 0
+
+	def progress(self):
+		with self.condition:
+			done = sum(1 for job in self.jobs if job.results is not None)
+			return {'jobs': len(self.jobs), 'done': done, 'running': len(self.running),
+					'pending': len(self.pending), 'failed': len(self.failed)}
+
+	#Next job for a worker, None once the campaign is finished
+	#Waits while the remaining jobs are running, they may still come back for a retry
+	def nextJob(self):
+		with self.condition:
+			while not self.pending and self.running:
+				self.condition.wait()
+			if not self.pending:
+				return None
+			job = self.pending.pop()
+			job.attempts += 1
+			self.running[job.job_id] = job
+			return job
+
+	def complete(self, job, results):
+		with self.condition:
+			del self.running[job.job_id]
+			job.results = results
+			self.condition.notify_all()
+
+	def fail(self, job, error):
+		with self.condition:
+			del self.running[job.job_id]
+			job.errors.append(error)
+			if job.attempts <= self.max_retries:
+				self.pending.append(job)
+			else:
+				self.failed.append(job)
+			self.condition.notify_all()
+
+	#Talks to one worker until the campaign is finished or the worker goes away
+	def handle(self, connection):
+		job = None
+		try:
+			while True:
+				message = connection.recv()
+				if message[0] == 'done':
+					self.complete(job, message[2])
+					job = None
+				elif message[0] == 'failed':
+					self.fail(job, message[2])
+					job = None
+				job = self.nextJob()
+				if job is None:
+					connection.send(('stop',))
+					break
+				connection.send(('job', job.job_id, job.rows))
+		except (EOFError, OSError):
+			if job is not None:
+				self.fail(job, 'worker disconnected')
+		finally:
+			connection.close()
+
+	def accept(self):
+		while True:
+			try:
+				connection = self.listener.accept()
+			except OSError:
+				break
+			except Exception:
+				#Failed handshake, or the wake-up connection made by wait()
+				connection = None
+			with self.condition:
+				if self.finished():
+					if connection is not None:
+						connection.close()
+					break
+			if connection is None:
+				continue
+			thread = threading.Thread(target=self.handle, args=(connection,))
+			thread.daemon = True
+			thread.start()
+
+	#Listens on address until every job is done or has failed for good, then returns results()
+	#Workers on other machines need authkey, so it has to be given
+	def serve(self, address=('localhost', 6000), authkey=None):
+		if not authkey:
+			raise ValueError('serve needs the authkey shared with the workers')
+		self.start(address, authkey)
+		return self.wait()
+
+	#Starts listening and returns the address; without an authkey a random one is made (self.authkey)
+	def start(self, address=('localhost', 0), authkey=None):
+		self.authkey = authkey or os.urandom(32)
+		self.listener = Listener(address, authkey=self.authkey)
+		thread = threading.Thread(target=self.accept)
+		thread.daemon = True
+		thread.start()
+		return self.listener.address
+
+	def wait(self):
+		with self.condition:
+			while not self.finished():
+				self.condition.wait()
+		#Wake up the accept loop so it can see the campaign is over
+		try:
+			with socket.create_connection(self.listener.address[:2], timeout=1):
+				pass
+		except OSError:
+			pass
+		self.listener.close()
+		return self.results()
+
+	#Runs the campaign with in-process workers, each one a thread calling evaluate(row)
+	def runLocal(self, evaluate, workers=2):
+		address = self.start(('localhost', 0))
+		threads = []
+		for index in range(workers):
+			thread = threading.Thread(target=runWorker, args=(address, self.authkey, evaluate, 'local%d' % index))
+			thread.daemon = True
+			thread.start()
+			threads.append(thread)
+		results = self.wait()
+		for thread in threads:
+			thread.join()
+		return results
+
+	#One dict per result, the variables of its row merged with what evaluate returned
+	#evaluate may return a dict, a list of dicts (e.g. the rows of an exported
+	#report) or a DataFrame; other values are stored under 'result'
+	#Rows of jobs that failed for good are kept, with their last error under ERROR_KEY
+	def results(self):
+		merged = []
+		for job in self.jobs:
+			if job.results is None:
+				if job in self.failed:
+					for row in job.rows:
+						entry = dict(row)
+						entry[ERROR_KEY] = job.errors[-1]
+						merged.append(entry)
+				continue
+			for row, result in zip(job.rows, job.results):
+				if hasattr(result, 'to_dict'):
+					result = result.to_dict('records')
+				if isinstance(result, dict):
+					result = [result]
+				elif not isinstance(result, list):
+					result = [{'result': result}]
+				for record in result:
+					entry = dict(row)
+					entry.update(record)
+					merged.append(entry)
+		return merged
+
+	def dataframe(self):
+		if pd is None:
+			raise ImportError('pandas is required for Campaign.dataframe')
+		return pd.DataFrame(self.results())
+
+
+#Worker loop: asks the scheduler for jobs and runs evaluate(row) on their rows
+#until told to stop. A row that raises fails the whole job, which is then retried.
+#Returns when the scheduler stops it, has finished or can not be reached.
+def runWorker(address, authkey, evaluate, name=None):
+	try:
+		connection = Client(address, authkey=authkey)
+	except OSError:
+		#Refused or reset: the campaign is already over
+		return
+	try:
+		connection.send(('ready', name))
+		while True:
+			message = connection.recv()
+			if message[0] == 'stop':
+				break
+			job_id, rows = message[1], message[2]
+			try:
+				results = [evaluate(row) for row in rows]
+			except Exception:
+				connection.send(('failed', job_id, traceback.format_exc()))
+			else:
+				connection.send(('done', job_id, results))
+	except (EOFError, OSError):
+		pass
+	finally:
+		connection.close()
@@ -0,0 +1,182 @@
+import threading
+import atexit
+import queue
+
+try:
+	import pythoncom
+except ImportError:
+	#Only on Windows; the worker then runs without initialising a COM apartment
+	pythoncom = None
+
+#Pipelined COM calls
+#A ComDispatcher owns one worker thread (and COM apartment) that makes every COM
+#call in the order it was submitted. Library calls return immediately with a
+#PendingValue, so the Python side of a build (dual quaternion maths, name_handler,
+#patch design) computes element N+1 while element N is still being sent to HFSS.
+#A PendingValue acts as the object it resolves to: calling a method on it queues
+#the call, indexing it gives another PendingValue, and only operations that need
+#the actual value (iterating, len, int, str, result()) wait for the worker.
+
+
+class PipelineError(Exception):
+	"A queued COM call failed"
+
+
+#Replaces PendingValues inside call arguments by their values, runs on the worker
+def _resolveArgs(args):
+	resolved = []
+	for arg in args:
+		if isinstance(arg, PendingValue):
+			arg = arg.result()
+		elif isinstance(arg, list):
+			arg = _resolveArgs(arg)
+		elif isinstance(arg, tuple):
+			arg = tuple(_resolveArgs(arg))
+		resolved.append(arg)
+	return resolved
+
+
+class ComDispatcher(object):
+
+	def __init__(self, maxsize=0):
+		self.calls = queue.Queue(maxsize)
+		#First failure of a call nobody waited on, raised by the next submit or drain
+		#Set by the worker and cleared by the caller's thread, always under lock
+		self.error = None
+		self.lock = threading.Lock()
+		self.closed = False
+		self.thread = threading.Thread(target=self.run, name='HFSS COM dispatcher')
+		self.thread.daemon = True
+		self.thread.start()
+		#Calls still queued when the script ends must reach HFSS
+		atexit.register(self.close)
+
+	def run(self):
+		if pythoncom is not None:
+			pythoncom.CoInitialize()
+		try:
+			while True:
+				item = self.calls.get()
+				if item is None:
+					self.calls.task_done()
+					break
+				function, pending = item
+				try:
+					pending._set(function(), None)
+				except Exception as error:
+					with self.lock:
+						if self.error is None:
+							self.error = error
+					pending._set(None, error)
+				self.calls.task_done()
+		finally:
+			if pythoncom is not None:
+				pythoncom.CoUninitialize()
+
+	def raiseError(self):
+		with self.lock:
+			error = self.error
+			self.error = None
+		if error is not None:
+			raise PipelineError('queued COM call failed: %s' % error) from error
+
+	#Forgets error if it is the one waiting to be raised, its caller has seen it
+	def clearError(self, error):
+		with self.lock:
+			if self.error is error:
+				self.error = None
+
+	#Queues function() on the worker and returns its PendingValue
+	def call(self, function):
+		if self.closed:
+			raise PipelineError('dispatcher is closed')
+		self.raiseError()
+		pending = PendingValue(self)
+		self.calls.put((function, pending))
+		return pending
+
+	#Queues obj.method(*args); obj may itself be a PendingValue
+	def callMethod(self, obj, method, args):
+		def function():
+			target = obj.result() if isinstance(obj, PendingValue) else obj
+			return getattr(target, method)(*_resolveArgs(args))
+		return self.call(function)
+
+	#Waits until every queued call has been made
+	def drain(self):
+		self.calls.join()
+		self.raiseError()
+
+	def close(self):
+		if not self.closed:
+			self.closed = True
+			self.calls.put(None)
+			self.thread.join()
+			self.raiseError()
+
+
+#Result of a queued call, see the module comment
+class PendingValue(object):
+
+	def __init__(self, dispatcher):
+		self._dispatcher = dispatcher
+		self._event = threading.Event()
+		self._value = None
+		self._error = None
+
+	def _set(self, value, error):
+		self._value = value
+		self._error = error
+		self._event.set()
+
+	def done(self):
+		return self._event.is_set()
+
+	#Waits for the call and returns its value, raising its error if it failed
+	def result(self, timeout=None):
+		if not self._event.wait(timeout):
+			raise TimeoutError('COM call still pending')
+		if self._error is not None:
+			#The caller has seen this error, do not report it again
+			self._dispatcher.clearError(self._error)
+			raise self._error
+		return self._value
+
+	#PendingValue of function(value), computed on the worker once this value is known
+	def then(self, function):
+		return self._dispatcher.call(lambda: function(self.result()))
+
+	def __getattr__(self, method):
+		if method.startswith('_'):
+			raise AttributeError(method)
+		dispatcher = self._dispatcher
+		def call(*args):
+			return dispatcher.callMethod(self, method, args)
+		call.__name__ = method
+		return call
+
+	def __getitem__(self, index):
+		return self.then(lambda value: value[index])
+
+	def __iter__(self):
+		return iter(self.result())
+
+	def __len__(self):
+		return len(self.result())
+
+	def __int__(self):
+		return int(self.result())
+
+	def __float__(self):
+		return float(self.result())
+
+	def __bool__(self):
+		return bool(self.result())
+
+	def __str__(self):
+		return str(self.result())
+
+	def __repr__(self):
+		if self.done():
+			return '<PendingValue %r>' % (self._error or self._value,)
+		return '<PendingValue pending>'
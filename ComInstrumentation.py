@@ -0,0 +1,216 @@
+import sys
+import time
+import json
+import csv
+import bisect
+import threading
+
+#Opt-in instrumentation of the COM objects handed out by openHFSS
+#Wrap oAnsys/oDesktop with a ComProfiler and every object they return (projects,
+#designs, editors, modules) is wrapped as well, so each COM call is counted,
+#timed and attributed to the library function that made it.
+
+#Modules whose functions COM calls are attributed to
+LIBRARY_MODULES = {'HFSSLibrary', 'EmagDevices', 'ArrayBuilder', 'Optimetrics', 'GeometryIR', 'Curves'}
+
+#Library functions that only hand out handles, calls are attributed to their caller
+PASSTHROUGH_FUNCTIONS = {'getEditor', 'getModule', 'getDesignContext', 'getVariableCache', 'getProperties'}
+
+#Modules between library frames that do not end the library part of the stack (with blocks)
+_TRANSPARENT_MODULES = {'contextlib'}
+
+#Upper edges of the latency histogram buckets in seconds, the last bucket is open ended
+HISTOGRAM_BUCKETS = (1e-4, 3e-4, 1e-3, 3e-3, 1e-2, 3e-2, 1e-1, 3e-1, 1.0, 3.0, 10.0)
+
+#Return values of these types are plain data, anything else is a COM object and gets wrapped
+_PLAIN_TYPES = (str, bytes, int, float, bool, complex, list, tuple, dict, type(None))
+
+#Name given to the objects returned by these methods, so stats read "oEditor.CreateBox"
+_RETURNED_NAMES = {
+	'GetAppDesktop': 'oDesktop',
+	'NewProject': 'oProject',
+	'SetActiveProject': 'oProject',
+	'GetActiveProject': 'oProject',
+	'GetProjects': 'oProject',
+	'InsertDesign': 'oDesign',
+	'SetActiveDesign': 'oDesign',
+	'GetActiveDesign': 'oDesign',
+	'SetActiveEditor': 'oEditor',
+	'GetActiveEditor': 'oEditor',
+	'GetModule': 'oModule',
+}
+
+
+#Stands in for a COM object and sends every method call through observer.call
+#The observer decides what happens: time it, record it, queue it...
+class ComProxy(object):
+
+	def __init__(self, target, observer, name):
+		self._target = target
+		self._observer = observer
+		self._name = name
+
+	def __getattr__(self, method):
+		#COM methods never start with an underscore, this also guards against lookups before __init__
+		if method.startswith('_'):
+			raise AttributeError(method)
+		attribute = getattr(self._target, method)
+		if not callable(attribute):
+			return attribute
+		observer = self._observer
+		def call(*args):
+			return observer.call(self, method, attribute, args)
+		call.__name__ = method
+		return call
+
+	def __repr__(self):
+		return '<%s %s of %r>' % (type(self).__name__, self._name, self._target)
+
+
+#Wraps obj so its COM calls, and those of every object it returns, go through observer
+def instrument(obj, observer, name='oDesktop'):
+	return ComProxy(obj, observer, name)
+
+def isComObject(value):
+	return not isinstance(value, _PLAIN_TYPES)
+
+#Name for an object returned by proxy.method
+def returnedName(proxy, method):
+	return _RETURNED_NAMES.get(method, proxy._name + '.' + method)
+
+
+#Library function responsible for the current call
+#innermost is the function that made the COM call (drawCylinder), outermost the
+#one the script called (rectangular_patch). Private helpers and methods are skipped.
+def libraryCaller(attribution='innermost', depth=2):
+	frame = sys._getframe(depth)
+	found = None
+	while frame is not None:
+		module = frame.f_globals.get('__name__', '').rsplit('.', 1)[-1]
+		code = frame.f_code
+		if module in LIBRARY_MODULES:
+			is_method = code.co_argcount > 0 and code.co_varnames[0] == 'self'
+			if not (code.co_name.startswith('_') or is_method or code.co_name in PASSTHROUGH_FUNCTIONS):
+				found = code.co_name
+				if attribution == 'innermost':
+					return found
+		elif found is not None and module not in _TRANSPARENT_MODULES:
+			return found
+		frame = frame.f_back
+	return found if found is not None else '<script>'
+
+
+#Call count, total time and latency histogram of one (function, method) pair
+class CallStats(object):
+
+	def __init__(self):
+		self.count = 0
+		self.total = 0.0
+		self.min = None
+		self.max = 0.0
+		self.histogram = [0]*(len(HISTOGRAM_BUCKETS)+1)
+
+	def add(self, elapsed):
+		self.count += 1
+		self.total += elapsed
+		if self.min is None or elapsed < self.min:
+			self.min = elapsed
+		if elapsed > self.max:
+			self.max = elapsed
+		self.histogram[bisect.bisect_left(HISTOGRAM_BUCKETS, elapsed)] += 1
+
+	def mean(self):
+		return self.total/self.count if self.count else 0.0
+
+
+#Observer counting and timing every COM call
+#attribution is 'innermost' or 'outermost', see libraryCaller
+class ComProfiler(object):
+
+	def __init__(self, attribution='innermost'):
+		self.attribution = attribution
+		self.stats = {}
+		self.lock = threading.Lock()
+
+	def call(self, proxy, method, function, args):
+		caller = libraryCaller(self.attribution, depth=3)
+		start = time.perf_counter()
+		try:
+			result = function(*args)
+		finally:
+			self.record(caller, proxy._name + '.' + method, time.perf_counter() - start)
+		name = returnedName(proxy, method)
+		if isinstance(result, tuple):
+			#GetProjects and the like return tuples of COM objects
+			return tuple(self.result(item, name) for item in result)
+		if isinstance(result, list):
+			return [self.result(item, name) for item in result]
+		return self.result(result, name)
+
+	#Returned value with COM objects wrapped
+	def result(self, value, name):
+		if isComObject(value):
+			return ComProxy(value, self, name)
+		return value
+
+	def record(self, caller, method, elapsed):
+		with self.lock:
+			key = (caller, method)
+			stats = self.stats.get(key)
+			if stats is None:
+				stats = self.stats[key] = CallStats()
+			stats.add(elapsed)
+
+	def reset(self):
+		with self.lock:
+			self.stats = {}
+
+	#Calls and time per COM method, summed over the calling functions
+	def byMethod(self):
+		totals = {}
+		for (caller, method), stats in self.stats.items():
+			count, total = totals.get(method, (0, 0.0))
+			totals[method] = (count + stats.count, total + stats.total)
+		return totals
+
+	#Rows sorted by total time, slowest first
+	def rows(self):
+		rows = []
+		for (caller, method), stats in self.stats.items():
+			rows.append({
+				'function': caller,
+				'method': method,
+				'count': stats.count,
+				'total_s': stats.total,
+				'mean_s': stats.mean(),
+				'min_s': stats.min,
+				'max_s': stats.max,
+				'histogram': list(stats.histogram),
+			})
+		rows.sort(key=lambda row: row['total_s'], reverse=True)
+		return rows
+
+	def toJSON(self, path=None):
+		report = {'buckets_s': list(HISTOGRAM_BUCKETS), 'calls': self.rows()}
+		text = json.dumps(report, indent=1)
+		if path is not None:
+			with open(path, 'w') as json_file:
+				json_file.write(text)
+		return text
+
+	#One row per (function, method), one column per histogram bucket
+	def toCSV(self, path):
+		bucket_names = ['le_%g' % edge for edge in HISTOGRAM_BUCKETS] + ['gt_%g' % HISTOGRAM_BUCKETS[-1]]
+		with open(path, 'w', newline='') as csv_file:
+			writer = csv.writer(csv_file)
+			writer.writerow(['function', 'method', 'count', 'total_s', 'mean_s', 'min_s', 'max_s'] + bucket_names)
+			for row in self.rows():
+				writer.writerow([row['function'], row['method'], row['count'], row['total_s'], row['mean_s'],
+								 row['min_s'], row['max_s']] + row['histogram'])
+
+	def __str__(self):
+		lines = ['%-28s %-32s %8s %10s %10s' % ('function', 'method', 'calls', 'total ms', 'mean ms')]
+		for row in self.rows():
+			lines.append('%-28s %-32s %8d %10.2f %10.3f' % (row['function'], row['method'], row['count'],
+															 row['total_s']*1e3, row['mean_s']*1e3))
+		return '\n'.join(lines)
@@ -0,0 +1,196 @@
+import json
+import gzip
+import time
+import atexit
+from collections import deque
+
+# from HFSS_Python.ComInstrumentation import ComProxy, isComObject, returnedName # <--- uncomment this if importing submodule
+from ComInstrumentation import ComProxy, isComObject, returnedName # <-- Comment this out if importing submodule
+
+#Record-and-replay of COM sessions
+#A TapeRecorder writes every COM call made through its proxies (object handle,
+#method, arguments, return value, duration) to a tape, one JSON list per line.
+#A TapeReplayer serves those calls back without HFSS, so the Python side of a
+#build can be benchmarked and profiled on machines with no HFSS licence.
+#Tapes ending in .gz are gzip compressed.
+
+TAPE_FORMAT = 'hfss-com-tape'
+TAPE_VERSION = 1
+
+
+class TapeMismatch(Exception):
+	"Replayed call does not match the tape"
+
+class ReplayedComError(Exception):
+	"COM call raised an error when the tape was recorded"
+
+
+def _openTape(path, mode):
+	if path.endswith('.gz'):
+		return gzip.open(path, mode + 't')
+	return open(path, mode)
+
+#JSON has no numpy scalars, they are written as python numbers
+def _jsonDefault(value):
+	if hasattr(value, 'item'):
+		return value.item()
+	raise TypeError('%r can not be written to a tape' % (value,))
+
+def _encodeArgs(args):
+	return json.loads(json.dumps(args, default=_jsonDefault))
+
+
+#Observer writing every call to a tape
+class TapeRecorder(object):
+
+	def __init__(self, path):
+		self.path = path
+		self.tape = _openTape(path, 'w')
+		self.handles = {}
+		self.proxies = []
+		self.write({'format': TAPE_FORMAT, 'version': TAPE_VERSION})
+		#Scripts rarely close the tape themselves, a gzip tape is unreadable if left unclosed
+		atexit.register(self.close)
+
+	def write(self, record):
+		self.tape.write(json.dumps(record, separators=(',', ':'), default=_jsonDefault))
+		self.tape.write('\n')
+
+	#Wraps a COM object, handles are numbered in the order objects are first seen
+	def wrap(self, obj, name):
+		proxy = ComProxy(obj, self, name)
+		self.handles[id(proxy)] = len(self.proxies)
+		self.proxies.append(proxy)
+		return proxy
+
+	def call(self, proxy, method, function, args):
+		handle = self.handles[id(proxy)]
+		start = time.perf_counter()
+		try:
+			result = function(*args)
+		except Exception as error:
+			self.write([handle, method, args, {'$error': str(error)}, time.perf_counter() - start])
+			raise
+		elapsed = time.perf_counter() - start
+		name = returnedName(proxy, method)
+		if isinstance(result, tuple):
+			#GetProjects and the like return tuples of COM objects
+			result = tuple(self.result(item, name) for item in result)
+			encoded = [self.encode(item) for item in result]
+		else:
+			result = self.result(result, name)
+			encoded = self.encode(result)
+		self.write([handle, method, args, encoded, elapsed])
+		return result
+
+	#Returned value with COM objects wrapped
+	def result(self, value, name):
+		if isComObject(value):
+			return self.wrap(value, name)
+		return value
+
+	def encode(self, value):
+		if isinstance(value, ComProxy) and id(value) in self.handles:
+			return {'$obj': self.handles[id(value)]}
+		return value
+
+	def close(self):
+		if not self.tape.closed:
+			self.tape.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+
+#Serves the calls of a tape back in place of HFSS
+#strict replay expects the exact call sequence of the recording and raises
+#TapeMismatch at the first difference. Otherwise calls are matched on object,
+#method and arguments, so a changed call order still replays; unknown calls return None.
+#With latency=True each call sleeps for the time it took when it was recorded.
+class TapeReplayer(object):
+
+	def __init__(self, path, strict=True, latency=False):
+		self.path = path
+		self.strict = strict
+		self.latency = latency
+		self.records = []
+		with _openTape(path, 'r') as tape:
+			header = json.loads(tape.readline())
+			if not isinstance(header, dict) or header.get('format') != TAPE_FORMAT:
+				raise ValueError('%s is not a COM tape' % path)
+			for line in tape:
+				self.records.append(json.loads(line))
+		self.position = 0
+		self.objects = {}
+		self.index = {}
+		for record in self.records:
+			key = self.key(record[0], record[1], record[2])
+			self.index.setdefault(key, deque()).append(record)
+
+	def key(self, handle, method, args):
+		return (handle, method, json.dumps(args, separators=(',', ':')))
+
+	#Replay object with the given handle, 0 is the object the recording started from
+	def object(self, handle=0):
+		replay_object = self.objects.get(handle)
+		if replay_object is None:
+			replay_object = self.objects[handle] = ReplayObject(self, handle)
+		return replay_object
+
+	def call(self, handle, method, args):
+		args = _encodeArgs(list(args))
+		if self.strict:
+			if self.position >= len(self.records):
+				raise TapeMismatch('tape ended, unexpected call %s%r' % (method, tuple(args)))
+			record = self.records[self.position]
+			self.position += 1
+			if record[0] != handle or record[1].lower() != method.lower() or record[2] != args:
+				raise TapeMismatch('call %d: expected %s%r on object %d, got %s%r on object %d'
+								   % (self.position, record[1], tuple(record[2]), record[0], method, tuple(args), handle))
+		else:
+			calls = self.index.get(self.key(handle, method, args))
+			if not calls:
+				return None
+			record = calls.popleft() if len(calls) > 1 else calls[0]
+		if self.latency:
+			time.sleep(record[4])
+		return self.decode(record[3])
+
+	def decode(self, result):
+		if isinstance(result, dict):
+			if '$obj' in result:
+				return self.object(result['$obj'])
+			if '$error' in result:
+				raise ReplayedComError(result['$error'])
+		#COM hands arrays back as tuples
+		if isinstance(result, list):
+			return tuple(self.decode(item) if isinstance(item, dict) else item for item in result)
+		return result
+
+	#Calls left unserved by a strict replay
+	def remaining(self):
+		return len(self.records) - self.position
+
+
+#Stand-in for one recorded COM object
+class ReplayObject(object):
+
+	def __init__(self, replayer, handle):
+		self._replayer = replayer
+		self._handle = handle
+
+	def __getattr__(self, method):
+		if method.startswith('_'):
+			raise AttributeError(method)
+		replayer = self._replayer
+		handle = self._handle
+		def call(*args):
+			return replayer.call(handle, method, args)
+		call.__name__ = method
+		return call
+
+	def __repr__(self):
+		return '<ReplayObject %d of %s>' % (self._handle, self._replayer.path)
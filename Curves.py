@@ -0,0 +1,126 @@
+import numpy as np
+
+try:
+	from scipy import special
+except ImportError:
+	#Only needed for the Bessel function of Klopfenstein tapers
+	special = None
+
+# from HFSS_Python.HFSSLibrary import drawPolyline # <--- uncomment this if importing submodule
+from HFSSLibrary import drawPolyline # <-- Comment this out if importing submodule
+
+#Parametric curves sampled in NumPy
+#Spirals, meanders and tapers are computed here as arrays of points and drawn
+#as one polyline in one CreatePolyline call, instead of one primitive per
+#segment or an equation curve HFSS has to sample. Curves are returned as
+#[points, segments], points an (N,3) array and segments as drawPolyline takes
+#them; drawCurve sweeps a trace cross section along one, drawTaper covers the
+#closed outline of a taper.
+#
+#	drawCurve(oDesign, rectangularSpiral(10, 10, 0.6, 5), "mm", "Spiral", 0.3)
+#	drawTaper(oDesign, klopfensteinTaper(40, 50, 100, 0.02, 1.5748, 4.4), "mm", "Taper")
+
+
+#Inward rectangular spiral of turns turns, starting at the corner (-length/2, -width/2)
+#Each turn is pitch (trace width plus spacing) smaller on every side
+def rectangularSpiral(length, width, pitch, turns, center=(0, 0, 0)):
+	side = np.arange(4*int(turns))
+	#Sides run +x, +y, -x, -y; from the fourth on every second side is pitch shorter
+	lengths = np.where(side % 2 == 0, length, width) - pitch*np.maximum(0, (side-1)//2)
+	lengths = lengths[:np.argmax(lengths <= 0)] if np.any(lengths <= 0) else lengths
+	directions = np.array([[1, 0, 0], [0, 1, 0], [-1, 0, 0], [0, -1, 0]], dtype=float)[side[:len(lengths)] % 4]
+	start = np.array([-length/2.0, -width/2.0, 0])
+	points = np.vstack([start, start + np.cumsum(directions * lengths[:, None], axis=0)])
+	return [points + np.asarray(center, dtype=float), None]
+
+#Spiral of half circles, turns turns from radius outward, pitch further out every turn
+#The half circles are drawn as arcs, alternately centred on the origin and pitch/2 along x
+def circularSpiral(radius, pitch, turns, center=(0, 0, 0)):
+	half = np.arange(int(round(2*turns)))
+	radii = radius + half*pitch/2.0
+	centers = np.where(half % 2 == 0, 0.0, pitch/2.0)
+	#Start, middle and end of each half circle; the end is the start of the next one
+	angles = np.pi*half[:, None] + np.array([0, np.pi/2])
+	x = centers[:, None] + radii[:, None]*np.cos(angles)
+	y = radii[:, None]*np.sin(angles)
+	points = np.column_stack([x.ravel(), y.ravel(), np.zeros(x.size)])
+	end = [centers[-1] + radii[-1]*np.cos(np.pi*(half[-1]+1)), 0, 0]
+	points = np.vstack([points, end])
+	return [points + np.asarray(center, dtype=float), [["Arc", 3]] * len(half)]
+
+#Archimedean spiral r = radius + pitch*theta/(2*pi) over turns turns, drawn as a spline
+def archimedeanSpiral(radius, pitch, turns, samples_per_turn=36, center=(0, 0, 0)):
+	theta = np.linspace(0, 2*np.pi*turns, int(np.ceil(samples_per_turn*turns))+1)
+	r = radius + pitch*theta/(2*np.pi)
+	points = np.column_stack([r*np.cos(theta), r*np.sin(theta), np.zeros_like(theta)])
+	return [points + np.asarray(center, dtype=float), "Spline"]
+
+#Meander of count runs of height along y, pitch apart along x, starting at start
+def meander(pitch, height, count, start=(0, 0, 0)):
+	corner = np.arange(2*int(count))
+	x = pitch*(corner//2)
+	y = height*(((corner+1)//2) % 2)
+	points = np.column_stack([x, y, np.zeros_like(x, dtype=float)])
+	return [points + np.asarray(start, dtype=float), None]
+
+#Closed outline of a taper along x with widths[i] at positions[i], centred on y = 0
+def taperOutline(positions, widths):
+	positions = np.asarray(positions, dtype=float)
+	widths = np.asarray(widths, dtype=float)
+	x = np.concatenate([positions, positions[::-1]])
+	y = np.concatenate([widths/2, -widths[::-1]/2])
+	return np.column_stack([x, y, np.zeros_like(x)])
+
+#Taper whose width changes exponentially from width_start to width_end over length
+def exponentialTaper(length, width_start, width_end, samples=51):
+	x = np.linspace(0, length, samples)
+	widths = width_start*np.exp(x/length*np.log(float(width_end)/width_start))
+	return [taperOutline(x, widths), None]
+
+#Impedance along a Klopfenstein taper from impedance_start to impedance_end with
+#passband reflection max_reflection, at samples points over length
+#Returns [positions, impedances]
+def klopfensteinImpedance(length, impedance_start, impedance_end, max_reflection, samples=101):
+	if special is None:
+		raise ImportError('scipy is required for Klopfenstein tapers')
+	reflection = 0.5*np.log(float(impedance_end)/impedance_start)
+	A = np.arccosh(abs(reflection)/max_reflection) if abs(reflection) > max_reflection else 0.0
+	u = np.linspace(-1, 1, samples)
+	#phi(u, A), the integral from 0 to u of I1(A*sqrt(1-y^2))/(A*sqrt(1-y^2)), on a finer grid
+	y = np.linspace(-1, 1, 8*(samples-1)+1)
+	t = A*np.sqrt(np.maximum(0, 1 - y**2))
+	integrand = np.where(t > 1e-12, special.i1(t)/np.maximum(t, 1e-12), 0.5)
+	integral = np.concatenate([[0], np.cumsum((integrand[1:] + integrand[:-1])/2*np.diff(y))])
+	phi = np.interp(u, y, integral) - np.interp(0, y, integral)
+	impedances = np.exp(0.5*np.log(impedance_start*impedance_end) + reflection/np.cosh(A)*A**2*phi)
+	return [(u + 1)/2*length, impedances]
+
+#Microstrip width for impedance on a substrate of substrate_height and permittivity (Hammerstad)
+#Works on arrays of impedances; the width is in the units of substrate_height
+def microstripWidth(impedance, substrate_height, permittivity):
+	impedance = np.asarray(impedance, dtype=float)
+	A = impedance/60*np.sqrt((permittivity+1)/2) + (permittivity-1)/(permittivity+1)*(0.23 + 0.11/permittivity)
+	B = 377*np.pi/(2*impedance*np.sqrt(permittivity))
+	narrow = 8*np.exp(A)/(np.exp(2*A) - 2)
+	wide = 2/np.pi*(B - 1 - np.log(2*B - 1) + (permittivity-1)/(2*permittivity)*(np.log(np.maximum(B - 1, 1e-12)) + 0.39 - 0.61/permittivity))
+	return np.where(narrow < 2, narrow, wide)*substrate_height
+
+#Microstrip taper from impedance_start to impedance_end following the Klopfenstein impedance profile
+def klopfensteinTaper(length, impedance_start, impedance_end, max_reflection, substrate_height, permittivity, samples=101):
+	[x, impedances] = klopfensteinImpedance(length, impedance_start, impedance_end, max_reflection, samples)
+	return [taperOutline(x, microstripWidth(impedances, substrate_height, permittivity)), None]
+
+
+#Draws a curve as one polyline carrying a trace of width (a sheet), or of width and thickness (a solid)
+def drawCurve(oDesign, curve, units, name, width, thickness=0, cs="Global", material="copper", Transparency=0):
+	[points, segments] = curve
+	if thickness:
+		return drawPolyline(oDesign, points, units, name, segments, cs=cs, material=material,
+							XSectionType="Rectangle", XSectionWidth=width, XSectionHeight=thickness, Transparency=Transparency)
+	return drawPolyline(oDesign, points, units, name, segments, cs=cs, material=material,
+						XSectionType="Line", XSectionWidth=width, Transparency=Transparency)
+
+#Draws the closed outline of a taper as one covered polyline (a sheet)
+def drawTaper(oDesign, taper, units, name, cs="Global", Transparency=0):
+	[outline, segments] = taper
+	return drawPolyline(oDesign, outline, units, name, segments, closed=True, covered=True, cs=cs, Transparency=Transparency)
@@ -1,17 +1,23 @@
 
 
 from HFSSLibrary import *
+# from HFSS_Python.Units import convert # <--- uncomment this if importing submodule
+from Units import convert # <-- Comment this out if importing submodule
+# from HFSS_Python.Curves import drawCurve, rectangularSpiral, circularSpiral, archimedeanSpiral # <--- uncomment this if importing submodule
+from Curves import drawCurve, rectangularSpiral, circularSpiral, archimedeanSpiral # <-- Comment this out if importing submodule
 import numpy as np
+import logging
+
+logger = logging.getLogger("HFSS_Python.EmagDevices")
 
 #Set Constants
 epsilon_0=8.85418782e-12 #s^4/(kg*m^3)
 mu_0=1.25663706e-6 #(m*kg)/(s*A)^2
 C=3e8 #m/s
-mm_to_mils=39.3700787
-mils_to_mm=1/mm_to_mils
 
 
 #Creates a box of the size of the substrate made of FR4 With Copper Ground Plane
+@batchVariables
 def substrate(oDesign, subX, subY, subZ, units, material,cs, name):
 	names=["","","", "subX", "subY", "", name]
 	drawBox(oDesign, -subX/2, -subY/2, -subZ/2, subX,subY, subZ,units, material, cs, names,.8)
@@ -23,6 +29,8 @@ def substrate(oDesign, subX, subY, subZ, units, material,cs, name):
 	return GndName
 #Draws a length of 50 Ohm Coax  
 #Dimensions are Hardcoded for now
+@batchVariables
+@batchBooleans
 def coax_50_Ohm(oDesign, center_x, center_y, length, substrate_height, cs, name):
 #	print("Drawing ",name,"\n")
 
@@ -44,7 +52,7 @@ def coax_50_Ohm(oDesign, center_x, center_y, length, substrate_height, cs, name)
 	#Draw Probe_Outer
 	names=["probe_x", "probe_y", "","","",probe_outer_name]
 	drawCylinder(oDesign, center_x, center_y, -substrate_height/2, probe_outer_radius, -length, units, "Z", dielectric_material,cs, names,.75)
-	assignFaceBoundaryMaterial(oDesign, probe_outer_name, int(getFaceIDs(oDesign,probe_outer_name)[0]),"Copper")
+	assignFaceBoundaryMaterial(oDesign, probe_outer_name, getFaceIDs(oDesign,probe_outer_name)[0],"Copper")
 	
 	#Draw PEC Cap
 	#Draw Probe_Outer
@@ -63,17 +71,17 @@ def coax_50_Ohm(oDesign, center_x, center_y, length, substrate_height, cs, name)
 #This function designs a half wave patch antenna 
 #Matches the antenna to a quarter wave coax feedline
 #Can only handle 50 Ohm Feedline Impedance
-#Can handle length units in mm or mills, other units will cause error
+#Lengths may be in any length unit (mm, mil, um, in...), the patch is designed and drawn in mm
+@batchVariables
+@batchBooleans
 def design_rectangular_patch(oDesign, operation_frequency, feedline_impedance, substrate_height, substrate_permittivity, substrate_material, units, cs, name):
 #	print("Designing",name,"\n")
 	
 	
 
 
-	if(units is "mil"):
-	#	print('converting mil to mm 1')
-		substrate_height=substrate_height*mils_to_mm
-		units="mm"
+	substrate_height=convert(substrate_height, units, "mm")
+	units="mm"
 
 	feedline_length=10
 	#All equations taken from Balanis 3rd edition
@@ -84,13 +92,10 @@ def design_rectangular_patch(oDesign, operation_frequency, feedline_impedance, s
 	#####Design Patch Antenna#####
 	#Equation 14-6
 	patch_width=C/(2*operation_frequency)*np.sqrt(2/(substrate_permittivity+1))
-	patch_width=patch_width*1000 #m to mm
+	patch_width=convert(patch_width, "m", "mm")
 
 
-	print('patch width ', patch_width, units)
-	# if(units is "mil"):
-	# 	print('converting mil to mm 2')
-	# 	patch_width*=mm_to_mils
+	logger.debug('patch width %s %s', patch_width, units)
 
 	#Equation 14-1
 	effective_permittivity=(substrate_permittivity+1)/2+(substrate_permittivity-1)/2*pow((1+12*substrate_height/patch_width),-1/2)
@@ -99,16 +104,13 @@ def design_rectangular_patch(oDesign, operation_frequency, feedline_impedance, s
 	#Eq 14-2
 	delta_L=substrate_height*.412*(effective_permittivity+.3)*(patch_width/substrate_height+.264)/((effective_permittivity-.258)*(patch_width/substrate_height+.8))
 
-	wavelength=C/(operation_frequency*np.sqrt(effective_permittivity))*1000 #m to mm
-	# if(units is "mil"):
-	# 	print('converting mil to mm 3')
-	# 	wavelength*=mm_to_mils
+	wavelength=convert(C/(operation_frequency*np.sqrt(effective_permittivity)), "m", "mm")
 
 	#Half Wave Patch
-	print('effective_permittivity', effective_permittivity)
-	print('wavelength ', wavelength,' ',units)
+	logger.debug('effective_permittivity %s', effective_permittivity)
+	logger.debug('wavelength %s %s', wavelength, units)
 	patch_length=wavelength/2-2*delta_L
-	print('PatchLength', patch_length,' ',units)
+	logger.debug('PatchLength %s %s', patch_length, units)
 	substrate_length=patch_length+substrate_clearance
 	substrate_width=patch_width+substrate_clearance
 	GndName=substrate(oDesign, substrate_length, substrate_width, substrate_height, units, substrate_material, cs, substrate_name)
@@ -131,15 +133,15 @@ def design_rectangular_patch(oDesign, operation_frequency, feedline_impedance, s
 
 	#use approximation from 14-18b
 	Rin=90*substrate_permittivity**2/(substrate_permittivity-1)*patch_length/patch_width
-	print('rin: ',Rin)
+	logger.debug('rin: %s', Rin)
 	#From Eq 14-20a
 	#probe_y=patch_length/np.pi*np.arccos(np.sqrt(feedline_impedance*2*(G1+G12)))
 
 	probe_x=-patch_length/2+patch_length/np.pi*np.arccos(np.sqrt(feedline_impedance*1/Rin))
 	probe_y=0
-	print('probe_y: ',probe_y)
+	logger.debug('probe_y: %s', probe_y)
 	
-	print('probe_x: ',probe_x)
+	logger.debug('probe_x: %s', probe_x)
 	coax_name=name+"_feedline"
 	[excitation, coax_names]=coax_50_Ohm(oDesign, probe_x,probe_y,feedline_length,substrate_height,cs, coax_name)
 	#Subtract probe from Substrate, Ground plane, and antenna
@@ -149,6 +151,8 @@ def design_rectangular_patch(oDesign, operation_frequency, feedline_impedance, s
 	return excitation, [name, substrate_name, GndName]+coax_names
 
 
+@batchVariables
+@batchBooleans
 def rectangular_patch(oDesign, patch_length, patch_width, probe_x, probe_y, substrate_length, substrate_width, substrate_height, substrate_material,units,cs, name):
 
 	#print("Drawing",name,"\n")
@@ -176,6 +180,11 @@ def rectangular_patch(oDesign, patch_length, patch_width, probe_x, probe_y, subs
 
 
 def square_spiral_inductor(oDesign, start_x, start_y, start_length,width, width_multiplier, spacing, num_turns, units="mm", cs="Global", name="Spiral"):
+	#A trace of constant width is one polyline along the centre line of the rectangles drawn below
+	#named name; it is a vacuum sheet like the rectangles, assign its material or boundary as before
+	if width_multiplier == 1:
+		points = _squareSpiralCenterline(start_x, start_y, start_length, width, spacing, num_turns)
+		return drawCurve(oDesign, [points, None], units, name, width, 0, cs, material="vacuum")
 	start_z = 0
 
 	length = start_length
@@ -218,4 +227,73 @@ def square_spiral_inductor(oDesign, start_x, start_y, start_length,width, width_
 		return
 
 	if num_turns>0:
-		square_spiral_inductor(oDesign,x,y,length,width_multiplier*width,width_multiplier, spacing,num_turns,units,cs,name)
\ No newline at end of file
+		square_spiral_inductor(oDesign,x,y,length,width_multiplier*width,width_multiplier, spacing,num_turns,units,cs,name)
+
+#Centre line of the rectangles square_spiral_inductor draws for a constant width
+#Each rectangle is [x, y, length, direction], the lengths change as in square_spiral_inductor
+def _squareSpiralCenterline(start_x, start_y, start_length, width, spacing, num_turns):
+	rectangles = []
+	length = start_length
+	x = start_x
+	y = start_y
+	while True:
+		rectangles.append([x, y, length, "+x"])
+		x += length-width
+		length -= spacing
+		y += width
+		if length <= 0:
+			break
+		rectangles.append([x, y, length, "+y"])
+		y += length - width
+		length -= width
+		x -= length
+		if length <= 0:
+			break
+		rectangles.append([x, y, length, "-x"])
+		length -= spacing
+		y -= length
+		if length <= 0:
+			break
+		rectangles.append([x, y, length, "-y"])
+		num_turns -= 1
+		x += width
+		length -= width
+		if length < 0 or num_turns <= 0:
+			break
+
+	#Start and end of each centre line in the direction of travel
+	ends = []
+	for [x, y, length, direction] in rectangles:
+		if direction[1] == "x":
+			line = [[x, y+width/2], [x+length, y+width/2]]
+		else:
+			line = [[x+width/2, y], [x+width/2, y+length]]
+		ends.append(line if direction[0] == "+" else line[::-1])
+	#Consecutive centre lines meet at the corners, one runs along x and the other along y
+	points = [ends[0][0]]
+	for i in range(len(rectangles)-1):
+		if rectangles[i][3][1] == "x":
+			points.append([ends[i+1][0][0], ends[i][0][1]])
+		else:
+			points.append([ends[i][0][0], ends[i+1][0][1]])
+	points.append(ends[-1][1])
+	return np.column_stack([np.array(points, dtype=float), np.zeros(len(points))])
+
+#Spiral inductor drawn as one polyline carrying a trace of trace_width (and thickness, if given)
+#shape is "rectangular" (outer_length by outer_width), "circular" or "archimedean"
+#(outer_length is the outer diameter, outer_width is not used)
+def spiral_inductor(oDesign, outer_length, outer_width, trace_width, spacing, num_turns, units="mm", cs="Global", name="Spiral", shape="rectangular", thickness=0):
+	pitch = trace_width+spacing
+	if shape == "rectangular":
+		curve = rectangularSpiral(outer_length, outer_width, pitch, num_turns)
+	elif shape in ("circular", "archimedean"):
+		inner_radius = outer_length/2.0-pitch*num_turns
+		if inner_radius <= 0:
+			raise ValueError('%d turns of pitch %f do not fit in diameter %f' % (num_turns, pitch, outer_length))
+		if shape == "circular":
+			curve = circularSpiral(inner_radius, pitch, num_turns)
+		else:
+			curve = archimedeanSpiral(inner_radius, pitch, num_turns)
+	else:
+		raise ValueError('<shape> must be "rectangular", "circular" or "archimedean"')
+	return drawCurve(oDesign, curve, units, name, trace_width, thickness, cs)
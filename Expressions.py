@@ -0,0 +1,335 @@
+import re
+import functools
+import numpy as np
+
+# from HFSS_Python.Units import unitScale # <--- uncomment this if importing submodule
+from Units import unitScale # <-- Comment this out if importing submodule
+
+#HFSS expressions evaluated in Python
+#Values like "5mm+6mm*length" or "startz*starty" are parsed and evaluated here
+#against a table of variables (a VariableCache, the variables of a GeometryIR or
+#any dict), so their numbers are known without asking HFSS for them.
+#As in HFSS, units turn numbers into SI values: "5mm" is 0.005 and "90deg" is pi/2.
+#
+#Parsed expressions are cached by their template, the expression with its
+#numbers taken out, so "1.000000mm+x" and "2.500000mm+x" share one tree.
+#evaluateMany evaluates a batch with one pass over each template, its numbers
+#and variables as NumPy vectors.
+#
+#	evaluator = ExpressionEvaluator({'length': '2mm', 'width': 'length*3'})
+#	evaluator.evaluate("5mm+6mm*length")			# 0.005012
+#	evaluator.evaluate("width", "mm")			# 6.0
+#	evaluator.evaluateMany(["%fmm+width" % x for x in range(10000)], "mm")
+
+CONSTANTS = {'pi': np.pi}
+
+def _if(condition, when_true, when_false):
+	return np.where(np.asarray(condition) != 0, when_true, when_false)
+
+FUNCTIONS = {
+	'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'asin': np.arcsin, 'acos': np.arccos, 'atan': np.arctan,
+	'atan2': np.arctan2, 'sinh': np.sinh, 'cosh': np.cosh, 'tanh': np.tanh,
+	'sqrt': np.sqrt, 'abs': np.abs, 'exp': np.exp, 'ln': np.log, 'log10': np.log10, 'pow': np.power,
+	'min': np.minimum, 'max': np.maximum, 'sgn': np.sign, 'int': np.trunc, 'nint': np.rint, 'mod': np.fmod,
+	'if': _if,
+}
+
+#Functions whose value has no units whatever their arguments have: sin(90deg) is 1, not 1 in some unit
+UNITLESS_FUNCTIONS = {'sin', 'cos', 'tan', 'sinh', 'cosh', 'tanh', 'exp', 'ln', 'log10', 'sgn'}
+
+_COMPARISONS = {'<', '>', '<=', '>=', '==', '!='}
+
+_BINARY = {
+	'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.true_divide, '^': np.power, '**': np.power,
+	'<': np.less, '>': np.greater, '<=': np.less_equal, '>=': np.greater_equal, '==': np.equal, '!=': np.not_equal,
+}
+
+_TOKEN = re.compile(r'\s*(?:'
+					r'(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(?:\s*(?P<unit>[A-Za-z_]\w*))?'
+					r'|(?P<name>[$A-Za-z_][\w]*)'
+					r'|(?P<operator>\*\*|<=|>=|==|!=|[-+*/^(),<>])'
+					r')')
+
+
+#Tokens of an expression: ('number', SI value, has unit), ('name', name, None) and ('operator', op, None)
+@functools.lru_cache(maxsize=65536)
+def tokenize(expression):
+	tokens = []
+	position = 0
+	end = len(expression.rstrip())
+	while position < end:
+		match = _TOKEN.match(expression, position)
+		if match is None or match.end() == position:
+			raise ValueError('can not parse %r at %r' % (expression, expression[position:]))
+		position = match.end()
+		if match.group('number') is not None:
+			unit = match.group('unit')
+			value = float(match.group('number'))
+			if unit and match.start('unit') > match.end('number') and not _isUnit(unit):
+				#"1 mm" has units, in "2 and" the name is not a unit and is read on its own
+				unit = None
+				position = match.end('number')
+			if unit:
+				value *= unitScale(unit)
+			tokens.append(('number', value, bool(unit)))
+		elif match.group('name') is not None:
+			tokens.append(('name', match.group('name'), None))
+		else:
+			tokens.append(('operator', match.group('operator'), None))
+	return tuple(tokens)
+
+def _isUnit(name):
+	try:
+		unitScale(name)
+	except ValueError:
+		return False
+	return True
+
+#Variables an expression refers to, in order of appearance (function names and constants left out)
+def expressionNames(expression):
+	tokens = tokenize(expression)
+	names = []
+	for i in range(len(tokens)):
+		[kind, name, unit] = tokens[i]
+		if kind != 'name' or name in names:
+			continue
+		if name in FUNCTIONS and i+1 < len(tokens) and tokens[i+1][1] == '(':
+			continue
+		names.append(name)
+	return names
+
+#Template of an expression (its tokens with numbers as numbered slots) and its numbers
+#Whether a number has a unit is part of the template, its value is not
+def _template(expression):
+	tokens = tokenize(expression)
+	template = []
+	numbers = []
+	for [kind, value, unit] in tokens:
+		if kind == 'number':
+			template.append(('number', len(numbers), unit))
+			numbers.append(value)
+		else:
+			template.append((kind, value))
+	return [tuple(template), numbers]
+
+#Expression tree of a template, nodes are ('number', slot), ('name', name),
+#('negate', node), ('binary', op, left, right) and ('call', function, args)
+@functools.lru_cache(maxsize=16384)
+def parseTemplate(template):
+	parser = _Parser(template)
+	node = parser.comparison()
+	if parser.position != len(template):
+		raise ValueError('unexpected %s' % (_describe(template[parser.position])))
+	return node
+
+#Slots of the numbers of a template that have units
+@functools.lru_cache(maxsize=16384)
+def _unitSlots(template):
+	return frozenset(token[1] for token in template if token[0] == 'number' and token[2])
+
+def parseExpression(expression):
+	[template, numbers] = _template(expression)
+	return [parseTemplate(template), numbers]
+
+
+class _Parser(object):
+
+	def __init__(self, tokens):
+		self.tokens = tokens
+		self.position = 0
+
+	def peek(self):
+		if self.position < len(self.tokens):
+			return self.tokens[self.position][:2]
+		return (None, None)
+
+	def take(self, operator=None):
+		token = self.peek()
+		if token[0] is None or (operator is not None and token != ('operator', operator)):
+			raise ValueError('expected %r' % (operator or 'a value'))
+		self.position += 1
+		return token
+
+	def binary(self, operators, operand):
+		node = operand()
+		while self.peek()[0] == 'operator' and self.peek()[1] in operators:
+			operator = self.take()[1]
+			node = ('binary', operator, node, operand())
+		return node
+
+	def comparison(self):
+		return self.binary(('<', '>', '<=', '>=', '==', '!='), self.sum)
+
+	def sum(self):
+		return self.binary(('+', '-'), self.product)
+
+	def product(self):
+		return self.binary(('*', '/'), self.unary)
+
+	def unary(self):
+		if self.peek() == ('operator', '-'):
+			self.take()
+			return ('negate', self.unary())
+		if self.peek() == ('operator', '+'):
+			self.take()
+			return self.unary()
+		return self.power()
+
+	#Right associative, binds tighter than a leading minus: -2^2 is -4
+	def power(self):
+		node = self.atom()
+		if self.peek()[0] == 'operator' and self.peek()[1] in ('^', '**'):
+			operator = self.take()[1]
+			node = ('binary', operator, node, self.unary())
+		return node
+
+	def atom(self):
+		[kind, value] = self.take()
+		if kind == 'number':
+			return ('number', value)
+		if kind == 'name':
+			if self.peek() == ('operator', '('):
+				self.take('(')
+				args = []
+				if self.peek() != ('operator', ')'):
+					args.append(self.comparison())
+					while self.peek() == ('operator', ','):
+						self.take(',')
+						args.append(self.comparison())
+				self.take(')')
+				if value not in FUNCTIONS:
+					raise ValueError('unknown function %r' % (value))
+				return ('call', value, tuple(args))
+			return ('name', value)
+		if value == '(':
+			node = self.comparison()
+			self.take(')')
+			return node
+		raise ValueError('unexpected %s' % (_describe((kind, value))))
+
+
+def _describe(token):
+	if token[0] == 'number':
+		return 'number'
+	return repr(token[1])
+
+
+#Evaluates expressions against a table of variables whose values are expressions themselves
+#variables may be a VariableCache or a dict; values of variables are remembered
+#until invalidate() is called
+class ExpressionEvaluator(object):
+
+	def __init__(self, variables):
+		self.variables = variables
+		self.values = {}
+		self.unitful = {}
+		self.resolving = set()
+
+	def invalidate(self):
+		self.values.clear()
+		self.unitful.clear()
+
+	def definition(self, name):
+		if name not in self.variables:
+			raise KeyError('unknown variable %r' % (name))
+		value = self.variables.get(name)
+		if value is None:
+			raise KeyError('no value for variable %r' % (name))
+		return value
+
+	#SI value of a variable
+	def value(self, name):
+		if name in self.values:
+			return self.values[name]
+		if name not in self.variables:
+			if name in CONSTANTS:
+				return CONSTANTS[name]
+			raise KeyError('unknown variable %r' % (name))
+		if name in self.resolving:
+			raise ValueError('variable %r depends on itself' % (name))
+		self.resolving.add(name)
+		try:
+			value = self.evaluate(self.definition(name))
+		finally:
+			self.resolving.discard(name)
+		self.values[name] = value
+		return value
+
+	#True if the value of the expression has a unit, directly or through its variables
+	#Numbers without units are in the units the value is used in, like in HFSS.
+	#Units inside sin(), exp()... and comparisons do not make the value have units.
+	def hasUnits(self, expression):
+		if not isinstance(expression, str):
+			return False
+		[template, numbers] = _template(expression)
+		return self.nodeUnits(parseTemplate(template), _unitSlots(template))
+
+	def nodeUnits(self, node, unit_slots):
+		kind = node[0]
+		if kind == 'number':
+			return node[1] in unit_slots
+		if kind == 'name':
+			name = node[1]
+			if name not in self.variables:
+				return False
+			if name not in self.unitful:
+				self.unitful[name] = self.hasUnits(self.definition(name))
+			return self.unitful[name]
+		if kind == 'negate':
+			return self.nodeUnits(node[1], unit_slots)
+		if kind == 'binary':
+			if node[1] in _COMPARISONS:
+				return False
+			if node[1] in ('^', '**'):
+				return self.nodeUnits(node[2], unit_slots)
+			return self.nodeUnits(node[2], unit_slots) or self.nodeUnits(node[3], unit_slots)
+		if node[1] in UNITLESS_FUNCTIONS:
+			return False
+		#The condition of an if() does not give its value units
+		args = node[2][1:] if node[1] == 'if' else node[2]
+		return any(self.nodeUnits(arg, unit_slots) for arg in args)
+
+	def node(self, node, numbers):
+		kind = node[0]
+		if kind == 'number':
+			return numbers[node[1]]
+		if kind == 'name':
+			return self.value(node[1])
+		if kind == 'negate':
+			return np.negative(self.node(node[1], numbers))
+		if kind == 'binary':
+			return _BINARY[node[1]](self.node(node[2], numbers), self.node(node[3], numbers))
+		return FUNCTIONS[node[1]](*[self.node(arg, numbers) for arg in node[2]])
+
+	#Value of expression, in SI units or in unit if given
+	def evaluate(self, expression, unit=None):
+		if isinstance(expression, (int, float, np.number)):
+			return float(expression)
+		[tree, numbers] = parseExpression(expression)
+		value = self.node(tree, numbers)
+		if np.ndim(value) == 0:
+			value = float(value)
+		if unit is not None and self.hasUnits(expression):
+			value = value / unitScale(unit)
+		return value
+
+	#Values of a list of expressions as an array, in SI units or in unit if given
+	#Expressions sharing a template are evaluated together on vectors of their numbers
+	def evaluateMany(self, expressions, unit=None):
+		groups = {}
+		for index in range(len(expressions)):
+			expression = expressions[index]
+			if isinstance(expression, (int, float, np.number)):
+				expression = repr(float(expression))
+			[template, numbers] = _template(expression)
+			group = groups.setdefault(template, [[], [], expression])
+			group[0].append(index)
+			group[1].append(numbers)
+		values = np.empty(len(expressions))
+		for template, [indices, numbers, expression] in groups.items():
+			columns = np.array(numbers, dtype=float).reshape(len(indices), -1).T
+			values[indices] = self.node(parseTemplate(template), columns)
+			#Every expression of a template has units if one of them does
+			if unit is not None and self.hasUnits(expression):
+				values[indices] /= unitScale(unit)
+		return values
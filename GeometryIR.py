@@ -0,0 +1,788 @@
+import os
+import json
+import functools
+
+# from HFSS_Python.HFSSLibrary import getEditor, getModule, getFaceIDs, getVariableCache, getObjectRegistry, invalidateFaceIDs, BooleanQueue, _localVariableChange, _subtract, _unite, _joinFaceIDs # <--- uncomment this if importing submodule
+from HFSSLibrary import getEditor, getModule, getFaceIDs, getVariableCache, getObjectRegistry, invalidateFaceIDs, BooleanQueue, _localVariableChange, _subtract, _unite, _joinFaceIDs # <-- Comment this out if importing submodule
+# from HFSS_Python.VariableGraph import VariableGraph # <--- uncomment this if importing submodule
+from VariableGraph import VariableGraph # <-- Comment this out if importing submodule
+
+#In-memory representation of a design build
+#A GeometryIR hands out a stand-in oDesign; every library function drawing on
+#it (drawBox, binarySubtraction, localVar, rectangular_patch...) is recorded as
+#compact records instead of calling HFSS. compileIR then runs optimisation
+#passes over the records and emits the COM calls to a real design, or to any
+#other backend (script emitter, dispatcher, tape).
+#
+#	ir = GeometryIR()
+#	rectangular_patch(ir.design(), 28.6, 38, 8.3, 0, 60, 71, 1.5748, "FR4_epoxy", "mm", "Global", "Patch")
+#	compileIR(ir, oDesign)
+#
+#Queries (GetFaceIDs) give placeholders that are resolved when the records are emitted.
+
+#Editor methods drawing a new object, the name is taken from its "Name:=" attribute
+PRIMITIVE_METHODS = {
+	'createbox', 'createrectangle', 'createcylinder', 'createcircle', 'createsphere',
+	'createpolyline', 'createequationcurve', 'createregularpolyhedron', 'createcone', 'createtorus',
+}
+
+#Editor methods copying their selections
+DUPLICATE_METHODS = {'duplicatealongline', 'duplicatearoundaxis', 'duplicatemirror'}
+
+#Editor methods leaving every object alone, booleans may be moved past them
+NEUTRAL_METHODS = {'setwcs'}
+
+#Attributes naming a coordinate system, rewritten when duplicate coordinate systems are merged
+CS_KEYS = {'PartCoordinateSystem:=', 'Working Coordinate System:='}
+
+
+#Base of all records: the object called (design, editor or a module name), method and arguments
+class IRRecord(object):
+	__slots__ = ('owner', 'method', 'args')
+
+	def __init__(self, owner, method, args):
+		self.owner = owner
+		self.method = method
+		self.args = args
+
+	def copy(self):
+		record = object.__new__(type(self))
+		for cls in type(self).__mro__:
+			for slot in getattr(cls, '__slots__', ()):
+				setattr(record, slot, getattr(self, slot))
+		return record
+
+	#Objects the record reads or changes, None if it may depend on all of them
+	def touches(self):
+		return None
+
+	#Names of what the record creates in the design
+	def created(self):
+		return ()
+
+	def __repr__(self):
+		return '<%s %s.%s>' % (type(self).__name__, self.owner, self.method)
+
+#Definition or change of one local variable
+class IRVariable(IRRecord):
+	__slots__ = ('name', 'value')
+
+	def __init__(self, name, value):
+		IRRecord.__init__(self, 'design', 'ChangeProperty', ())
+		self.name = name
+		self.value = value
+
+	def touches(self):
+		return ()
+
+#Every local variable with its final value, each after the variables it uses (made by mergeVariables)
+class IRVariableBlock(IRRecord):
+	__slots__ = ('values',)
+
+	def __init__(self, values):
+		IRRecord.__init__(self, 'design', 'ChangeProperty', ())
+		self.values = values
+
+	def touches(self):
+		return ()
+
+class IRPrimitive(IRRecord):
+	__slots__ = ('name', 'cs')
+
+	def __init__(self, method, args, name, cs):
+		IRRecord.__init__(self, 'editor', method, args)
+		self.name = name
+		self.cs = cs
+
+	def touches(self):
+		return ()
+
+	def created(self):
+		return (self.name,)
+
+#Subtract (blanks minus tools) or Unite (tools into the single blank)
+class IRBoolean(IRRecord):
+	__slots__ = ('kind', 'blanks', 'tools', 'keep')
+
+	def __init__(self, kind, blanks, tools, keep):
+		IRRecord.__init__(self, 'editor', kind, ())
+		self.kind = kind
+		self.blanks = blanks
+		self.tools = tools
+		self.keep = keep
+
+	def touches(self):
+		return self.blanks + self.tools
+
+#Coordinate system created relative to wcs, key holds everything defining it
+class IRCoordinateSystem(IRRecord):
+	__slots__ = ('name', 'wcs', 'key')
+
+	def __init__(self, method, args, name, wcs):
+		IRRecord.__init__(self, 'editor', method, args)
+		self.name = name
+		self.wcs = wcs
+		self.key = (method, wcs, repr(args[0]))
+
+	def touches(self):
+		return ()
+
+	def created(self):
+		return (self.name,)
+
+#Boundary or excitation assigned through a module
+class IRAssignment(IRRecord):
+	__slots__ = ('name', 'objects')
+
+	def __init__(self, owner, method, args, name, objects):
+		IRRecord.__init__(self, owner, method, args)
+		self.name = name
+		self.objects = objects
+
+	def touches(self):
+		return self.objects
+
+	def created(self):
+		return (self.name,)
+
+#GetFaceIDs of one object, index numbers the query for its placeholders
+class IRQuery(IRRecord):
+	__slots__ = ('index', 'name')
+
+	def __init__(self, index, name):
+		IRRecord.__init__(self, 'editor', 'GetFaceIDs', (name,))
+		self.index = index
+		self.name = name
+
+	def touches(self):
+		return (self.name,)
+
+#Any other call; selections are the objects it works on when it names them,
+#clones the objects a duplicate creates
+class IRCommand(IRRecord):
+	__slots__ = ('selections', 'clones')
+
+	def __init__(self, owner, method, args, selections=None, clones=()):
+		IRRecord.__init__(self, owner, method, args)
+		self.selections = selections
+		self.clones = clones
+
+	def touches(self):
+		if self.method.lower() in NEUTRAL_METHODS:
+			return ()
+		return self.selections
+
+	def created(self):
+		return self.clones
+
+
+#Result of a query, only known when the records are emitted
+#Indexing or adding (joining face lists) gives another placeholder
+class IRValue(object):
+	__slots__ = ('query', 'path', 'parts')
+
+	def __init__(self, query, path=(), parts=None):
+		self.query = query
+		self.path = path
+		self.parts = parts
+
+	def __getitem__(self, index):
+		return IRValue(self.query, self.path + (index,), self.parts)
+
+	def __add__(self, other):
+		return IRValue(None, (), [self, other])
+
+	def __radd__(self, other):
+		return IRValue(None, (), [other, self])
+
+	def __len__(self):
+		raise TypeError('query results are only known when the design is compiled')
+
+	def __iter__(self):
+		raise TypeError('query results are only known when the design is compiled')
+
+	def __repr__(self):
+		if self.parts is not None:
+			return ' + '.join(repr(part) for part in self.parts)
+		return '<query %s>%s' % (self.query, ''.join('[%r]' % (index,) for index in self.path))
+
+
+#Value of key:= in a HFSS argument list
+def _argValue(values, key, default=None):
+	if isinstance(values, list):
+		for i in range(len(values)-1):
+			if values[i] == key:
+				return values[i+1]
+	return default
+
+def _splitNames(names):
+	if isinstance(names, str):
+		return [name for name in names.split(",") if name]
+	return list(names)
+
+def _argName(values):
+	if isinstance(values, list) and values and isinstance(values[0], str) and values[0].upper().startswith('NAME:'):
+		return values[0][len('NAME:'):].strip()
+	return None
+
+
+class GeometryIR(object):
+
+	def __init__(self):
+		self.records = []
+		#Local variables as defined so far, answers GetVariables/GetVariableValue
+		self.variables = {}
+		#Objects drawn so far, answers GetMatchedObjectName
+		self.objects = []
+		self.query_count = 0
+		self.wcs = "Global"
+		self._design = IRObject(self, 'design')
+
+	#Stand-in oDesign recording everything drawn on it
+	def design(self):
+		return self._design
+
+	def call(self, owner, method, args):
+		key = method.lower()
+		args = list(args)
+		if owner == 'design':
+			return self.designCall(method, key, args)
+		if owner == 'editor':
+			return self.editorCall(method, key, args)
+		if key.startswith('assign'):
+			first = args[0] if args else None
+			self.records.append(IRAssignment(owner, method, args, _argName(first), _splitNames(_argValue(first, "Objects:=", []))))
+			return None
+		self.records.append(IRCommand(owner, method, args))
+		return None
+
+	def designCall(self, method, key, args):
+		if key == 'setactiveeditor':
+			self.records.append(IRCommand('design', method, args))
+			return IRObject(self, 'editor')
+		if key == 'getmodule':
+			self.records.append(IRCommand('design', method, args))
+			return IRObject(self, args[0])
+		if key == 'getvariables':
+			return tuple(self.variables)
+		if key == 'getvariablevalue':
+			return self.variables[args[0]]
+		if key == 'changeproperty' and self.recordVariables(args):
+			return None
+		self.records.append(IRCommand('design', method, args))
+		return None
+
+	#Records the local variables of a ChangeProperty, False if it changes anything else
+	def recordVariables(self, args):
+		tabs = args[0][1:]
+		if not all(isinstance(tab, list) and tab and tab[0] == 'NAME:LocalVariableTab' for tab in tabs):
+			return False
+		for tab in tabs:
+			for group in tab[1:]:
+				if isinstance(group, list) and group and group[0] in ('NAME:NewProps', 'NAME:ChangedProps'):
+					for prop in group[1:]:
+						name = prop[0][len('NAME:'):]
+						value = prop[prop.index('Value:=')+1]
+						self.variables[name] = value
+						self.records.append(IRVariable(name, value))
+		return True
+
+	def editorCall(self, method, key, args):
+		if key in PRIMITIVE_METHODS:
+			attributes = args[1] if len(args) > 1 else []
+			name = _argValue(attributes, "Name:=")
+			self.records.append(IRPrimitive(method, args, name, _argValue(attributes, "PartCoordinateSystem:=", "Global")))
+			self.objects.append(name)
+			return None
+		if key == 'createrelativecs':
+			name = _argValue(args[1], "Name:=")
+			self.records.append(IRCoordinateSystem(method, args, name, self.wcs))
+			return None
+		if key == 'subtract':
+			blanks = _splitNames(_argValue(args[0], "Blank Parts:=", ""))
+			tools = _splitNames(_argValue(args[0], "Tool Parts:=", ""))
+			keep = _argValue(args[1], "KeepOriginals:=", False)
+			self.records.append(IRBoolean("Subtract", blanks, tools, keep))
+			if not keep:
+				self.objects = [name for name in self.objects if name not in tools]
+			return None
+		if key == 'unite':
+			selections = _splitNames(_argValue(args[0], "Selections:=", ""))
+			self.records.append(IRBoolean("Unite", selections[:1], selections[1:], False))
+			self.objects = [name for name in self.objects if name not in selections[1:]]
+			return None
+		if key == 'getfaceids':
+			self.query_count += 1
+			self.records.append(IRQuery(self.query_count, args[0]))
+			return IRValue(self.query_count)
+		if key == 'getmatchedobjectname':
+			return tuple(self.objects)
+		if key == 'setwcs':
+			self.wcs = _argValue(args[0], "Working Coordinate System:=", self.wcs)
+		selections = _argValue(args[0], "Selections:=") if args else None
+		if selections is not None:
+			selections = _splitNames(selections)
+		clones = ()
+		if key in DUPLICATE_METHODS:
+			clones = self.cloneNames(selections, int(_argValue(args[1], "NumClones:=", 2)))
+		self.records.append(IRCommand('editor', method, args, selections, clones))
+		return None
+
+	#Names HFSS gives the count-1 copies of each selection, the next free name_1, name_2...
+	def cloneNames(self, selections, count):
+		taken = set(self.objects)
+		clones = []
+		for name in selections:
+			suffix = 1
+			for k in range(count-1):
+				while '%s_%d' % (name, suffix) in taken:
+					suffix += 1
+				taken.add('%s_%d' % (name, suffix))
+				clones.append('%s_%d' % (name, suffix))
+		self.objects += clones
+		return clones
+
+
+#Stand-in for the design, editor or a module of a GeometryIR
+class IRObject(object):
+
+	def __init__(self, ir, owner):
+		self._ir = ir
+		self._owner = owner
+
+	def __getattr__(self, method):
+		if method.startswith('_'):
+			raise AttributeError(method)
+		ir = self._ir
+		owner = self._owner
+		def call(*args):
+			return ir.call(owner, method, args)
+		call.__name__ = method
+		return call
+
+	def __repr__(self):
+		return '<IRObject %s>' % self._owner
+
+
+#####Optimisation passes, each takes and returns a list of records#####
+
+#One variable block at the start with the final value of every variable
+#HFSS evaluates geometry from the current variable values, so only the last value counts
+def mergeVariables(records):
+	values = {}
+	others = []
+	for record in records:
+		if isinstance(record, IRVariable):
+			values[record.name] = record.value
+		elif isinstance(record, IRVariableBlock):
+			values.update(record.values)
+		else:
+			others.append(record)
+	if not values:
+		return others
+	#A variable may have been changed to use one defined after it
+	values = dict((name, values[name]) for name in VariableGraph(values).order())
+	return [IRVariableBlock(values)] + others
+
+#Drops coordinate systems identical to an earlier one (same definition relative to the same
+#working CS) and points everything using them at the earlier one
+def dedupeCoordinateSystems(records):
+	first = {}
+	renamed = {}
+	kept = []
+	for record in records:
+		if renamed:
+			#Records are shared with the IR, renaming works on a copy
+			record = record.copy()
+			record.args = _renameCS(record.args, renamed)
+			if isinstance(record, IRPrimitive):
+				record.cs = renamed.get(record.cs, record.cs)
+		if isinstance(record, IRCoordinateSystem):
+			wcs = renamed.get(record.wcs, record.wcs)
+			key = (record.key[0], wcs, record.key[2])
+			if key in first:
+				renamed[record.name] = first[key]
+				continue
+			first[key] = record.name
+		kept.append(record)
+	return kept
+
+def _renameCS(values, renamed):
+	if not isinstance(values, list):
+		return values
+	result = []
+	for i in range(len(values)):
+		value = values[i]
+		if i > 0 and isinstance(value, str) and isinstance(values[i-1], str) and values[i-1] in CS_KEYS and value in renamed:
+			value = renamed[value]
+		result.append(_renameCS(value, renamed))
+	return result
+
+#Drops SetActiveEditor/GetModule, the compiler fetches every handle once,
+#and SetWCS calls to the working CS that is already active
+def dropRedundantCalls(records):
+	kept = []
+	wcs = "Global"
+	for record in records:
+		if isinstance(record, IRCommand):
+			key = record.method.lower()
+			if key in ('setactiveeditor', 'getmodule'):
+				continue
+			if key == 'setwcs':
+				target = _argValue(record.args[0], "Working Coordinate System:=")
+				if target == wcs:
+					continue
+				wcs = target
+		kept.append(record)
+	return kept
+
+#Merges subtractions and unions into as few calls as possible, as booleanBatch does
+#Booleans are held back until a record touching their objects, or one that may
+#depend on any object, needs them
+def groupBooleans(records):
+	queue = BooleanQueue()
+	grouped = []
+	for record in records:
+		if isinstance(record, IRBoolean):
+			queue.add(record.kind, record.blanks, record.tools, record.keep)
+			continue
+		names = record.touches()
+		if queue.pending(None if names is None else list(names)):
+			grouped += _takeBooleans(queue)
+		grouped.append(record)
+	return grouped + _takeBooleans(queue)
+
+def _takeBooleans(queue):
+	return [IRBoolean(group.kind, group.blanks, group.tools, group.keep) for group in queue.take()]
+
+DEFAULT_PASSES = (mergeVariables, dedupeCoordinateSystems, dropRedundantCalls, groupBooleans)
+
+def optimize(records, passes=DEFAULT_PASSES):
+	return functools.reduce(lambda records, optimisation: optimisation(records), passes, list(records))
+
+
+#####Emitting#####
+
+#Optimises the records of ir and sends them to oDesign
+#Returns the records that were emitted
+def compileIR(ir, oDesign, passes=DEFAULT_PASSES):
+	records = optimize(ir.records, passes)
+	results = {}
+	for record in records:
+		emitRecord(record, oDesign, results)
+	return records
+
+def emitRecord(record, oDesign, results):
+	if isinstance(record, IRVariableBlock):
+		_emitVariables(oDesign, list(record.values.items()))
+	elif isinstance(record, IRVariable):
+		_emitVariables(oDesign, [[record.name, record.value]])
+	elif isinstance(record, IRBoolean):
+		if record.kind == "Unite":
+			_unite(oDesign, record.blanks + record.tools)
+		else:
+			_subtract(oDesign, ",".join(record.blanks), ",".join(record.tools), record.keep)
+	elif isinstance(record, IRQuery):
+		results[record.index] = getFaceIDs(oDesign, record.name)
+	else:
+		target = _target(oDesign, record.owner)
+		getattr(target, record.method)(*_resolve(record.args, results))
+		if isinstance(record, IRPrimitive):
+			getObjectRegistry(oDesign).add(record.name)
+
+#Variables the design already has are changed, the others created, one call each
+def _emitVariables(oDesign, props):
+	variables = getVariableCache(oDesign)
+	changed = [prop for prop in props if prop[0] in variables]
+	new = [prop for prop in props if prop[0] not in variables]
+	if new:
+		_localVariableChange(oDesign, "NewProps", new)
+	if changed:
+		_localVariableChange(oDesign, "ChangedProps", changed)
+
+def _target(oDesign, owner):
+	if owner == 'design':
+		return oDesign
+	if owner == 'editor':
+		return getEditor(oDesign)
+	return getModule(oDesign, owner)
+
+#Replaces placeholders by the query results of the target
+def _resolve(value, results):
+	if isinstance(value, IRValue):
+		if value.parts is not None:
+			return _joinFaceIDs([_resolve(part, results) for part in value.parts])
+		resolved = results[value.query]
+		for index in value.path:
+			resolved = resolved[index]
+		return resolved
+	if isinstance(value, list):
+		return [_resolve(item, results) for item in value]
+	if isinstance(value, tuple):
+		return tuple(_resolve(item, results) for item in value)
+	return value
+
+
+#####Incremental re-apply#####
+#A snapshot keeps the records last sent to a design. applyIncremental compares
+#a new build of the same design with it and only sends the difference:
+#changed variables become one ChangeProperty, and when the geometry changed,
+#what the old build created from the first differing record on (moved back to
+#the records creating every object involved) is deleted and sent again.
+
+SNAPSHOT_FORMAT = 'hfss-geometry-ir'
+SNAPSHOT_VERSION = 1
+
+RECORD_TYPES = dict((record_type.__name__, record_type) for record_type in
+					(IRVariable, IRVariableBlock, IRPrimitive, IRBoolean, IRCoordinateSystem, IRAssignment, IRQuery, IRCommand))
+
+def _settingsName(args):
+	return [[_argName(args[1])]]
+
+def _firstName(args):
+	return [[args[0]]]
+
+def _itemName(args):
+	return [[_argName(args[0])]]
+
+def _sweepName(args):
+	return [args[0], _argName(args[1])]
+
+#Module calls creating a named item: (module, method) -> [method deleting it,
+#arguments of the delete call from the arguments of the creating call]
+MODULE_DELETES = {
+	('AnalysisSetup', 'insertsetup'): ['DeleteSetups', _settingsName],
+	('AnalysisSetup', 'insertfrequencysweep'): ['DeleteSweep', _sweepName],
+	('Optimetrics', 'insertsetup'): ['DeleteSetups', _settingsName],
+	('ReportSetup', 'createreport'): ['DeleteReports', _firstName],
+	('RadField', 'insertfarfieldspheresetup'): ['DeleteFarFieldSetup', _itemName],
+	('RadField', 'insertnearfieldspheresetup'): ['DeleteNearFieldSetup', _itemName],
+	('RadField', 'insertnearfieldlinesetup'): ['DeleteNearFieldSetup', _itemName],
+	('RadField', 'insertnearfieldrectanglesetup'): ['DeleteNearFieldSetup', _itemName],
+	('RadField', 'insertnearfieldboxsetup'): ['DeleteNearFieldSetup', _itemName],
+}
+
+#Modules whose assignments are deleted by name, with the deleting method
+ASSIGNMENT_DELETES = {
+	'BoundarySetup': 'DeleteBoundaries',
+	'MeshSetup': 'DeleteOp',
+}
+
+#Module methods starting with these create something, re-sending one that
+#can not be deleted first would create it twice
+CREATING_PREFIXES = ('insert', 'create', 'add', 'assign')
+
+def _encode(value):
+	if isinstance(value, IRValue):
+		if value.parts is not None:
+			return {'$join': [_encode(part) for part in value.parts]}
+		return {'$query': value.query, 'path': list(value.path)}
+	if isinstance(value, (list, tuple)):
+		return [_encode(item) for item in value]
+	if isinstance(value, dict):
+		return dict((key, _encode(item)) for key, item in value.items())
+	#numpy scalars
+	if hasattr(value, 'item'):
+		return value.item()
+	return value
+
+def _decode(value):
+	if isinstance(value, dict):
+		if '$join' in value:
+			return IRValue(None, (), [_decode(part) for part in value['$join']])
+		if '$query' in value:
+			return IRValue(value['$query'], tuple(value['path']))
+		return dict((key, _decode(item)) for key, item in value.items())
+	if isinstance(value, list):
+		return [_decode(item) for item in value]
+	return value
+
+def encodeRecord(record):
+	encoded = {'type': type(record).__name__}
+	for cls in type(record).__mro__:
+		for slot in getattr(cls, '__slots__', ()):
+			encoded[slot] = _encode(getattr(record, slot))
+	return encoded
+
+def decodeRecord(encoded):
+	record_type = RECORD_TYPES[encoded['type']]
+	record = object.__new__(record_type)
+	for cls in record_type.__mro__:
+		for slot in getattr(cls, '__slots__', ()):
+			value = _decode(encoded[slot])
+			#Tuples come back from JSON as lists
+			if slot in ('path', 'key', 'clones') or (slot == 'args' and isinstance(record, IRQuery)):
+				value = tuple(value)
+			setattr(record, slot, value)
+	return record
+
+def saveSnapshot(records, path):
+	with open(path, 'w') as snapshot:
+		json.dump({'format': SNAPSHOT_FORMAT, 'version': SNAPSHOT_VERSION,
+				   'records': [encodeRecord(record) for record in records]}, snapshot, separators=(',', ':'))
+
+def loadSnapshot(path):
+	with open(path) as snapshot:
+		content = json.load(snapshot)
+	if content.get('format') != SNAPSHOT_FORMAT:
+		raise ValueError('%s is not a geometry IR snapshot' % path)
+	return [decodeRecord(encoded) for encoded in content['records']]
+
+#Final variable values, and the other records without handle fetches
+def _splitRecords(records):
+	values = {}
+	geometry = []
+	for record in records:
+		if isinstance(record, IRVariable):
+			values[record.name] = record.value
+		elif isinstance(record, IRVariableBlock):
+			values.update(record.values)
+		elif not (isinstance(record, IRCommand) and record.method.lower() in ('setactiveeditor', 'getmodule')):
+			geometry.append(record)
+	return [values, geometry]
+
+def _recordKey(record):
+	return json.dumps(encodeRecord(record), sort_keys=True)
+
+def _queryIndices(value, indices):
+	if isinstance(value, IRValue):
+		if value.parts is not None:
+			for part in value.parts:
+				_queryIndices(part, indices)
+		else:
+			indices.add(value.query)
+	elif isinstance(value, (list, tuple)):
+		for item in value:
+			_queryIndices(item, indices)
+	return indices
+
+#Objects a record creates, reads or changes, including those of the queries it uses
+def _involved(record, queries):
+	names = set(record.created())
+	names.update(record.touches() or ())
+	for index in _queryIndices(record.args, set()):
+		names.add(queries[index])
+	return names
+
+#Moves the cut back until no record before it involves an object involved after it
+def _extendCut(old, new, cut):
+	queries = dict((record.index, record.name) for record in old + new if isinstance(record, IRQuery))
+	while True:
+		names = set()
+		for record in old[cut:] + new[cut:]:
+			names |= _involved(record, queries)
+		start = cut
+		for index in range(cut):
+			if not names.isdisjoint(_involved(new[index], queries)):
+				start = index
+				break
+		if start == cut:
+			return cut
+		cut = start
+
+def _activeCS(records):
+	wcs = "Global"
+	for record in records:
+		if isinstance(record, IRCommand) and record.method.lower() == 'setwcs':
+			wcs = _argValue(record.args[0], "Working Coordinate System:=", wcs)
+	return wcs
+
+#Module call of a record that creates an item the re-apply can not delete
+def _undeletable(record):
+	if isinstance(record, IRAssignment):
+		return record.owner not in ASSIGNMENT_DELETES
+	if isinstance(record, IRCommand) and record.owner not in ('design', 'editor'):
+		key = (record.owner, record.method.lower())
+		return key not in MODULE_DELETES and key[1].startswith(CREATING_PREFIXES)
+	return False
+
+#Deletes what records created that still exists, returns the deleted names
+def _deleteCreated(oDesign, records):
+	#Checked before anything is deleted, the design is left as it was
+	for record in records:
+		if _undeletable(record):
+			raise ValueError('%s.%s can not be deleted to be sent again, rebuild the design without the snapshot'
+							 % (record.owner, record.method))
+	objects = []
+	removed = set()
+	assignments = {}
+	module_items = []
+	module_names = []
+	for record in records:
+		if isinstance(record, IRBoolean):
+			if record.kind == "Unite" or not record.keep:
+				removed.update(record.tools)
+		elif isinstance(record, IRAssignment):
+			if record.name:
+				assignments.setdefault(record.owner, []).append(record.name)
+		elif isinstance(record, IRCommand) and (record.owner, record.method.lower()) in MODULE_DELETES:
+			[method, delete_args] = MODULE_DELETES[(record.owner, record.method.lower())]
+			args = delete_args(record.args)
+			module_items.append((record.owner, method, args))
+			#The item is the last argument, alone in a list or after the setup it belongs to
+			module_names.append(args[-1][0] if isinstance(args[-1], list) else args[-1])
+		objects += [name for name in record.created() if not isinstance(record, IRAssignment)]
+	#A name is deleted once, even if several records created it
+	objects = [name for name in dict.fromkeys(objects) if name not in removed]
+	#Assignments first, deleting their objects may take them along
+	for owner, names in assignments.items():
+		getattr(getModule(oDesign, owner), ASSIGNMENT_DELETES[owner])(list(dict.fromkeys(names)))
+	#Sweeps before the setups they belong to
+	for [owner, method, args] in reversed(module_items):
+		getattr(getModule(oDesign, owner), method)(*args)
+	if objects:
+		getEditor(oDesign).Delete(
+			[
+				"NAME:Selections",
+				"Selections:="	, ",".join(objects)
+			])
+		registry = getObjectRegistry(oDesign)
+		for name in objects:
+			registry.remove(name)
+		invalidateFaceIDs(oDesign, objects)
+	deleted = [name for names in assignments.values() for name in dict.fromkeys(names)]
+	#An excitation is named like its sheet
+	return list(dict.fromkeys(objects + deleted + module_names))
+
+#Brings oDesign, last built from the snapshot at path, up to date with ir
+#Without a snapshot the whole build is compiled. The snapshot is replaced by ir afterwards.
+#Returns what was done: mode is "full", "unchanged", "variables" or "partial"
+def applyIncremental(ir, oDesign, path):
+	if not os.path.exists(path):
+		compileIR(ir, oDesign)
+		saveSnapshot(ir.records, path)
+		return {'mode': 'full', 'variables': [], 'deleted': [], 'sent': len(ir.records)}
+	[old_values, old] = _splitRecords(loadSnapshot(path))
+	[new_values, new] = _splitRecords(ir.records)
+	changed = [[name, value] for name, value in new_values.items() if old_values.get(name) != value]
+
+	old_keys = [_recordKey(record) for record in old]
+	new_keys = [_recordKey(record) for record in new]
+	cut = 0
+	while cut < len(old_keys) and cut < len(new_keys) and old_keys[cut] == new_keys[cut]:
+		cut += 1
+	if cut == len(old_keys) == len(new_keys):
+		if changed:
+			_emitVariables(oDesign, changed)
+		saveSnapshot(ir.records, path)
+		return {'mode': 'variables' if changed else 'unchanged', 'variables': [prop[0] for prop in changed],
+				'deleted': [], 'sent': 0}
+
+	cut = _extendCut(old, new, cut)
+	deleted = _deleteCreated(oDesign, old[cut:])
+	if changed:
+		_emitVariables(oDesign, changed)
+	#The tail starts from the working CS the unchanged records leave active
+	wcs = _activeCS(new[:cut])
+	if _activeCS(old) != wcs:
+		getEditor(oDesign).SetWCS(
+			[
+				"NAME:SetWCS Parameter",
+				"Working Coordinate System:=", wcs
+			])
+	records = optimize(new[cut:], (dedupeCoordinateSystems, groupBooleans))
+	results = {}
+	for record in records:
+		emitRecord(record, oDesign, results)
+	saveSnapshot(ir.records, path)
+	return {'mode': 'partial', 'variables': [prop[0] for prop in changed], 'deleted': deleted, 'sent': len(records)}
@@ -0,0 +1,409 @@
+import itertools
+import numpy as np
+
+# from HFSS_Python.GeometryIR import IRPrimitive, IRBoolean, IRCoordinateSystem, IRAssignment, IRQuery, IRCommand, IRValue, IRVariable, IRVariableBlock, _argValue # <--- uncomment this if importing submodule
+from GeometryIR import IRPrimitive, IRBoolean, IRCoordinateSystem, IRAssignment, IRQuery, IRCommand, IRValue, IRVariable, IRVariableBlock, _argValue # <-- Comment this out if importing submodule
+# from HFSS_Python.Expressions import ExpressionEvaluator # <--- uncomment this if importing submodule
+from Expressions import ExpressionEvaluator # <-- Comment this out if importing submodule
+# from HFSS_Python.Units import UNITS # <--- uncomment this if importing submodule
+from Units import UNITS # <-- Comment this out if importing submodule
+
+#Pre-flight checks of a build recorded in a GeometryIR, before any COM call
+#Every primitive gets an axis-aligned bounding box in world coordinates (its
+#relative CS applied) in metres. Boxes follow booleans, moves, rotations and
+#duplicates, and the solids are put in a uniform grid so overlapping pairs are
+#found without comparing every pair, also for arrays of 10^5 primitives.
+#
+#	issues = validateIR(ir)
+#	for issue in issues: print(issue)
+#
+#Reported: overlapping solids (air/vacuum and subtracted or united pairs are
+#exempt), subtraction tools not intersecting any of their blanks, objects
+#reaching outside a radiation boundary, and values that could not be evaluated.
+#Values are evaluated with an ExpressionEvaluator over the recorded variables.
+
+#Numbers without units are in the model units, millimetres and degrees
+MODEL_LENGTH = UNITS['mm']
+MODEL_ANGLE = UNITS['deg']
+
+#Materials that do not count as overlapping anything
+AIR_MATERIALS = {'vacuum', 'air'}
+
+#Solids, the other primitives are sheets or curves
+SOLID_METHODS = {'createbox', 'createcylinder', 'createsphere', 'createcone', 'createtorus', 'createregularpolyhedron'}
+
+#Boxes closer than this (metres) do not overlap
+TOLERANCE = 1e-9
+
+
+class ValidationIssue(object):
+	__slots__ = ('kind', 'objects', 'message')
+
+	def __init__(self, kind, objects, message):
+		self.kind = kind
+		self.objects = objects
+		self.message = message
+
+	def __repr__(self):
+		return '<%s %s>' % (self.kind, self.message)
+
+	def __str__(self):
+		return '%s: %s' % (self.kind, self.message)
+
+
+class GeometryValidator(object):
+
+	def __init__(self, ir, cell_size=None):
+		self.ir = ir
+		self.cell_size = cell_size
+		self.variables = {}
+		self.evaluator = ExpressionEvaluator(self.variables)
+		#World transform (4x4) per coordinate system
+		self.transforms = {'Global': np.eye(4)}
+		self.wcs = 'Global'
+		#name -> [min corner, max corner]
+		self.boxes = {}
+		self.solids = set()
+		self.air = set()
+		self.spheres = {}
+		#Pairs that may overlap: blank and tool of a subtraction, objects of a union
+		self.exempt = {}
+		self.queries = {}
+		self.radiation = set()
+		self.issues = []
+
+	#SI value of an expression, numbers without units are scaled by unitless
+	def value(self, value, name, unitless=MODEL_LENGTH):
+		try:
+			result = self.evaluator.evaluate(value)
+			if not self.evaluator.hasUnits(value):
+				result *= unitless
+			return result
+		except (KeyError, ValueError, TypeError) as error:
+			self.issues.append(ValidationIssue('unresolved', [name], 'can not evaluate %r of %s: %s' % (value, name, error)))
+			return None
+
+	def vector(self, values, keys, name, unitless=MODEL_LENGTH):
+		vector = [self.value(_argValue(values, key), name, unitless) for key in keys]
+		if any(component is None for component in vector):
+			return None
+		return np.array(vector)
+
+	def exemptPair(self, a, b):
+		self.exempt.setdefault(a, set()).add(b)
+		self.exempt.setdefault(b, set()).add(a)
+
+	def validate(self):
+		for record in self.ir.records:
+			self.apply(record)
+		self.checkOverlaps()
+		self.checkRadiation()
+		return self.issues
+
+	def apply(self, record):
+		if isinstance(record, IRVariable):
+			self.variables[record.name] = record.value
+			self.evaluator.invalidate()
+		elif isinstance(record, IRVariableBlock):
+			self.variables.update(record.values)
+			self.evaluator.invalidate()
+		elif isinstance(record, IRCoordinateSystem):
+			self.coordinateSystem(record)
+		elif isinstance(record, IRPrimitive):
+			self.primitive(record)
+		elif isinstance(record, IRBoolean):
+			self.boolean(record)
+		elif isinstance(record, IRQuery):
+			self.queries[record.index] = record.name
+		elif isinstance(record, IRAssignment):
+			if record.method.lower() == 'assignradiation':
+				self.radiation.update(record.objects)
+				self.radiation.update(self.queries[index] for index in _queries(record.args, set()) if index in self.queries)
+		elif isinstance(record, IRCommand):
+			self.command(record)
+
+	def coordinateSystem(self, record):
+		parameters = record.args[0]
+		origin = self.vector(parameters, ("OriginX:=", "OriginY:=", "OriginZ:="), record.name)
+		x_axis = self.vector(parameters, ("XAxisXvec:=", "XAxisYvec:=", "XAxisZvec:="), record.name)
+		y_axis = self.vector(parameters, ("YAxisXvec:=", "YAxisYvec:=", "YAxisZvec:="), record.name)
+		if origin is None or x_axis is None or y_axis is None:
+			return
+		x_axis = x_axis / np.linalg.norm(x_axis)
+		y_axis = y_axis - np.dot(y_axis, x_axis) * x_axis
+		y_axis = y_axis / np.linalg.norm(y_axis)
+		local = np.eye(4)
+		local[:3, 0] = x_axis
+		local[:3, 1] = y_axis
+		local[:3, 2] = np.cross(x_axis, y_axis)
+		local[:3, 3] = origin
+		self.transforms[record.name] = np.matmul(self.transforms.get(record.wcs, np.eye(4)), local)
+
+	#Corners of the primitive in its own coordinate system
+	def corners(self, record):
+		key = record.method.lower()
+		parameters = record.args[0]
+		name = record.name
+		if key == 'createbox':
+			start = self.vector(parameters, ("XPosition:=", "YPosition:=", "ZPosition:="), name)
+			size = self.vector(parameters, ("XSize:=", "YSize:=", "ZSize:=" if "ZSize:=" in parameters else "Zsize:="), name)
+			if start is None or size is None:
+				return None
+			return np.array([start, start + size])
+		if key == 'createrectangle':
+			start = self.vector(parameters, ("XStart:=", "YStart:=", "ZStart:="), name)
+			width = self.value(_argValue(parameters, "Width:="), name)
+			height = self.value(_argValue(parameters, "Height:="), name)
+			if start is None or width is None or height is None:
+				return None
+			#Width and height run along the two axes following WhichAxis
+			axis = "XYZ".index(_argValue(parameters, "WhichAxis:=", "Z"))
+			end = start.copy()
+			end[(axis+1) % 3] += width
+			end[(axis+2) % 3] += height
+			return np.array([start, end])
+		if key in ('createcylinder', 'createcircle', 'createsphere'):
+			center = self.vector(parameters, ("XCenter:=", "YCenter:=", "ZCenter:="), name)
+			radius = self.value(_argValue(parameters, "Radius:="), name)
+			if center is None or radius is None:
+				return None
+			low = center - abs(radius)
+			high = center + abs(radius)
+			if key != 'createsphere':
+				axis = "XYZ".index(_argValue(parameters, "WhichAxis:=", "Z"))
+				height = 0.0
+				if key == 'createcylinder':
+					height = self.value(_argValue(parameters, "Height:="), name)
+					if height is None:
+						return None
+				low[axis] = min(center[axis], center[axis] + height)
+				high[axis] = max(center[axis], center[axis] + height)
+			return np.array([low, high])
+		if key == 'createpolyline':
+			points = []
+			for item in parameters:
+				if isinstance(item, list) and item and item[0] == "NAME:PolylinePoints":
+					for point in item[1:]:
+						points.append(self.vector(point, ("X:=", "Y:=", "Z:="), name))
+			if not points or any(point is None for point in points):
+				return None
+			points = np.array(points)
+			return np.array([points.min(axis=0), points.max(axis=0)])
+		return None
+
+	def primitive(self, record):
+		corners = self.corners(record)
+		if corners is None:
+			return
+		transform = self.transforms.get(record.cs)
+		if transform is None:
+			self.issues.append(ValidationIssue('unresolved', [record.name], 'unknown coordinate system %s of %s' % (record.cs, record.name)))
+			return
+		self.boxes[record.name] = _transformBox(corners, transform)
+		attributes = record.args[1] if len(record.args) > 1 else []
+		material = str(_argValue(attributes, "MaterialValue:=", "")).strip('"').lower()
+		if material in AIR_MATERIALS:
+			self.air.add(record.name)
+		if record.method.lower() in SOLID_METHODS:
+			self.solids.add(record.name)
+		if record.method.lower() == 'createsphere':
+			center = self.vector(record.args[0], ("XCenter:=", "YCenter:=", "ZCenter:="), record.name)
+			radius = self.value(_argValue(record.args[0], "Radius:="), record.name)
+			self.spheres[record.name] = (np.matmul(transform, np.append(center, 1.0))[:3], abs(radius))
+
+	def boolean(self, record):
+		for blank in record.blanks:
+			for tool in record.tools:
+				self.exemptPair(blank, tool)
+		if record.kind == "Subtract":
+			#Checked where the subtraction happens, the tools may be gone afterwards
+			self.checkSubtraction(record.blanks, record.tools)
+			if not record.keep:
+				for tool in record.tools:
+					self.remove(tool)
+		else:
+			target = record.blanks[0]
+			boxes = [self.boxes[name] for name in record.blanks + record.tools if name in self.boxes]
+			if boxes:
+				self.boxes[target] = np.array([np.min([box[0] for box in boxes], axis=0), np.max([box[1] for box in boxes], axis=0)])
+			for tool in record.tools:
+				if tool in self.solids:
+					self.solids.add(target)
+				self.remove(tool)
+
+	def remove(self, name):
+		self.boxes.pop(name, None)
+		self.solids.discard(name)
+		self.spheres.pop(name, None)
+
+	def command(self, record):
+		key = record.method.lower()
+		if key == 'setwcs':
+			self.wcs = _argValue(record.args[0], "Working Coordinate System:=", self.wcs)
+			return
+		selections = record.selections or []
+		transform = self.transforms.get(self.wcs, np.eye(4))
+		if key == 'move':
+			vector = self.vector(record.args[1], ("TranslateVectorX:=", "TranslateVectorY:=", "TranslateVectorZ:="), selections[0] if selections else key)
+			if vector is not None:
+				self.transformObjects(selections, _translation(np.matmul(transform[:3, :3], vector)))
+		elif key == 'rotate':
+			angle = self.value(_argValue(record.args[1], "RotateAngle:="), selections[0] if selections else key, MODEL_ANGLE)
+			if angle is not None:
+				self.transformObjects(selections, _axisRotation(transform, _argValue(record.args[1], "RotateAxis:=", "Z"), angle))
+		elif key == 'duplicatealongline':
+			vector = self.vector(record.args[1], ("XComponent:=", "YComponent:=", "ZComponent:="), selections[0] if selections else key)
+			if vector is not None:
+				step = np.matmul(transform[:3, :3], vector)
+				self.duplicate(record, lambda k: _translation(k * step))
+		elif key == 'duplicatearoundaxis':
+			angle = self.value(_argValue(record.args[1], "AngleStr:="), selections[0] if selections else key, MODEL_ANGLE)
+			if angle is not None:
+				axis = _argValue(record.args[1], "WhichAxis:=", "Z")
+				self.duplicate(record, lambda k: _axisRotation(transform, axis, k * angle))
+
+	def transformObjects(self, names, matrix):
+		for name in names:
+			if name in self.boxes:
+				self.boxes[name] = _transformBox(self.boxes[name], matrix)
+			if name in self.spheres:
+				center, radius = self.spheres[name]
+				self.spheres[name] = (np.matmul(matrix, np.append(center, 1.0))[:3], radius)
+
+	#Clones come per selection, count-1 of them, clone k transformed by transform_of(k)
+	def duplicate(self, record, transform_of):
+		selections = record.selections or []
+		if not selections:
+			return
+		count = len(record.clones) // len(selections)
+		clones = dict((selections[i], record.clones[i*count:(i+1)*count]) for i in range(len(selections)))
+		for k in range(count):
+			matrix = transform_of(k+1)
+			for name in selections:
+				clone = clones[name][k]
+				if name in self.boxes:
+					self.boxes[clone] = _transformBox(self.boxes[name], matrix)
+				for group in (self.solids, self.air):
+					if name in group:
+						group.add(clone)
+				if name in self.spheres:
+					center, radius = self.spheres[name]
+					self.spheres[clone] = (np.matmul(matrix, np.append(center, 1.0))[:3], radius)
+				for partner in self.exempt.get(name, ()):
+					if partner in clones:
+						self.exemptPair(clone, clones[partner][k])
+
+	#Overlapping solids, found through a uniform grid of cells
+	def checkOverlaps(self):
+		names = [name for name in self.solids if name in self.boxes and name not in self.air]
+		if len(names) < 2:
+			return
+		names.sort()
+		lows = np.array([self.boxes[name][0] for name in names])
+		highs = np.array([self.boxes[name][1] for name in names])
+		for [i, j] in _overlappingPairs(lows, highs, self.cell_size):
+			if names[j] in self.exempt.get(names[i], ()):
+				continue
+			self.issues.append(ValidationIssue('overlap', [names[i], names[j]], '%s overlaps %s' % (names[i], names[j])))
+
+	def checkSubtraction(self, blanks, tools):
+		blank_boxes = [self.boxes[blank] for blank in blanks if blank in self.boxes]
+		if not blank_boxes:
+			return
+		for tool in tools:
+			if tool not in self.boxes:
+				continue
+			box = self.boxes[tool]
+			if not any(_intersect(box, blank_box) for blank_box in blank_boxes):
+				self.issues.append(ValidationIssue('tool_miss', [tool] + list(blanks), '%s does not intersect %s' % (tool, ', '.join(blanks))))
+
+	#Every object must lie inside the radiation boundary, spheres are checked corner by corner
+	def checkRadiation(self):
+		for boundary in self.radiation:
+			if boundary not in self.boxes:
+				continue
+			for name, box in self.boxes.items():
+				if name == boundary or name in self.radiation:
+					continue
+				if boundary in self.spheres:
+					center, radius = self.spheres[boundary]
+					corners = np.array(list(itertools.product(*zip(box[0], box[1]))))
+					outside = np.any(np.linalg.norm(corners - center, axis=1) > radius + TOLERANCE)
+				else:
+					outside = np.any(box[0] < self.boxes[boundary][0] - TOLERANCE) or np.any(box[1] > self.boxes[boundary][1] + TOLERANCE)
+				if outside:
+					self.issues.append(ValidationIssue('outside', [name, boundary], '%s reaches outside the radiation boundary %s' % (name, boundary)))
+
+
+def validateIR(ir, cell_size=None):
+	return GeometryValidator(ir, cell_size).validate()
+
+
+def _queries(value, indices):
+	if isinstance(value, IRValue):
+		if value.parts is not None:
+			for part in value.parts:
+				_queries(part, indices)
+		else:
+			indices.add(value.query)
+	elif isinstance(value, (list, tuple)):
+		for item in value:
+			_queries(item, indices)
+	return indices
+
+#Bounding box of a box [low, high] after a 4x4 transform
+def _transformBox(box, matrix):
+	corners = np.array(list(itertools.product(*zip(box[0], box[1]))))
+	corners = np.matmul(corners, matrix[:3, :3].T) + matrix[:3, 3]
+	return np.array([corners.min(axis=0), corners.max(axis=0)])
+
+def _translation(vector):
+	matrix = np.eye(4)
+	matrix[:3, 3] = vector
+	return matrix
+
+#Rotation by angle about the X, Y or Z axis of the coordinate system with world transform cs
+def _axisRotation(cs, axis, angle):
+	c = np.cos(angle)
+	s = np.sin(angle)
+	i = "XYZ".index(axis)
+	rotation = np.eye(4)
+	[a, b] = [(i+1) % 3, (i+2) % 3]
+	rotation[a, a] = c
+	rotation[a, b] = -s
+	rotation[b, a] = s
+	rotation[b, b] = c
+	return np.matmul(np.matmul(cs, rotation), np.linalg.inv(cs))
+
+#Interiors of a and b intersect, a sheet only has to touch along its flat axis
+def _intersect(a, b):
+	flat = (a[1] - a[0] <= TOLERANCE) | (b[1] - b[0] <= TOLERANCE)
+	inside = (a[0] < b[1] - TOLERANCE) & (b[0] < a[1] - TOLERANCE)
+	touching = (a[0] <= b[1] + TOLERANCE) & (b[0] <= a[1] + TOLERANCE)
+	return bool(np.all(np.where(flat, touching, inside)))
+
+#Pairs i<j of boxes whose interiors overlap
+#Boxes are put in every grid cell they cover, only boxes sharing a cell are compared
+def _overlappingPairs(lows, highs, cell_size=None):
+	if cell_size is None:
+		#Twice the median box size keeps most boxes within a few cells
+		cell_size = 2 * float(np.median(np.max(highs - lows, axis=1)))
+		if cell_size <= 0:
+			cell_size = 1.0
+	first = np.floor(lows / cell_size).astype(np.int64)
+	last = np.floor(highs / cell_size).astype(np.int64)
+	cells = {}
+	for index in range(len(lows)):
+		for cell in itertools.product(*[range(first[index, axis], last[index, axis] + 1) for axis in range(3)]):
+			cells.setdefault(cell, []).append(index)
+	pairs = set()
+	for members in cells.values():
+		if len(members) < 2:
+			continue
+		members = np.array(members)
+		low = lows[members]
+		high = highs[members]
+		overlap = np.all((low[:, None, :] < high[None, :, :] - TOLERANCE) & (low[None, :, :] < high[:, None, :] - TOLERANCE), axis=2)
+		[a, b] = np.nonzero(np.triu(overlap, 1))
+		pairs.update(zip(members[a].tolist(), members[b].tolist()))
+	return sorted(pairs)
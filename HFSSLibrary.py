@@ -1,87 +1,124 @@
-import win32com.client
+try:
+	import win32com.client
+except ImportError:
+	#Only needed to talk to HFSS, replaying a tape works without it
+	win32com = None
 import numpy as np
+import functools
+import logging
+import weakref
+from contextlib import contextmanager
 
 # from HFSS_Python.DualQuaternion import * # <--- uncomment this if importing submodule
 from DualQuaternion import * # <-- Comment this out if importing submodule
-
-def openHFSS():
-
-	oAnsys=win32com.client.Dispatch('AnsoftHFSS.HfssScriptInterface')
+# from HFSS_Python.ComInstrumentation import ComProfiler, instrument # <--- uncomment this if importing submodule
+from ComInstrumentation import ComProfiler, instrument # <-- Comment this out if importing submodule
+# from HFSS_Python.ComTape import TapeRecorder, TapeReplayer # <--- uncomment this if importing submodule
+from ComTape import TapeRecorder, TapeReplayer # <-- Comment this out if importing submodule
+# from HFSS_Python.ScriptEmitter import ScriptEmitter, ScriptValue, formatValue # <--- uncomment this if importing submodule
+from ScriptEmitter import ScriptEmitter, ScriptValue, formatValue # <-- Comment this out if importing submodule
+# from HFSS_Python.ComDispatcher import ComDispatcher, PendingValue # <--- uncomment this if importing submodule
+from ComDispatcher import ComDispatcher, PendingValue # <-- Comment this out if importing submodule
+# from HFSS_Python.Expressions import ExpressionEvaluator # <--- uncomment this if importing submodule
+from Expressions import ExpressionEvaluator # <-- Comment this out if importing submodule
+# from HFSS_Python.VariableGraph import VariableGraph # <--- uncomment this if importing submodule
+from VariableGraph import VariableGraph # <-- Comment this out if importing submodule
+# from HFSS_Python.Units import convert, valueString, valueStrings # <--- uncomment this if importing submodule
+from Units import convert, valueString, valueStrings # <-- Comment this out if importing submodule
+
+#Diagnostics go through logging so they cost nothing unless enabled with setVerbosity
+logger = logging.getLogger("HFSS_Python")
+
+#Shows library diagnostics at level and above on the console
+#setVerbosity(logging.DEBUG) brings back the output the library used to print
+def setVerbosity(level=logging.DEBUG):
+	logger.setLevel(level)
+	if not logger.handlers:
+		handler = logging.StreamHandler()
+		handler.setFormatter(logging.Formatter('%(name)s: %(message)s'))
+		logger.addHandler(handler)
+
+#Pass a ComProfiler as profiler to count and time every COM call made through
+#the returned objects and everything obtained from them (projects, designs, editors, modules)
+#record: path of a tape the whole COM session is written to (see ComTape)
+#replay: path of a recorded tape, or a TapeReplayer, served back instead of starting HFSS
+#emitter: a ScriptEmitter the build is written to as one HFSS script instead of being run
+#dispatcher: a ComDispatcher making every COM call on its own thread, calls then
+#return PendingValues right away (the profiler then runs on that thread and
+#attributes calls to '<script>')
+def openHFSS(profiler=None, record=None, replay=None, emitter=None, dispatcher=None):
+
+	def connect():
+		if emitter is not None:
+			oAnsys = emitter.ansys()
+		elif replay is not None:
+			oAnsys = (replay if isinstance(replay, TapeReplayer) else TapeReplayer(replay)).object(0)
+		else:
+			if win32com is None:
+				raise ImportError('win32com (pywin32) is required to open HFSS')
+			oAnsys=win32com.client.Dispatch('AnsoftHFSS.HfssScriptInterface')
+			if record is not None:
+				oAnsys = TapeRecorder(record).wrap(oAnsys, 'oAnsys')
+		if profiler is not None:
+			oAnsys = instrument(oAnsys, profiler, 'oAnsys')
+		return oAnsys
+
+	#COM objects belong to the apartment that created them, so the worker creates them
+	if dispatcher is not None:
+		oAnsys = dispatcher.call(connect)
+	else:
+		oAnsys = connect()
 	oDesktop=oAnsys.GetAppDesktop()
-	print('Successfully Opened Desktop App\n')
+	logger.info('Successfully Opened Desktop App')
 	return [oAnsys, oDesktop]
 
 # Draw Polygon from corner points
+# coords and node_id_list are not changed, the closing point is added to copies
 def drawPolygon(oDesign, coords, units, names = "", Transparency= 0, node_id_list = [], XSectionType = 0, XSectionDiameter = 0.0):
-	oEditor = oDesign.SetActiveEditor("3D Modeler")
-
-	if XSectionType == 1:
-		polyline_parameters = ["NAME:PolylineParameters","IsPolylineCovered:=", False,
-		"IsPolylineClosed:="	, True]
-	else:
-		polyline_parameters = ["NAME:PolylineParameters", "IsPolylineCovered:=", True,
-							   "IsPolylineClosed:=", True]
-
-	polyline_points=["NAME:PolylinePoints"]
-	polyline_segments=["NAME:PolylineSegments"]
+	oEditor = getEditor(oDesign)
 
-	print(coords)
-	print(len(coords))
-	print(len(node_id_list))
+	#Checked once, the polygon may have many vertices
+	debug = logger.isEnabledFor(logging.DEBUG)
+	if debug:
+		logger.debug('polygon coords %s', coords)
+		logger.debug('%d coords, %d node ids', len(coords), len(node_id_list))
 
-	# End point is duplicated in coords, so need this loop before the polyline_points creator loop
-	for start_index in range(len(coords)):
-		polyline_segments.append(
-			[
-				"NAME:PLSegment",
-				"SegmentType:="		, "Line",
-				"StartIndex:="		, start_index,
-				"NoOfPoints:="		, 2
-			])
-
-	name = ""
-	coords.append(coords[0])
+	# End point is duplicated in coords
+	coords = list(coords) + [coords[0]]
+	node_id_list = list(node_id_list)
 	if len(node_id_list)>0:
 		node_id_list.append(node_id_list[0])
-	for point in coords:
-		if len(node_id_list)==len(coords):
-			point_index = coords.index(point)
-			node_id = int(node_id_list[point_index])
-			temp_names = ["x{0}".format(node_id),"y{0}".format(node_id),"z{0}".format(node_id),names[-1]]
-			print("new_point:",point)
-			[xStr, yStr, zStr, name] = name_handler(oDesign, point, units, temp_names)
-			polyline_points.append(["NAME:PLPoint", "X:=", xStr, "Y:=", yStr, "Z:=", zStr])
-			print(xStr,yStr,zStr)
-		else:
-			print(point)
-			[xStr, yStr, zStr, name] = name_handler(oDesign, point, units, names)
-			polyline_points.append(["NAME:PLPoint", "X:=", xStr, "Y:=", yStr, "Z:=", zStr])
 
-	polyline_parameters.append(polyline_points)
-	polyline_parameters.append(polyline_segments)
+	if len(node_id_list)==len(coords):
+		#Every vertex is stored in variables x<id>, y<id>, z<id>, all sent in one batch
+		name = names[-1]
+		point_strings = []
+		with variableBatch(oDesign):
+			for point, node_id in zip(coords, node_id_list):
+				node_id = int(node_id)
+				temp_names = ["x{0}".format(node_id),"y{0}".format(node_id),"z{0}".format(node_id)]
+				point_strings.append([localVar(oDesign, temp_names[i], value) for i, value in enumerate(_variableStrings(point, units))])
+		#Inside an outer batch the variables are still queued, they have to exist before the polyline uses them
+		commitVariables(oDesign, changed=False)
+	elif isinstance(names, str):
+		#No variables, every coordinate is formatted in one pass
+		name = names
+		point_strings = _variableStrings([value for point in coords for value in point], units)
+		point_strings = [point_strings[i:i+3] for i in range(0, len(point_strings), 3)]
+	else:
+		point_strings = []
+		for point in coords:
+			[xStr, yStr, zStr, name] = name_handler(oDesign, point, units, names)
+			point_strings.append([xStr, yStr, zStr])
+	if debug:
+		logger.debug('point strings %s', point_strings)
 
+	segments = [["Line", 2]] * (len(coords)-1)
 	if XSectionType == 1:
-		polyline_parameters.append([
-			"NAME:PolylineXSection",
-			"XSectionType:=", "Circle",
-			"XSectionOrient:=", "Auto",
-			"XSectionWidth:=", "{0}{1}".format(XSectionDiameter,units),
-			"XSectionTopWidth:=", "0{0}".format(units),
-			"XSectionHeight:=", "0{0}".format(units),
-			"XSectionNumSegments:=", "0",
-			"XSectionBendType:=", "Corner"
-		])
+		xsection = _polylineXSection("Circle", XSectionDiameter, 0, 0, units)
 	else:
-		polyline_parameters.append([
-			"NAME:PolylineXSection",
-			"XSectionType:=", "None",
-			"XSectionOrient:=", "Auto",
-			"XSectionWidth:=", "0{0}".format(units),
-			"XSectionTopWidth:=", "0{0}".format(units),
-			"XSectionHeight:=", "0{0}".format(units),
-			"XSectionNumSegments:=", "0",
-			"XSectionBendType:=", "Corner"
-		])
+		xsection = _polylineXSection("None", 0, 0, 0, units)
+	polyline_parameters = _polylineParameters(point_strings, segments, XSectionType != 1, True, xsection)
 
 	polyline_attributes = [
 		"NAME:Attributes",
@@ -97,32 +134,124 @@ def drawPolygon(oDesign, coords, units, names = "", Transparency= 0, node_id_lis
 
 
 	oEditor.CreatePolyline([polyline_parameters],[polyline_attributes])
-	print(polyline_parameters)
+	getObjectRegistry(oDesign).add(name)
+	if debug:
+		logger.debug('polyline parameters %s', polyline_parameters)
+
+#Draws a polyline through points, an (N,3) array (or list of [x, y, z]) in units
+#segments is None or "Line" for straight lines between all points, "Spline" for one
+#spline through all of them, or a list of [segment_type, points] ("Line" 2 points,
+#"Arc" 3 points: start, a point on the arc and end, "Spline" any number) following
+#each other, each starting at the last point of the one before.
+#closed repeats the first point at the end if needed and covered makes a sheet of a closed polyline.
+#The cross section ("None", "Line", "Circle", "Rectangle" or "Trapezoid") turns the polyline into a
+#sheet or solid along it. points is not changed; all points are formatted in one pass.
+def drawPolyline(oDesign, points, units, name, segments=None, closed=False, covered=False, cs="Global", material="vacuum",
+				 XSectionType="None", XSectionWidth=0, XSectionHeight=0, XSectionTopWidth=0, Transparency=0):
+	oEditor = getEditor(oDesign)
+
+	points = np.asarray(points, dtype=float)
+	if points.ndim != 2 or points.shape[1] != 3 or len(points) < 2:
+		raise ValueError('<points> must be an (N,3) array of at least 2 points')
+	if closed and not np.array_equal(points[0], points[-1]):
+		points = np.concatenate([points, points[:1]])
+	segments = _polylineSegments(segments, len(points))
+	xsection = _polylineXSection(XSectionType, XSectionWidth, XSectionHeight, XSectionTopWidth, units)
+	polyline_parameters = _polylineParameters(valueStrings(points, units), segments, covered, closed, xsection)
 
+	SolveInside=True
+	#PEC is the only case I can think of where this would need to be false; Add other cases if needed
+	if(material == "pec"):
+		SolveInside=False
+	oEditor.CreatePolyline(polyline_parameters,
+		[
+			"NAME:Attributes",
+			"Name:="		, name,
+			"Flags:="		, "",
+			"Color:="		, "(132 132 193)",
+			"Transparency:="	, Transparency,
+			"PartCoordinateSystem:=", cs,
+			"UDMId:="		, "",
+			"MaterialValue:="	, "\"" +material   + "\"",
+			"SolveInside:="		, SolveInside
+		])
+	getObjectRegistry(oDesign).add(name)
+	return name
+
+#[segment_type, points] list covering count points
+def _polylineSegments(segments, count):
+	if segments is None or segments == "Line":
+		return [["Line", 2]] * (count-1)
+	if segments == "Spline":
+		return [["Spline", count]]
+	segments = [[segment_type, int(points)] for [segment_type, points] in segments]
+	for [segment_type, points] in segments:
+		if points < (3 if segment_type in ("Arc", "AngularArc") else 2):
+			raise ValueError('a %s segment of %d points' % (segment_type, points))
+	last = sum(points-1 for [segment_type, points] in segments)
+	if last != count-1:
+		raise ValueError('segments cover %d points, the polyline has %d' % (last+1, count))
+	return segments
+
+#PolylineParameters of points (strings [x, y, z]) joined by segments
+def _polylineParameters(point_strings, segments, covered, closed, xsection):
+	polyline_points = ["NAME:PolylinePoints"]
+	polyline_points += [["NAME:PLPoint", "X:=", xStr, "Y:=", yStr, "Z:=", zStr] for [xStr, yStr, zStr] in point_strings]
+	polyline_segments = ["NAME:PolylineSegments"]
+	start_index = 0
+	for [segment_type, points] in segments:
+		polyline_segments.append(
+			[
+				"NAME:PLSegment",
+				"SegmentType:="		, segment_type,
+				"StartIndex:="		, start_index,
+				"NoOfPoints:="		, points
+			])
+		start_index += points-1
+	return [
+		"NAME:PolylineParameters",
+		"IsPolylineCovered:="	, covered,
+		"IsPolylineClosed:="	, closed,
+		polyline_points,
+		polyline_segments,
+		xsection
+	]
+
+def _polylineXSection(XSectionType, width, height, top_width, units):
+	[widthStr, heightStr, topWidthStr] = _variableStrings([width, height, top_width], units)
+	return [
+		"NAME:PolylineXSection",
+		"XSectionType:="	, XSectionType,
+		"XSectionOrient:="	, "Auto",
+		"XSectionWidth:="	, widthStr,
+		"XSectionTopWidth:="	, topWidthStr,
+		"XSectionHeight:="	, heightStr,
+		"XSectionNumSegments:="	, "0",
+		"XSectionBendType:="	, "Corner"
+	]
 
 
 
 
 # draft_type can be "Round", "Extended", or "Normal"
 def sweep_along_vector(oDesign, sweep_vector, draft_angle, draft_type, units, object_selections):
-	oEditor = oDesign.SetActiveEditor("3D Modeler")
+	oEditor = getEditor(oDesign)
 
-	print(type(object_selections))
+	logger.debug('object selections type %s', type(object_selections))
 	if type(object_selections) is str:
 		selections_string = object_selections
 	elif type(object_selections) is tuple:
 		selections_string = ""
 		for object in object_selections:
 			selections_string += object + ","
-		print("selections string",selections_string)
+		logger.debug('selections string %s', selections_string)
 	else:
 		raise TypeError
 
 
-	xStr = '%f' % (sweep_vector[0]) + units
-	yStr = '%f' % (sweep_vector[1]) + units
-	zStr = '%f' % (sweep_vector[2]) + units
-	draft_angle_str = '%fdeg' % draft_angle
+	flushBooleans(oDesign, selections_string)
+	[xStr, yStr, zStr] = valueStrings(np.ravel(sweep_vector)[:3], units)
+	draft_angle_str = valueString(draft_angle, 'deg')
 	oEditor.SweepAlongVector(
 	[
 		"NAME:Selections",
@@ -138,26 +267,26 @@ def sweep_along_vector(oDesign, sweep_vector, draft_angle, draft_type, units, ob
 		"SweepVectorY:="	, yStr,
 		"SweepVectorZ:="	, zStr
 	])
+	invalidateFaceIDs(oDesign, selections_string)
 
 #Move Function
 def move(oDesign, translation_vector, units, object_selections):
-	oEditor = oDesign.SetActiveEditor("3D Modeler")
+	oEditor = getEditor(oDesign)
 
-	print(type(object_selections))
+	logger.debug('object selections type %s', type(object_selections))
 	if type(object_selections) is str:
 		selections_string = object_selections
 	elif type(object_selections) is tuple:
 		selections_string = ""
 		for object in object_selections:
 			selections_string += object + ","
-		print("selections string",selections_string)
+		logger.debug('selections string %s', selections_string)
 	else:
 		raise TypeError
 
 
-	xStr = '%f' % (translation_vector[0]) + units
-	yStr = '%f' % (translation_vector[1]) + units
-	zStr = '%f' % (translation_vector[2]) + units
+	flushBooleans(oDesign, selections_string)
+	[xStr, yStr, zStr] = valueStrings(np.ravel(translation_vector)[:3], units)
 	oEditor.Move(
 	[
 		"NAME:Selections",
@@ -170,13 +299,24 @@ def move(oDesign, translation_vector, units, object_selections):
 		"TranslateVectorY:="	, yStr,
 		"TranslateVectorZ:="	, zStr
 	])
+	invalidateFaceIDs(oDesign, selections_string)
 
 
 #Move Function copying object and duplicating along line, Number of Clones telling how many copies along the line
 def duplicate_along_line(oDesign, move_vector, units, object_selections, num_clones):
-	oEditor = oDesign.SetActiveEditor("3D Modeler")
+	oEditor = getEditor(oDesign)
 
 	[xStr,yStr,zStr,name]=name_handler(oDesign,move_vector,units,'')
+	flushBooleans(oDesign, object_selections)
+
+	#Clone names come from the design's object registry, which knows every name in use
+	#They are reserved before duplicating, the copies must not count as existing names
+	objects = getObjectRegistry(oDesign)
+	if isinstance(object_selections,str):
+		selections = [object_selections]
+	else:
+		selections = list(object_selections)
+	clones = dict((object, [objects.cloneName(object) for i in range(1,num_clones)]) for object in selections)
 
 	if isinstance(object_selections,str):
 		object_selections_str = object_selections
@@ -220,36 +360,25 @@ def duplicate_along_line(oDesign, move_vector, units, object_selections, num_clo
 					"DuplicateAssignments:=", False
 				])
 
-	duplicated_objects = []
-	for i in range(1,num_clones):
-		extras = 0
-		if isinstance(object_selections,str):
-			new_name = object_selections+'_%d'%i
-			duplicated_objects.append(new_name)
-		else:
-			for object in object_selections:
-				new_name=object+'_%d'%i
-
-				while True:
-					if(new_name in object_selections or new_name in duplicated_objects):
-						print('new_name',new_name)
-						new_name = object+'_%d'%(i+extras)
-						extras += 1
-					else:
-						break
-				duplicated_objects.append(new_name)
-	if isinstance(object_selections,str):
-		return [object_selections]+duplicated_objects
-	else:
-		return object_selections + duplicated_objects
+	duplicated_objects = [clones[object][i] for i in range(num_clones-1) for object in selections]
+	logger.debug('duplicated objects %s', duplicated_objects)
+	return selections + duplicated_objects
 
 #Unite
 def unite(oDesign, object_selections):
+	#Inside a booleanBatch the union is queued and merged with the others
+	booleans = getDesignContext(oDesign).booleans
+	if booleans.depth > 0:
+		booleans.add("Unite", list(object_selections[:1]), list(object_selections[1:]), False)
+		return
+	_unite(oDesign, object_selections)
+
+def _unite(oDesign, object_selections):
 	selections_string = ""
 	for object in object_selections:
 		selections_string += object + ","
-	print("selections string",selections_string)
-	oEditor = oDesign.SetActiveEditor("3D Modeler")
+	logger.debug('selections string %s', selections_string)
+	oEditor = getEditor(oDesign)
 	oEditor.Unite(
 		[
 			"NAME:Selections",
@@ -259,13 +388,19 @@ def unite(oDesign, object_selections):
 			"NAME:UniteParameters",
 			"KeepOriginals:="	, False
 		])
+	#The objects are united into the first one
+	invalidateFaceIDs(oDesign, object_selections)
+	objects = getObjectRegistry(oDesign)
+	for object in object_selections[1:]:
+		objects.remove(object)
 
 #Rotate
 #rotate_axis = "X", "Y", or "Z"
 def rotate(oDesign, rotate_axis, rotate_angle, units, object_selections):
 
 	[rotate_angle_str,name]=name_handler(oDesign,[rotate_angle],units,['theta_rotate',''])
-	oEditor = oDesign.SetActiveEditor("3D Modeler")
+	oEditor = getEditor(oDesign)
+	flushBooleans(oDesign, object_selections)
 	oEditor.Rotate(
 		[
 			"NAME:Selections",
@@ -277,11 +412,13 @@ def rotate(oDesign, rotate_axis, rotate_angle, units, object_selections):
 			"RotateAxis:="		, rotate_axis,
 			"RotateAngle:="		, rotate_angle_str
 		])
+	invalidateFaceIDs(oDesign, object_selections)
 
 
 #Create Equation Curve
-def createEquationCurve(oDesign, Xfun, Yfun, Zfun, tStart, tEnd, numPoints, units):
-	oEditor = oDesign.SetActiveEditor("3D Modeler")
+#Curves sampled in Python (Curves.py) are drawn as polylines instead
+def createEquationCurve(oDesign, Xfun, Yfun, Zfun, tStart, tEnd, numPoints, units, name="EquationCurve1"):
+	oEditor = getEditor(oDesign)
 	oEditor.createEquationCurve(
 		[
 			"NAME:EquationBasedCurveParameters",
@@ -305,7 +442,7 @@ def createEquationCurve(oDesign, Xfun, Yfun, Zfun, tStart, tEnd, numPoints, unit
 		],
 		[
 			"NAME:Attributes",
-			"Name:="		, "EquationCurve1",
+			"Name:="		, name,
 			"Flags:="		, "",
 			"Color:="		, "(132 132 193)",
 			"Transparency:="	, 0,
@@ -314,11 +451,13 @@ def createEquationCurve(oDesign, Xfun, Yfun, Zfun, tStart, tEnd, numPoints, unit
 			"MaterialValue:="	, "\"vacuum\"",
 			"SolveInside:="		, True
 		])
+	getObjectRegistry(oDesign).add(name)
+	return name
 #oEditor [object], start_coords,length,width [floats], axis, material, name [strings]
 #startpos=[start_x, start_y, start_z]
 def drawRectangle(oDesign, start_x, start_y, start_z, width, height, units, axis, cs, names, Transparency):
 	#print("Creating " ,name)
-	oEditor = oDesign.SetActiveEditor("3D Modeler")
+	oEditor = getEditor(oDesign)
 
 	[xStr, yStr, zStr, wStr, hStr, name] = name_handler(oDesign,[start_x, start_y, start_z, width, height],units,names)
 
@@ -344,12 +483,13 @@ def drawRectangle(oDesign, start_x, start_y, start_z, width, height, units, axis
 			"UDMId:=", 				   "",
 			"SolveInside:=", 		   True
 		])
+	getObjectRegistry(oDesign).add(name)
 	return name
 
 	#oEditor [object], start_coords,dimensions [floats], units, material, name [strings]
 def drawBox(oDesign, start_x, start_y, start_z, Xsize, Ysize, Zsize, units, material, cs, names, Transparency):
 	#print("Creating " ,name)
-	oEditor = oDesign.SetActiveEditor("3D Modeler")
+	oEditor = getEditor(oDesign)
 
 	SolveInside=True
 	#PEC is the only case I can think of where this would need to be false; Add other cases if needed
@@ -381,11 +521,12 @@ def drawBox(oDesign, start_x, start_y, start_z, Xsize, Ysize, Zsize, units, mate
 			"MaterialValue:="	, material,
 			"SolveInside:="		, SolveInside
 		])
+	getObjectRegistry(oDesign).add(name)
 	return name
 
 def drawCylinder(oDesign, center_x, center_y, center_z, radius, length, units, axis, material, cs, names, Transparency):
 	#print("Creating " ,name)
-	oEditor  = oDesign.SetActiveEditor("3D Modeler")
+	oEditor  = getEditor(oDesign)
 
 	SolveInside=True
 	#PEC is the only case I can think of where this would need to be false; Add other cases if needed
@@ -419,11 +560,12 @@ def drawCylinder(oDesign, center_x, center_y, center_z, radius, length, units, a
 		"MaterialValue:="	, material,
 		"SolveInside:="		, SolveInside
 	])
+	getObjectRegistry(oDesign).add(name)
 	return name
 
 def drawCircle(oDesign,  center_x, center_y, center_z, radius, units, axis,cs, names,  Transparency):
 	#print("Creating " ,name)
-	oEditor  = oDesign.SetActiveEditor("3D Modeler")
+	oEditor  = getEditor(oDesign)
 
 	[xStr, yStr, zStr, radStr, name] = name_handler(oDesign, [center_x, center_y, center_z, radius],
 															   units, names)
@@ -446,12 +588,13 @@ def drawCircle(oDesign,  center_x, center_y, center_z, radius, units, axis,cs, n
 		"UDMId:="		        , "",
 		"SolveInside:="		    , True
 	])
+	getObjectRegistry(oDesign).add(name)
 	return name
 
 
 def drawSphere(oDesign, center_x, center_y, center_z, radius, units, material, cs, names, Transparency):
 	#print("Creating " ,name)
-	oEditor  = oDesign.SetActiveEditor("3D Modeler")
+	oEditor  = getEditor(oDesign)
 
 	SolveInside=True
 	#PEC is the only case I can think of where this would need to be false; Add other cases if needed
@@ -481,6 +624,7 @@ def drawSphere(oDesign, center_x, center_y, center_z, radius, units, material, c
 		"MaterialValue:="	, material,
 		"SolveInside:="		, SolveInside
 	])
+	getObjectRegistry(oDesign).add(name)
 	return name
 
 
@@ -505,7 +649,15 @@ def binarySubtraction(oDesign, blank_parts, tool_parts, KeepOriginals):
 	else:
 		raise TypeError('parameter <tool_parts> must be string or array of strings')
 
-	oEditor  = oDesign.SetActiveEditor("3D Modeler")
+	#Inside a booleanBatch the subtraction is queued and merged with the others
+	booleans = getDesignContext(oDesign).booleans
+	if booleans.depth > 0:
+		booleans.add("Subtract", _selectionNames(blank_string), _selectionNames(tool_string), KeepOriginals)
+		return
+	_subtract(oDesign, blank_string, tool_string, KeepOriginals)
+
+def _subtract(oDesign, blank_string, tool_string, KeepOriginals):
+	oEditor  = getEditor(oDesign)
 	oEditor.Subtract(
 	[
 		"NAME:Selections",
@@ -516,23 +668,156 @@ def binarySubtraction(oDesign, blank_parts, tool_parts, KeepOriginals):
 		"NAME:SubtractParameters",
 		"KeepOriginals:="	, KeepOriginals
 	])
+	invalidateFaceIDs(oDesign, blank_string)
+	if not KeepOriginals:
+		invalidateFaceIDs(oDesign, tool_string)
+		objects = getObjectRegistry(oDesign)
+		for tool in tool_string.split(","):
+			objects.remove(tool)
+
+
+#Queue of the subtractions and unions made inside a booleanBatch
+#Every Subtract/Unite makes HFSS recompute the geometry, so queued operations
+#are merged into as few calls as possible. An operation joins the earliest
+#group it can after the last group touching any of its objects, provided it
+#does not use a blank of the group as a tool or a tool of the group as a blank.
+#Subtractions merge when they have the same tools or the same blanks, so the
+#result is exactly that of the separate calls. With assume_disjoint the tools
+#of one operation are taken not to intersect the blanks of another, as for the
+#elements of an array, and any two subtractions merge. Unions merge when they
+#unite into the same object.
+class BooleanQueue(object):
+
+	def __init__(self):
+		self.depth = 0
+		self.assume_disjoint = False
+		self.groups = []
+		#Every object a queued group touches
+		self.names = set()
+
+	def add(self, kind, blanks, tools, keep):
+		blank_set = set(blanks)
+		tool_set = set(tools)
+		names = blank_set | tool_set
+		start = 0
+		for index in range(len(self.groups)-1, -1, -1):
+			if self.groups[index].touches(names):
+				start = index
+				break
+		for group in self.groups[start:]:
+			if self.mergeable(group, kind, blank_set, tool_set, keep):
+				group.merge(blanks, tools)
+				break
+		else:
+			self.groups.append(BooleanGroup(kind, blanks, tools, keep))
+		self.names |= names
+
+	def mergeable(self, group, kind, blank_set, tool_set, keep):
+		if group.kind != kind or group.keep != keep:
+			return False
+		if not (tool_set.isdisjoint(group.blank_set) and blank_set.isdisjoint(group.tool_set)):
+			return False
+		if kind == "Unite":
+			return blank_set == group.blank_set
+		return self.assume_disjoint or tool_set == group.tool_set or blank_set == group.blank_set
+
+	def pending(self, names=None):
+		if names is None:
+			return len(self.groups) > 0
+		return not self.names.isdisjoint(names)
+
+	#Hands the queued groups out and empties the queue
+	def take(self):
+		groups = self.groups
+		self.groups = []
+		self.names = set()
+		return groups
+
+#One Subtract (blanks minus tools) or Unite (tools into the single blank) call
+class BooleanGroup(object):
+
+	def __init__(self, kind, blanks, tools, keep):
+		self.kind = kind
+		self.blanks = list(blanks)
+		self.tools = list(tools)
+		self.keep = keep
+		self.blank_set = set(blanks)
+		self.tool_set = set(tools)
+
+	def touches(self, names):
+		return not (self.blank_set.isdisjoint(names) and self.tool_set.isdisjoint(names))
+
+	def merge(self, blanks, tools):
+		for blank in blanks:
+			if blank not in self.blank_set:
+				self.blank_set.add(blank)
+				self.blanks.append(blank)
+		for tool in tools:
+			if tool not in self.tool_set:
+				self.tool_set.add(tool)
+				self.tools.append(tool)
+
+#Queues every binarySubtraction and unite made inside the block and sends them,
+#merged, when the outermost batch exits. assume_disjoint is taken from the outermost batch.
+#Operations that need the geometry (getFaceIDs, move, rotate, sweeps, duplicates)
+#first send the queued operations touching their objects.
+#If the block raises the operations still queued are dropped, not sent half built.
+@contextmanager
+def booleanBatch(oDesign, assume_disjoint=False):
+	booleans = getDesignContext(oDesign).booleans
+	if booleans.depth == 0:
+		booleans.assume_disjoint = assume_disjoint
+	booleans.depth += 1
+	try:
+		yield booleans
+	except BaseException:
+		booleans.depth -= 1
+		if booleans.depth == 0:
+			booleans.take()
+		raise
+	booleans.depth -= 1
+	if booleans.depth == 0:
+		commitBooleans(oDesign)
+
+#Sends the queued booleans
+def commitBooleans(oDesign):
+	for group in getDesignContext(oDesign).booleans.take():
+		if group.kind == "Unite":
+			_unite(oDesign, group.blanks + group.tools)
+		else:
+			_subtract(oDesign, ",".join(group.blanks), ",".join(group.tools), group.keep)
+
+#Sends the queued booleans if any of them touches selections (names or a comma separated string)
+def flushBooleans(oDesign, selections=None):
+	booleans = getDesignContext(oDesign).booleans
+	names = None if selections is None else _selectionNames(selections)
+	if booleans.pending(names):
+		commitBooleans(oDesign)
+
+#Decorator running a function of (oDesign, ...) inside one booleanBatch
+def batchBooleans(function):
+	@functools.wraps(function)
+	def _batched(oDesign, *args, **kwargs):
+		with booleanBatch(oDesign):
+			return function(oDesign, *args, **kwargs)
+	return _batched
 
 #This function will map a quaternion vector into cartesian space so it can be modeled in HFSS
 #Results in a Quaternion Coordinate System.
 def dualQuaternionCS(oDesign,dq,units,name):
 	#Create DualQuaternion Object
 	# dq=DualQuaternion(rotation,translation)
-	print('dq\n',dq)
+	logger.debug('dq\n%s', dq)
 
 
 	full_translation_matrix=dq.dualQuat2Matrix()
-	print('4by4:\n',full_translation_matrix)
+	logger.debug('4by4:\n%s', full_translation_matrix)
 
 	total_rotation=full_translation_matrix[:-1,:-1]
-	print('total rotation\n',total_rotation)
+	logger.debug('total rotation\n%s', total_rotation)
 
 	translation=full_translation_matrix[:-1,3]
-	print('translation\n',translation)
+	logger.debug('translation\n%s', translation)
 
 	x_axis = np.array([[1], [0], [0]])
 	y_axis = np.array([[0], [1], [0]])
@@ -540,30 +825,16 @@ def dualQuaternionCS(oDesign,dq,units,name):
 	y_axis = np.matmul(total_rotation,y_axis)
 
 	[x, y, z] = translation[:]
-	print('x',x,'y',y,'z',z)
+	logger.debug('x %s y %s z %s', x, y, z)
 	createRelativeCS(oDesign,x,y,z,x_axis,y_axis,units,name)
 
+#Axes may be lists or arrays of any shape holding 3 values, e.g. the (3,1) columns of rotatedCS
 def createRelativeCS(oDesign, OriginX, OriginY, OriginZ, x_axis, y_axis, units, name):
-	XaxisXvec = x_axis[0]
-	XaxisZvec = x_axis[2]
-	XaxisYvec = x_axis[1]
-
-	YaxisXvec = y_axis[0]
-	YaxisZvec = y_axis[2]
-	YaxisYvec = y_axis[1]
-
-	oEditor = oDesign.SetActiveEditor("3D Modeler")
-	OriginXstr  = '%f' %(OriginX)   + units
-	OriginYstr  = '%f' %(OriginY)   + units
-	OriginZstr  = '%f' %(OriginZ)   + units
-
-	XaxisXvecstr= '%f' %(XaxisXvec) + units
-	XaxisYvecstr= '%f' %(XaxisYvec) + units
-	XaxisZvecstr= '%f' %(XaxisZvec) + units
-
-	YaxisXvecstr= '%f' %(YaxisXvec) + units
-	YaxisYvecstr= '%f' %(YaxisYvec) + units
-	YaxisZvecstr= '%f' %(YaxisZvec) + units
+	oEditor = getEditor(oDesign)
+	values = np.concatenate([np.ravel([OriginX, OriginY, OriginZ]), np.ravel(x_axis)[:3], np.ravel(y_axis)[:3]])
+	[OriginXstr, OriginYstr, OriginZstr,
+	 XaxisXvecstr, XaxisYvecstr, XaxisZvecstr,
+	 YaxisXvecstr, YaxisYvecstr, YaxisZvecstr] = valueStrings(values, units)
 
 
 	oEditor.CreateRelativeCS(
@@ -605,7 +876,7 @@ def rotatedCS(oDesign, X, Y, Z, theta_x, theta_y, theta_z, units, name):
 	total_rotation = np.matmul(z_rotation,y_rotation)
 	total_rotation = np.matmul(total_rotation, x_rotation)
 
-	print('rotation matrix',total_rotation)
+	logger.debug('rotation matrix %s', total_rotation)
 
 	x_axis = np.array([[1], [0], [0]])
 	y_axis = np.array([[0], [1], [0]])
@@ -619,7 +890,7 @@ def rotatedCS(oDesign, X, Y, Z, theta_x, theta_y, theta_z, units, name):
 #Modes>1 will need to be implemented with a for loop probably. Not sure how to do
 #Use integration line for multiple modes
 def assignExcitation(oDesign, name, NumModes, Renormalize, Alignment, Deembed):
-	oModule = oDesign.GetModule("BoundarySetup")
+	oModule = getModule(oDesign, "BoundarySetup")
 	oModule.AssignWavePort(
 	[
 		"NAME:"+name,
@@ -645,7 +916,7 @@ def assignBoundaryMaterial(oDesign, Object_Name, material):
 
 	Boundary_Name="Name: Bound_"+Object_Name
 	#print("Assigning Boundary to: " ,Object_Name+"\n")
-	oModule = oDesign.GetModule("BoundarySetup")
+	oModule = getModule(oDesign, "BoundarySetup")
 	oModule.AssignFiniteCond(
 	[
 		Boundary_Name,
@@ -661,7 +932,7 @@ def assignFaceBoundaryMaterial(oDesign, Object_Name, FaceNo, material):
 
 	Boundary_Name="Name: Bound_"+Object_Name
 
-	oModule = oDesign.GetModule("BoundarySetup")
+	oModule = getModule(oDesign, "BoundarySetup")
 	oModule.AssignFiniteCond(
 	[
 		Boundary_Name,
@@ -675,8 +946,8 @@ def assignFaceBoundaryMaterial(oDesign, Object_Name, FaceNo, material):
 
 # Use frequency in Hertz
 def insertSetup(oDesign, solution_frequency,min_passes,min_converged_passes, max_passes, percent_refinement, name):
-	oModule = oDesign.GetModule("AnalysisSetup")
-	solution_frequency_str = '%f' % (solution_frequency) + 'Hz'
+	oModule = getModule(oDesign, "AnalysisSetup")
+	solution_frequency_str = valueString(solution_frequency, 'Hz')
 	oModule.InsertSetup("HfssDriven",
 		[
 			"NAME:"+name,
@@ -707,7 +978,7 @@ def insertSetup(oDesign, solution_frequency,min_passes,min_converged_passes, max
 def LinearFrequencySweep(oDesign, startF, stopF, stepF,setup_name,names):
 	[startFstr,stepFstr,stopFstr, name] = name_handler(oDesign,[startF,stepF,stopF],"Hz",names)
 
-	oModule = oDesign.GetModule("AnalysisSetup")
+	oModule = getModule(oDesign, "AnalysisSetup")
 	oModule.InsertFrequencySweep(setup_name,
 		[
 			"NAME:"+name,
@@ -738,13 +1009,13 @@ def LinearFrequencySweep(oDesign, startF, stopF, stepF,setup_name,names):
 #Assigns Radiation boundary to outer surface of sphere
 def AssignRadiationBoundary(oDesign, boundary_object,name):
 	faces=getFaceIDs(oDesign, boundary_object)
-	print('sphere face list',faces)
+	logger.debug('sphere face list %s', faces)
 	# input('press enter to continue')
-	oModule=oDesign.GetModule("BoundarySetup")
+	oModule=getModule(oDesign, "BoundarySetup")
 	oModule.AssignRadiation(
 		[
 			"NAME:"+name,
-			"Faces:="		, [int(faces[0])],
+			"Faces:="		, [faces[0]],
 			"IsIncidentField:="	, False,
 			"IsEnforcedField:="	, False,
 			"IsFssReference:="	, False,
@@ -756,31 +1027,84 @@ def AssignRadiationBoundary(oDesign, boundary_object,name):
 #Boundary Object should be a sphere
 #Assigns Radiation boundary to all faces of an object
 def RadiationBoundary(oDesign, boundary_object,name):
-	faces=getFaceIDs(oDesign, boundary_object)
-	print('sphere face list',faces)
-	# input('press enter to continue')
-	oModule=oDesign.GetModule("BoundarySetup")
-	faces
-	for i in range(len(faces)):
-		oModule.AssignRadiation(
-			[
-				"NAME:"+name,
-				"Faces:="		, [int(faces[i])],
-				"IsIncidentField:="	, False,
-				"IsEnforcedField:="	, False,
-				"IsFssReference:="	, False,
-				"IsForPML:="		, False,
-				"UseAdaptiveIE:="	, False,
-				"IncludeInPostproc:="	, True
-			])
-
+	RadiationBoundaries(oDesign, [boundary_object], name)
+
+#Assigns one Radiation boundary to all faces of several objects, e.g. the parts of a faceted airbox
+#All faces go in one AssignRadiation call
+def RadiationBoundaries(oDesign, boundary_objects, name):
+	faces=_joinFaceIDs([getFaceIDs(oDesign, boundary_object) for boundary_object in boundary_objects])
+	logger.debug('radiation face list %s', faces)
+	oModule=getModule(oDesign, "BoundarySetup")
+	oModule.AssignRadiation(
+		[
+			"NAME:"+name,
+			"Faces:="		, faces,
+			"IsIncidentField:="	, False,
+			"IsEnforcedField:="	, False,
+			"IsFssReference:="	, False,
+			"IsForPML:="		, False,
+			"UseAdaptiveIE:="	, False,
+			"IncludeInPostproc:="	, True
+		])
 
+#Face ids of several objects as one list
+#Placeholders are joined when their values are known: in the script, or on the dispatcher thread
+def _joinFaceIDs(face_lists):
+	if len(face_lists) == 1:
+		return face_lists[0]
+	if any(isinstance(faces, ScriptValue) for faces in face_lists):
+		return ScriptValue(' + '.join(formatValue(faces) for faces in face_lists))
+	pending = [faces for faces in face_lists if isinstance(faces, PendingValue)]
+	if pending:
+		return pending[-1].then(lambda value: _joinFaceIDs([faces.result() if isinstance(faces, PendingValue) else faces
+														  for faces in face_lists]))
+	if all(isinstance(faces, list) for faces in face_lists):
+		return [face for faces in face_lists for face in faces]
+	#Other placeholders, like those of the geometry IR, join with +
+	return functools.reduce(lambda joined, faces: joined + faces, face_lists)
+
+
+#Face ids of an object as ints (HFSS returns them as strings)
+#Backends that only know the ids later, like the script emitter, hand back a placeholder that is passed through
+#The ids are cached per object until an operation changing its topology invalidates them
 def getFaceIDs(oDesign,  name):
-	oEditor = oDesign.SetActiveEditor("3D Modeler")
-	return oEditor.getFaceIDs(name)
+	flushBooleans(oDesign, [name])
+	face_ids = getDesignContext(oDesign).face_ids
+	faces = face_ids.get(name)
+	if faces is None:
+		oEditor = getEditor(oDesign)
+		faces = oEditor.GetFaceIDs(name)
+		if isinstance(faces, (list, tuple)):
+			faces = _intList(faces)
+		#Pipelined calls convert the ids once they arrive
+		elif isinstance(faces, PendingValue):
+			faces = faces.then(_intList)
+		face_ids[name] = faces
+	if isinstance(faces, list):
+		return list(faces)
+	return faces
+
+#Forgets the cached face ids of the objects in selections (names or a comma separated string),
+#or of every object of oDesign if selections is None
+def invalidateFaceIDs(oDesign, selections=None):
+	face_ids = getDesignContext(oDesign).face_ids
+	if selections is None:
+		face_ids.clear()
+		return
+	for name in _selectionNames(selections):
+		face_ids.pop(name, None)
+
+def _selectionNames(selections):
+	if isinstance(selections, str):
+		selections = selections.split(",")
+	return [name for name in selections if name]
+
+def _intList(values):
+	return [int(value) for value in values]
 
 ##Names the value prop name if prop name is not an empty string
 #Updates the property value with a new value if the property already exists
+#Inside a variableBatch the write is queued and sent when the batch is committed
 def localVar(oDesign, prop_name, value):
 	if not isinstance(prop_name,str):
 		raise TypeError('parameter <prop_name> must be string')
@@ -789,20 +1113,37 @@ def localVar(oDesign, prop_name, value):
 	if (not prop_name)or(prop_name == value): #Empty prop name just retruns value
 		return value
 
-	#Get a list of all props from HFSS
-	props_list=getProperties(oDesign)
+	#Check the cached variable table instead of asking HFSS for every value
+	variables = getVariableCache(oDesign)
 
 	#IF prop already exists, replace value, else create prop
-	for element in props_list:
-		if(element == prop_name):
-			changeProperty(oDesign, prop_name, value)
-			return prop_name
-	newProperty(oDesign, prop_name, value)
+	if prop_name in variables:
+		#Skip the round trip when the value written last is unchanged
+		if variables.cached(prop_name) != value:
+			if variables.depth > 0:
+				variables.queue(prop_name, value, False)
+			else:
+				changeProperty(oDesign, prop_name, value)
+		return prop_name
+	if variables.depth > 0:
+		variables.queue(prop_name, value, True)
+	else:
+		newProperty(oDesign, prop_name, value)
 	return prop_name
 
 
-#Stores a new property variable in HFSS
-def newProperty(oDesign, prop_name, value):
+#Sends one ChangeProperty call for a list of [name, value] pairs
+#group is "NewProps" or "ChangedProps"
+def _localVariableChange(oDesign, group, props):
+	props_list = ["NAME:"+group]
+	for [prop_name, value] in props:
+		props_list.append(
+			[
+				"NAME:"+prop_name,
+				"PropType:="		, "VariableProp",
+				"UserDef:="		, True,
+				"Value:="		, value
+			])
 	oDesign.ChangeProperty(
 	[
 		"NAME:AllTabs",
@@ -812,50 +1153,349 @@ def newProperty(oDesign, prop_name, value):
 				"NAME:PropServers",
 				"LocalVariables"
 			],
-			[
-				"NAME:NewProps",
-				[
-					"NAME:"+prop_name,
-					"PropType:="		, "VariableProp",
-					"UserDef:="		, True,
-					"Value:="		, value
-				]
-			]
+			props_list
 		]
 	])
+	variables = getVariableCache(oDesign)
+	for [prop_name, value] in props:
+		variables.set(prop_name, value)
+
+#Stores a new property variable in HFSS
+def newProperty(oDesign, prop_name, value):
+	_localVariableChange(oDesign, "NewProps", [[prop_name, value]])
 	return prop_name
 #Updates the value of an existing property variable in hfss
 def changeProperty(oDesign, prop_name, value):
-	oDesign.ChangeProperty(
-	[
-		"NAME:AllTabs",
-		[
-			"NAME:LocalVariableTab",
-			[
-				"NAME:PropServers",
-				"LocalVariables"
-			],
-			[
-				"NAME:ChangedProps",
-				[
-					"NAME:"+prop_name,
-					"PropType:="		, "VariableProp",
-					"UserDef:="		, True,
-					"Value:="		, value
-				]
-			]
-		]
-	])
+	_localVariableChange(oDesign, "ChangedProps", [[prop_name, value]])
 	return prop_name
 
+#Queues every localVar made inside the block and sends them when the outermost
+#batch exits: one ChangeProperty for the new variables, ordered by their
+#dependencies so they resolve, and one for the changed ones.
+#If the block raises nothing queued is sent.
+@contextmanager
+def variableBatch(oDesign):
+	variables = getVariableCache(oDesign)
+	variables.depth += 1
+	try:
+		yield variables
+	except BaseException:
+		variables.depth -= 1
+		if variables.depth == 0:
+			variables.discard()
+		raise
+	variables.depth -= 1
+	if variables.depth == 0:
+		commitVariables(oDesign)
+
+#Sends the variables queued by variableBatch
+#changed=False only sends the new variables, which have to exist before a primitive can use them
+def commitVariables(oDesign, changed=True):
+	variables = getVariableCache(oDesign)
+	try:
+		if variables.new_props:
+			#Ordered so every new variable comes after the new variables it uses
+			names = VariableGraph(variables.new_props).order()
+			_localVariableChange(oDesign, "NewProps", [[name, variables.new_props[name]] for name in names])
+			variables.new_props.clear()
+		if changed and variables.changed_props:
+			_localVariableChange(oDesign, "ChangedProps", list(variables.changed_props.items()))
+			variables.changed_props.clear()
+	except Exception:
+		#The queued values are in the cache already, what HFSS has is read again
+		#The queues are kept, a later commit sends them again
+		variables.invalidate()
+		raise
+
+#Decorator running a function of (oDesign, ...) inside one variableBatch
+def batchVariables(function):
+	@functools.wraps(function)
+	def _batched(oDesign, *args, **kwargs):
+		with variableBatch(oDesign):
+			return function(oDesign, *args, **kwargs)
+	return _batched
+
 
 def getProperties(oDesign):
 	all_props=oDesign.GetVariables()
 	return all_props
 
 
+#State kept for one design refers to it weakly, so a design nobody else holds is
+#released by COM even though the library still has its context. Objects that can
+#not be referenced weakly are held like before.
+class _DesignState(object):
+
+	def __init__(self, oDesign):
+		try:
+			self.design = weakref.ref(oDesign)
+		except TypeError:
+			self.design = lambda: oDesign
+
+	#The design, None once it has been released
+	@property
+	def oDesign(self):
+		return self.design()
+
+
+#Local variables of one design, read from HFSS once and then kept up to date
+#by newProperty/changeProperty so localVar does not call GetVariables per value.
+#Values read from HFSS are stored as None and only fetched when asked for.
+class VariableCache(_DesignState):
+
+	def __init__(self, oDesign):
+		_DesignState.__init__(self, oDesign)
+		self.values = None
+		#Writes queued by variableBatch, name -> value in definition order
+		self.depth = 0
+		self.new_props = {}
+		self.changed_props = {}
+
+	def load(self):
+		self.values = dict.fromkeys(getProperties(self.oDesign))
+		return self.values
+
+	def __contains__(self, prop_name):
+		if self.values is None:
+			self.load()
+		return prop_name in self.values
+
+	def __iter__(self):
+		if self.values is None:
+			self.load()
+		return iter(self.values)
+
+	#Value last written through the library, None if unknown
+	def cached(self, prop_name):
+		if self.values is None:
+			return None
+		return self.values.get(prop_name)
+
+	#Value of a variable, asking HFSS only if it was not written through the library
+	def get(self, prop_name):
+		if prop_name not in self:
+			raise KeyError(prop_name)
+		value = self.values[prop_name]
+		if value is None:
+			value = self.oDesign.GetVariableValue(prop_name)
+			self.values[prop_name] = value
+		return value
+
+	def set(self, prop_name, value):
+		#An unloaded cache picks the variable up from GetVariables later
+		if self.values is not None:
+			self.values[prop_name] = value
+
+	def queue(self, prop_name, value, new):
+		if new or prop_name in self.new_props:
+			self.new_props[prop_name] = value
+		else:
+			self.changed_props[prop_name] = value
+		self.set(prop_name, value)
+
+	#Forgets the queued writes, their values were never sent
+	def discard(self):
+		if self.new_props or self.changed_props:
+			self.new_props.clear()
+			self.changed_props.clear()
+			self.invalidate()
+
+	def invalidate(self):
+		self.values = None
+
+def getVariableCache(oDesign):
+	return getDesignContext(oDesign).variables
+
+#Value of an HFSS expression ("5mm+6mm*length") over the local variables of oDesign
+#In SI units, or in unit if given; evaluated in Python, HFSS is only asked for
+#values of variables that were not written through this library
+def evaluateExpression(oDesign, expression, unit=None):
+	return ExpressionEvaluator(getVariableCache(oDesign)).evaluate(expression, unit)
+
+#Values of a list of expressions as an array, see evaluateExpression
+def evaluateExpressions(oDesign, expressions, unit=None):
+	return ExpressionEvaluator(getVariableCache(oDesign)).evaluateMany(expressions, unit)
+
+#Forgets the cached variables of oDesign, or of every design if oDesign is None
+#Call this after variables are edited outside of this library (GUI, other scripts)
+def invalidateVariableCache(oDesign=None):
+	if oDesign is None:
+		for context in _design_contexts.values():
+			context.variables.invalidate()
+	elif id(oDesign) in _design_contexts:
+		_design_contexts[id(oDesign)].variables.invalidate()
+
+
+#Names of the objects of one design, read from the modeler once and then kept
+#up to date by the draw, duplicate, unite and subtract helpers, so unique and
+#clone names are found without asking HFSS or scanning lists.
+#The helpers only record names once the registry has been loaded.
+class ObjectRegistry(_DesignState):
+
+	def __init__(self, oDesign):
+		_DesignState.__init__(self, oDesign)
+		self.names = None
+		#Lowest suffix that may still be free per base name, clone names start looking there
+		self.suffixes = {}
+
+	def load(self):
+		names = getEditor(self.oDesign).GetMatchedObjectName("*")
+		#A script emitter only knows the names when the script runs, it builds from an empty design
+		self.names = set(names) if isinstance(names, (list, tuple, PendingValue)) else set()
+		self.suffixes = {}
+		return self.names
+
+	def __contains__(self, name):
+		if self.names is None:
+			self.load()
+		return name in self.names
+
+	def __iter__(self):
+		if self.names is None:
+			self.load()
+		return iter(self.names)
+
+	def __len__(self):
+		if self.names is None:
+			self.load()
+		return len(self.names)
+
+	def add(self, name):
+		if self.names is not None:
+			self.names.add(name)
+
+	def remove(self, name):
+		if self.names is None:
+			return
+		self.names.discard(name)
+		#A freed base_N is the next clone name of base again
+		[base, separator, suffix] = name.rpartition('_')
+		if separator and suffix.isdigit() and int(suffix) < self.suffixes.get(base, 1):
+			self.suffixes[base] = int(suffix)
+
+	#name itself if it is free, else its next clone name
+	def uniqueName(self, name):
+		if name not in self:
+			self.add(name)
+			return name
+		return self.cloneName(name)
+
+	#Next free name_1, name_2... as HFSS names duplicates of name, the name is taken
+	def cloneName(self, name):
+		if self.names is None:
+			self.load()
+		suffix = self.suffixes.get(name, 1)
+		while '%s_%d' % (name, suffix) in self.names:
+			suffix += 1
+		self.suffixes[name] = suffix + 1
+		clone = '%s_%d' % (name, suffix)
+		self.names.add(clone)
+		return clone
+
+	def invalidate(self):
+		self.names = None
+		self.suffixes = {}
+
+def getObjectRegistry(oDesign):
+	return getDesignContext(oDesign).objects
+
+#Free object name based on name, see ObjectRegistry.uniqueName
+def uniqueName(oDesign, name):
+	return getObjectRegistry(oDesign).uniqueName(name)
+
+def cloneName(oDesign, name):
+	return getObjectRegistry(oDesign).cloneName(name)
+
+
+#Everything the library keeps per design: the 3D Modeler editor, the modules,
+#the variable cache, the object names, the face ids, the queued booleans and the
+#source excitations. Editor and modules are fetched once and reused, so
+#drawing a primitive does not cost a SetActiveEditor/GetModule round trip.
+class DesignContext(_DesignState):
+
+	def __init__(self, oDesign):
+		_DesignState.__init__(self, oDesign)
+		self.variables = VariableCache(oDesign)
+		self.objects = ObjectRegistry(oDesign)
+		#Face ids per object name, see getFaceIDs
+		self.face_ids = {}
+		#Subtractions and unions queued by booleanBatch
+		self.booleans = BooleanQueue()
+		#Last excitation sent per source, see applySources
+		self.sources = {}
+		self.oEditor = None
+		self.modules = {}
+		#Drops the context from _design_contexts once the design is gone
+		self.finalizer = None
+
+	def editor(self):
+		if self.oEditor is None:
+			self.oEditor = self.oDesign.SetActiveEditor("3D Modeler")
+		return self.oEditor
+
+	def module(self, module_name):
+		oModule = self.modules.get(module_name)
+		if oModule is None:
+			oModule = self.oDesign.GetModule(module_name)
+			self.modules[module_name] = oModule
+		return oModule
+
+	#Drops every cached handle, variable, name, face id and excitation, they are fetched again on next use
+	def refresh(self):
+		self.oEditor = None
+		self.modules = {}
+		self.variables.invalidate()
+		self.objects.invalidate()
+		self.face_ids = {}
+		self.sources = {}
+
+#DesignContext per design, keyed by id(oDesign)
+#A context is dropped when its design is garbage collected, before the id can be
+#reused by another design
+_design_contexts = {}
+
+def _dropDesignContext(key, context):
+	if _design_contexts.get(key) is context:
+		del _design_contexts[key]
+
+def getDesignContext(oDesign):
+	context = _design_contexts.get(id(oDesign))
+	if context is None or context.oDesign is not oDesign:
+		context = DesignContext(oDesign)
+		_design_contexts[id(oDesign)] = context
+		try:
+			context.finalizer = weakref.finalize(oDesign, _dropDesignContext, id(oDesign), context)
+		except TypeError:
+			pass
+	return context
+
+#Refreshes the context of oDesign, or of every design if oDesign is None
+#Call this when the active design or project changes under the library
+def refreshDesignContext(oDesign=None):
+	if oDesign is None:
+		for context in _design_contexts.values():
+			context.refresh()
+	elif id(oDesign) in _design_contexts:
+		_design_contexts[id(oDesign)].refresh()
+
+#Forgets everything kept for oDesign, for designs that are closed or deleted
+#Designs that are no longer referenced are forgotten without calling this
+def releaseDesignContext(oDesign):
+	context = _design_contexts.get(id(oDesign))
+	if context is not None and context.oDesign is oDesign:
+		del _design_contexts[id(oDesign)]
+		if context.finalizer is not None:
+			context.finalizer.detach()
+
+def getEditor(oDesign):
+	return getDesignContext(oDesign).editor()
+
+def getModule(oDesign, module_name):
+	return getDesignContext(oDesign).module(module_name)
+
+
 def globalCS(oDesign):
-	oEditor = oDesign.SetActiveEditor("3D Modeler")
+	oEditor = getEditor(oDesign)
 	oEditor.SetWCS(
 		[
 			"NAME:SetWCS Parameter",
@@ -864,16 +1504,21 @@ def globalCS(oDesign):
 
 
 def edit_sources(oDesign,source_list,modes_list,amplitudes_list, phase_list, amplitude_units, phase_units):
-	amplitude_str_list = []
-	phase_str_list = []
-	modes_str_list = []
-	for i in range(0, len(source_list)):
-		amplitude_str_list +=['%f' %(amplitudes_list[i]) + amplitude_units]
-		phase_str_list +=['%f' %(phase_list[i]) +phase_units]
-		modes_str_list +=['%d' %(modes_list[0,i])]
-
-	print("\nNames:\n",source_list,"\n\nAmplitudes\n", amplitude_str_list, "\n\nPhases\n", phase_str_list,"\n\nModes\n", modes_str_list)
-	oModule = oDesign.GetModule("Solutions")
+	[modes_str_list, amplitude_str_list, phase_str_list] = _sourceStrings(source_list, modes_list, amplitudes_list, phase_list, amplitude_units, phase_units)
+	_editSources(oDesign, list(source_list), modes_str_list, amplitude_str_list, phase_str_list)
+
+#Excitation of every source as sent to HFSS, modes, amplitudes and phases may be
+#(1,N), (N,1) or flat arrays
+def _sourceStrings(source_list, modes_list, amplitudes_list, phase_list, amplitude_units, phase_units):
+	count = len(source_list)
+	modes_str_list = ['%d' %(mode) for mode in np.ravel(modes_list)[:count]]
+	amplitude_str_list = valueStrings(np.ravel(amplitudes_list)[:count], amplitude_units)
+	phase_str_list = valueStrings(np.ravel(phase_list)[:count], phase_units)
+	return [modes_str_list, amplitude_str_list, phase_str_list]
+
+def _editSources(oDesign, source_list, modes_str_list, amplitude_str_list, phase_str_list):
+	logger.debug('\nNames:\n%s\n\nAmplitudes\n%s\n\nPhases\n%s\n\nModes\n%s', source_list, amplitude_str_list, phase_str_list, modes_str_list)
+	oModule = getModule(oDesign, "Solutions")
 	oModule.EditSources("TotalFields",
 						["NAME:Names"]+source_list,
 						["NAME:Modes"]+modes_str_list,
@@ -881,90 +1526,119 @@ def edit_sources(oDesign,source_list,modes_list,amplitudes_list, phase_list, amp
 						["NAME:Phases"]+phase_str_list,
 						["NAME:Terminated"],
 						["NAME:Impedances"], False, False)
+	sources = getDesignContext(oDesign).sources
+	for i in range(len(source_list)):
+		sources[source_list[i]] = (modes_str_list[i], amplitude_str_list[i], phase_str_list[i])
+
+#Like edit_sources, but only sends the sources whose excitation differs from the
+#last one applied to the design, sources left out of EditSources keep their excitation.
+#Applying the current state again makes no call. Returns the names of the changed sources.
+def applySources(oDesign, source_list, modes_list, amplitudes_list, phase_list, amplitude_units, phase_units):
+	[modes_str_list, amplitude_str_list, phase_str_list] = _sourceStrings(source_list, modes_list, amplitudes_list, phase_list, amplitude_units, phase_units)
+	sources = getDesignContext(oDesign).sources
+	changed = [i for i in range(len(source_list))
+			   if sources.get(source_list[i]) != (modes_str_list[i], amplitude_str_list[i], phase_str_list[i])]
+	if changed:
+		_editSources(oDesign, [source_list[i] for i in changed], [modes_str_list[i] for i in changed],
+					 [amplitude_str_list[i] for i in changed], [phase_str_list[i] for i in changed])
+	return [source_list[i] for i in changed]
+
+#Applies beam states one after the other, calling export(oDesign, index) after each
+#states is a sequence of (amplitudes_list, phase_list), e.g. one row of phases per beam
+#Only the sources changing between consecutive states are sent. Returns what export returned per state.
+#Every source is excited in mode 1 unless modes_list is given
+def applySourceStates(oDesign, source_list, states, export, amplitude_units, phase_units, modes_list=None):
+	if modes_list is None:
+		modes_list = np.ones(len(source_list))
+	results = []
+	for index, [amplitudes_list, phase_list] in enumerate(states):
+		applySources(oDesign, source_list, modes_list, amplitudes_list, phase_list, amplitude_units, phase_units)
+		results.append(export(oDesign, index))
+	return results
+
+#Forgets the excitations recorded for oDesign, the next applySources sends every source
+def invalidateSources(oDesign):
+	getDesignContext(oDesign).sources.clear()
 
 # Stores values in variables_list in corresponding variable name from names
 # Can also handle expressions passed to variables list.
 # Will sort variable storage so that variables defined in names can be used in expressions
 def name_handler(oDesign, variables_list, units ,names):
 	variable_strings = []
-	print('variables_list',variables_list)
-	print('names',names)
+	#Checked once, name_handler runs for every primitive and polygon vertex
+	debug = logger.isEnabledFor(logging.DEBUG)
+	if debug:
+		logger.debug('variables_list %s', variables_list)
+		logger.debug('names %s', names)
 	indices = variable_ordering(variables_list,names)+[len(variables_list)]
-	print(indices)
+	if debug:
+		logger.debug('indices %s', indices)
 	if isinstance(variables_list,str):
 		variable_strings=[variables_list]
 	else:
-		for variable in variables_list:
-			# If variable is an int or float, simply assign units to it
-			if isinstance(variable,int) or isinstance(variable,float):
-				variable_str = 	'%f' %(variable)   + units
-			# If variable is a string expression, pass directly to HFSS
-			elif isinstance(variable,str):
-				variable_str = variable
-				# Check expression for variable defined in names before
-				# assignment
-				# for name in names:
-				# 	if (name in variable_str):
-			else:
-				raise(TypeError('Variables must be int, float, or valid HFSS String Expression'))
-			variable_strings.append(variable_str)
+		variable_strings = _variableStrings(variables_list, units)
 	# If name is a list of strings, this segment of code will stor
 	# The values passed to this function in HFSS as local variables
 	# with the variable names specified
-	print('variable strings',variable_strings)
+	if debug:
+		logger.debug('variable strings %s', variable_strings)
 	if not isinstance(names, str):
 		values = variable_strings+[names[len(names) - 1]]
-		print(values)
+		if debug:
+			logger.debug('values %s', values)
 		if all(isinstance(element, str) for element in names):
 			if not (len(values) == len(names)):
 				raise ValueError('Names array must be of size %d' % (len(values)))
-			for i in indices:
-				print(i)
-				values[i] = localVar(oDesign, names[i], values[i])
+			with variableBatch(oDesign):
+				for i in indices:
+					values[i] = localVar(oDesign, names[i], values[i])
+			#New variables have to exist before the primitive that uses them is drawn
+			commitVariables(oDesign, changed=False)
 		else:
 			raise TypeError('<names> must be string or array of strings')
 
 	else:
 		values = variable_strings + [names]
-	print('values',values)
+	if debug:
+		logger.debug('values %s', values)
 	return values
 
+# Value strings of a list of values, numbers get units (all of them formatted at once)
+# and string expressions are passed directly to HFSS
+def _variableStrings(variables_list, units):
+	variable_strings = list(variables_list)
+	numerical_indices = []
+	for index in range(len(variable_strings)):
+		variable = variable_strings[index]
+		# If variable is an int or float (NumPy ones included), simply assign units to it
+		if isinstance(variable,(int,float,np.integer,np.floating)):
+			numerical_indices.append(index)
+		elif not isinstance(variable,str):
+			raise(TypeError('Variables must be int, float, or valid HFSS String Expression'))
+	numerical_strings = valueStrings([variable_strings[index] for index in numerical_indices], units)
+	for index, variable_str in zip(numerical_indices, numerical_strings):
+		variable_strings[index] = variable_str
+	return variable_strings
+
 # Takes in variables list and names list, returns index order for storing
 # in HFSS to resolve any dependencies
+# Values are tokenized, so only whole variable names count as dependencies
 def variable_ordering(variables_list,names):
-	numerical_indices = []
-	independent_str_indices = []
-	dependent_str_indices = []
-	dependencies = []
+	if isinstance(variables_list,str):
+		variables_list = [variables_list]
+	if isinstance(names,str):
+		return list(range(len(variables_list)))
 
+	graph = VariableGraph()
+	named_indices = {}
+	unnamed_indices = []
 	for index in range(0,len(variables_list)):
-		variable=variables_list[index]
-		if isinstance(variable,int) or isinstance(variable,float):
-			numerical_indices.append(index)
-		elif isinstance(variable,str):
-			latest_dependency = -1
-
-			#Need to sort dependent strings by latest dependency
-			for name in names:
-				if name in variable:
-					latest_dependency = names.index(name)
-			if latest_dependency >= 0:
-				dependent_str_indices.append(index)
-				dependencies.append(latest_dependency)
-			else:
-				independent_str_indices.append(index)
-
-	print('dependend string index', dependent_str_indices)
-	print('dependencies', dependencies)
-
-	if len(dependencies)>1:
-		#Add weighting for sort to account for latest dependency
-		for i in range(len(dependencies)):
-			if dependencies[i] in dependent_str_indices:
-				dependencies[i] += dependencies[dependent_str_indices.index(dependencies[i])]
-
-		# Sort index list by latest dependency
-		dependencies , dependent_str_indices = (list(t) for t in zip(*sorted(zip(dependencies, dependent_str_indices))))
+		name = names[index]
+		if name and name != variables_list[index]:
+			named_indices.setdefault(name,[]).append(index)
+			graph.add(name,variables_list[index])
+		else:
+			unnamed_indices.append(index)
 
 	#Return index list in order of variable processing in HFSS
-	return numerical_indices + independent_str_indices + dependent_str_indices
+	return unnamed_indices + [index for name in graph.order() for index in named_indices[name]]
@@ -0,0 +1,165 @@
+import re
+import numbers
+import numpy as np
+
+try:
+	import pandas as pd
+except ImportError:
+	#Only needed to hand tables in and results out as DataFrames
+	pd = None
+
+# from HFSS_Python.HFSSLibrary import getModule, getVariableCache # <--- uncomment this if importing submodule
+from HFSSLibrary import getModule, getVariableCache # <-- Comment this out if importing submodule
+# from HFSS_Python.Units import valueString # <--- uncomment this if importing submodule
+from Units import valueString # <-- Comment this out if importing submodule
+
+#Parametric sweeps solved by HFSS itself
+#Instead of a Python loop changing variables, solving and exporting once per
+#point, the rows of a table become one Optimetrics parametric setup. HFSS then
+#solves every variation in one run (reusing meshes where it can) and all of them
+#are exported through one report.
+#
+#	table = pd.DataFrame({'patchL': [28, 28.6, 29.2], 'patchW': [38, 38, 39]})
+#	results = runParametric(oDesign, table, "Setup1", ["dB(S(1,1))"], "C:/results/patch.csv", units="mm")
+#
+#Numbers in the table are written with units, given per table or per variable,
+#or else taken from the current value of the variable ("28.6mm" sweeps in mm).
+
+#A number with optional units, the units of a variable are read from such a value
+_VALUE_UNITS = re.compile(r'^\s*[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?\s*([A-Za-z_]\w*)?\s*$')
+
+
+#Variable names and rows of values of a table
+#table is a DataFrame, a dict of columns, or a 2D array/list of rows with columns naming its columns
+def _parametricTable(table, columns=None):
+	if hasattr(table, 'columns') and hasattr(table, 'values'):
+		return [list(table.columns), table.values.tolist()]
+	if isinstance(table, dict):
+		names = list(table)
+		return [names, [list(row) for row in zip(*(table[name] for name in names))]]
+	if columns is None:
+		raise ValueError('<columns> must name the columns of an array table')
+	rows = np.asarray(table, dtype=object)
+	if rows.ndim != 2 or rows.shape[1] != len(columns):
+		raise ValueError('table must have one column per name in <columns>')
+	return [list(columns), rows.tolist()]
+
+#Units the numbers of variable name are written in: units (a string, or a dict
+#giving units per variable) if given, else the units of the variable's value
+#"" writes numbers without units
+def _sweepUnits(variables, name, units):
+	if isinstance(units, dict):
+		units = units.get(name)
+	if units is not None:
+		return units
+	value = variables.get(name)
+	match = _VALUE_UNITS.match(str(value))
+	if match is None:
+		raise ValueError('units of %s can not be read from its value %r, pass <units>' % (name, value))
+	return match.group(1) or ''
+
+#Value as written in a sweep, numbers get units
+def _sweepValue(value, unit):
+	if isinstance(value, str):
+		return value
+	if isinstance(value, numbers.Real):
+		return valueString(value, unit)
+	raise TypeError('parametric values must be numbers or HFSS expressions')
+
+#Inserts an Optimetrics parametric setup solving setup_name for every row of table
+#Columns must be local variables of the design (created through localVar)
+#units: units of the numbers in table, a string or a dict per variable; by default
+#those of each variable's current value
+def parametricSetup(oDesign, table, setup_name, name="ParametricSetup1", units=None, columns=None, copy_mesh=True):
+	[names, rows] = _parametricTable(table, columns)
+	return _parametricSetup(oDesign, names, rows, setup_name, name, units, copy_mesh)
+
+def _parametricSetup(oDesign, names, rows, setup_name, name, units, copy_mesh):
+	if not rows:
+		raise ValueError('parametric table has no rows')
+	variables = getVariableCache(oDesign)
+	missing = [variable for variable in names if variable not in variables]
+	if missing:
+		raise KeyError('not local variables of the design: %s' % ', '.join(missing))
+
+	#Units are only looked up for columns holding numbers
+	column_units = [None] * len(names)
+	for i in range(len(names)):
+		if any(not isinstance(row[i], str) for row in rows):
+			column_units[i] = _sweepUnits(variables, names[i], units)
+	rows = [[_sweepValue(row[i], column_units[i]) for i in range(len(names))] for row in rows]
+	#The sweep definitions give the first row and the variable order, the other rows are added to the table
+	sweeps = ["NAME:Sweeps"]
+	for i in range(len(names)):
+		sweeps.append(
+			[
+				"NAME:SweepDefinition",
+				"Variable:="		, names[i],
+				"Data:="		, rows[0][i],
+				"OffsetF1:="		, False,
+				"Synchronize:="		, 0
+			])
+	operations = ["NAME:Sweep Operations"]
+	for row in rows[1:]:
+		operations += ["add:=", row]
+
+	oModule = getModule(oDesign, "Optimetrics")
+	oModule.InsertSetup("OptiParametric",
+		[
+			"NAME:"+name,
+			"IsEnabled:="		, True,
+			[
+				"NAME:ProdOptiSetupDataV2",
+				"SaveFields:="		, False,
+				"CopyMesh:="		, copy_mesh,
+				"SolveWithCopiedMeshOnly:=", True
+			],
+			[
+				"NAME:StartingPoint"
+			],
+			"Sim. Setups:="		, [setup_name],
+			sweeps,
+			operations,
+			[
+				"NAME:Goals"
+			]
+		])
+	return name
+
+def solveParametric(oDesign, name="ParametricSetup1"):
+	oModule = getModule(oDesign, "Optimetrics")
+	oModule.SolveSetup(name)
+
+#Exports quantities (e.g. "dB(S(1,1))") of every variation of variables in one report
+#solution is the "Setup : Sweep" the report reads. Returns the exported csv as a DataFrame,
+#or path if pandas is not available.
+def exportParametric(oDesign, variables, quantities, path, solution="Setup1 : LastAdaptive", report_name="Parametric Results",
+					 report_type="Modal Solution Data", primary_sweep="Freq"):
+	families = [primary_sweep+":=", ["All"]]
+	for variable in variables:
+		families += [variable+":=", ["All"]]
+	oModule = getModule(oDesign, "ReportSetup")
+	oModule.CreateReport(report_name, report_type, "Rectangular Plot", solution,
+		[
+			"Domain:="		, "Sweep"
+		],
+		families,
+		[
+			"X Component:="		, primary_sweep,
+			"Y Component:="		, list(quantities)
+		], [])
+	oModule.ExportToFile(report_name, path)
+	if pd is None:
+		return path
+	return pd.read_csv(path)
+
+#Sets up, solves and exports a parametric sweep over the rows of table in one pass
+def runParametric(oDesign, table, setup_name, quantities, path, sweep_name=None, name="ParametricSetup1", units=None, columns=None):
+	[names, rows] = _parametricTable(table, columns)
+	_parametricSetup(oDesign, names, rows, setup_name, name, units, True)
+	solveParametric(oDesign, name)
+	if sweep_name is None:
+		solution = setup_name + " : LastAdaptive"
+	else:
+		solution = setup_name + " : " + sweep_name
+	return exportParametric(oDesign, names, quantities, path, solution, name + " Results")
@@ -0,0 +1,205 @@
+import os
+import hashlib
+import numbers
+
+# from HFSS_Python.ComInstrumentation import returnedName # <--- uncomment this if importing submodule
+from ComInstrumentation import returnedName # <-- Comment this out if importing submodule
+
+#Backend compiling a whole build into one HFSS (IronPython) script
+#The objects handed out by a ScriptEmitter look like oDesktop/oProject/oDesign and
+#the editors and modules, but instead of calling HFSS each method call is written
+#to the script. The script then runs in one non-graphical batch launch:
+#	ansysedt -ng -RunScriptAndExit build.py
+#and can be kept and reused while the build does not change.
+
+SCRIPT_HEADER = [
+	'# ----------------------------------------------',
+	'# Script generated by HFSS_Python ScriptEmitter',
+	'# ----------------------------------------------',
+	'import ScriptEnv',
+	'ScriptEnv.Initialize("Ansoft.ElectronicsDesktop")',
+]
+
+#Methods whose result is only known when the script runs, it is stored in a script variable
+#The value gives the expression the result is wrapped in
+QUERY_METHODS = {
+	'getfaceids': '[int(face) for face in %s]',
+	'getedgeids': '[int(edge) for edge in %s]',
+	'getvertexids': '[int(vertex) for vertex in %s]',
+	'getmatchedobjectname': '%s',
+	'getobjectsingroup': '%s',
+	'getvariablevalue': '%s',
+}
+
+#Methods returning another scriptable object, e.g. oEditor = oDesign.SetActiveEditor("3D Modeler")
+OBJECT_METHODS = {
+	'getappdesktop', 'newproject', 'setactiveproject', 'getactiveproject', 'insertdesign',
+	'setactivedesign', 'getactivedesign', 'setactiveeditor', 'getactiveeditor', 'getmodule',
+}
+
+
+#Result of a query that is only known when the script runs
+#Indexing it gives another placeholder, anything needing its length or values raises TypeError
+class ScriptValue(object):
+
+	def __init__(self, expression):
+		self.expression = expression
+
+	def __getitem__(self, index):
+		return ScriptValue('%s[%s]' % (self.expression, formatValue(index)))
+
+	def __len__(self):
+		raise TypeError('%s is only known when the script runs' % self.expression)
+
+	def __iter__(self):
+		raise TypeError('%s is only known when the script runs' % self.expression)
+
+	def __repr__(self):
+		return self.expression
+
+
+#Python source for a COM argument, numpy scalars are written as plain numbers
+def formatValue(value, indent=''):
+	if isinstance(value, ScriptValue):
+		return value.expression
+	if isinstance(value, bool):
+		return 'True' if value else 'False'
+	if isinstance(value, numbers.Integral):
+		return str(int(value))
+	if isinstance(value, numbers.Real):
+		return repr(float(value))
+	if isinstance(value, str):
+		return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+	if value is None:
+		return 'None'
+	if isinstance(value, (list, tuple)):
+		return formatList(value, indent)
+	raise TypeError('%r can not be written to a script' % (value,))
+
+#Lists are laid out like HFSS recorded scripts, "Key:=" and its value on one line
+def formatList(values, indent):
+	if not any(isinstance(value, (list, tuple)) for value in values) and len(values) <= 2:
+		return '[' + ', '.join(formatValue(value) for value in values) + ']'
+	inner = indent + '\t'
+	lines = []
+	i = 0
+	while i < len(values):
+		value = values[i]
+		if isinstance(value, str) and value.endswith(':=') and i + 1 < len(values):
+			lines.append(inner + formatValue(value) + ', ' + formatValue(values[i+1], inner))
+			i += 2
+		else:
+			lines.append(inner + formatValue(value, inner))
+			i += 1
+	return '[\n' + ',\n'.join(lines) + '\n' + indent + ']'
+
+
+class ScriptEmitter(object):
+
+	def __init__(self):
+		self.lines = list(SCRIPT_HEADER)
+		self.names = {}
+		self.query_count = 0
+		#Local variables defined per design object, answers GetVariables without running anything
+		self.variables = {}
+
+	#Stand-ins for the objects openHFSS returns; oDesktop is a global of the script
+	def ansys(self):
+		return ScriptObject(self, 'oAnsys')
+
+	def desktop(self):
+		return ScriptObject(self, 'oDesktop')
+
+	#Unique script variable for an object, the first design is oDesign, the second oDesign_2...
+	def newName(self, base):
+		count = self.names.get(base, 0) + 1
+		self.names[base] = count
+		return base if count == 1 else '%s_%d' % (base, count)
+
+	def call(self, owner, method, args):
+		key = method.lower()
+		if key == 'getappdesktop':
+			return self.desktop()
+		if key == 'getvariables':
+			return tuple(self.variables.get(owner.name, {}))
+		if key == 'getvariablevalue' and args and args[0] in self.variables.get(owner.name, {}):
+			return self.variables[owner.name][args[0]]
+		if key == 'changeproperty':
+			self.trackVariables(owner.name, args)
+		statement = '%s.%s(%s)' % (owner.name, method, self.formatArgs(args))
+		if key in OBJECT_METHODS:
+			result = ScriptObject(self, self.newName(returnedName(owner, method)))
+			self.lines.append('%s = %s' % (result.name, statement))
+			return result
+		if key in QUERY_METHODS:
+			self.query_count += 1
+			result = ScriptValue('_query%d' % self.query_count)
+			self.lines.append('%s = %s' % (result.expression, QUERY_METHODS[key] % statement))
+			return result
+		self.lines.append(statement)
+		return None
+
+	def formatArgs(self, args):
+		if not args:
+			return ''
+		if len(args) == 1:
+			return formatValue(args[0])
+		return '\n\t' + ',\n\t'.join(formatValue(arg, '\t') for arg in args) + '\n'
+
+	#Keeps the local variables written through ChangeProperty so GetVariables can be answered
+	def trackVariables(self, owner_name, args):
+		variables = self.variables.setdefault(owner_name, {})
+		for tab in args[0][1:]:
+			if not (isinstance(tab, list) and tab and tab[0] == 'NAME:LocalVariableTab'):
+				continue
+			for group in tab[1:]:
+				if isinstance(group, list) and group and group[0] in ('NAME:NewProps', 'NAME:ChangedProps'):
+					for prop in group[1:]:
+						variables[prop[0][len('NAME:'):]] = prop[prop.index('Value:=')+1]
+
+	def script(self):
+		return '\n'.join(self.lines) + '\n'
+
+	def digest(self):
+		return hashlib.sha1(self.script().encode('utf-8')).hexdigest()
+
+	#Writes the script, leaving an identical existing file untouched
+	#Returns True if the file was written, False if the cached script could be reused
+	def save(self, path):
+		text = self.script()
+		if os.path.exists(path):
+			with open(path) as script_file:
+				if script_file.read() == text:
+					return False
+		with open(path, 'w') as script_file:
+			script_file.write(text)
+		return True
+
+
+#Command line running a saved script in one non-graphical HFSS session
+def batchCommand(script_path, executable='ansysedt'):
+	return [executable, '-ng', '-RunScriptAndExit', script_path]
+
+
+#Stand-in for one HFSS object of the script, every method call becomes a script line
+class ScriptObject(object):
+
+	def __init__(self, emitter, name):
+		self._emitter = emitter
+		self._name = name
+
+	@property
+	def name(self):
+		return self._name
+
+	def __getattr__(self, method):
+		if method.startswith('_'):
+			raise AttributeError(method)
+		emitter = self._emitter
+		def call(*args):
+			return emitter.call(self, method, args)
+		call.__name__ = method
+		return call
+
+	def __repr__(self):
+		return '<ScriptObject %s>' % self._name
@@ -0,0 +1,155 @@
+import threading
+import queue
+from concurrent.futures import Future
+
+try:
+	import win32com.client
+	import pythoncom
+except ImportError:
+	#Only needed for real HFSS sessions, pools of stand-in desktops work without it
+	win32com = None
+	pythoncom = None
+
+# from HFSS_Python.HFSSLibrary import releaseDesignContext # <--- uncomment this if importing submodule
+from HFSSLibrary import releaseDesignContext # <-- Comment this out if importing submodule
+
+#Pool of HFSS desktop sessions
+#Each session is one HFSS desktop process driven by its own thread (COM objects
+#belong to the thread that created them). Jobs are callables job(oDesktop, ...)
+#submitted to the pool; whichever session is free runs the next one and the
+#caller gets a concurrent.futures.Future for its result.
+#
+#	with SessionPool(4) as pool:
+#		futures = [pool.submit(designJob(build_patch, setup="Setup1"), f) for f in frequencies]
+#		results = [future.result() for future in futures]
+
+
+#Starts a new HFSS desktop process and returns its oDesktop
+def newDesktop():
+	if win32com is None:
+		raise ImportError('win32com (pywin32) is required to open HFSS')
+	#DispatchEx starts a separate process instead of attaching to a running desktop
+	oAnsys = win32com.client.DispatchEx('AnsoftHFSS.HfssScriptInterface')
+	return oAnsys.GetAppDesktop()
+
+
+class SessionPool(object):
+
+	#factory() is called on each session thread and returns that session's oDesktop
+	#quit: call QuitApplication on every desktop when the pool closes
+	def __init__(self, size, factory=newDesktop, quit=True):
+		if size < 1:
+			raise ValueError('a session pool needs at least one session')
+		self.factory = factory
+		self.quit = quit
+		self.jobs = queue.Queue()
+		self.lock = threading.Lock()
+		self.live_sessions = size
+		#Errors of sessions whose desktop could not be started
+		self.errors = []
+		self.closed = False
+		self.threads = []
+		for index in range(size):
+			thread = threading.Thread(target=self.run, args=(index,), name='HFSS session %d' % index)
+			thread.daemon = True
+			thread.start()
+			self.threads.append(thread)
+
+	def run(self, index):
+		if pythoncom is not None:
+			pythoncom.CoInitialize()
+		try:
+			try:
+				oDesktop = self.factory()
+			except Exception as error:
+				self.sessionFailed(error)
+				return
+			while True:
+				item = self.jobs.get()
+				if item is None:
+					break
+				job, args, kwargs, future = item
+				if not future.set_running_or_notify_cancel():
+					continue
+				try:
+					future.set_result(job(oDesktop, *args, **kwargs))
+				except Exception as error:
+					future.set_exception(error)
+			if self.quit:
+				oDesktop.QuitApplication()
+		finally:
+			if pythoncom is not None:
+				pythoncom.CoUninitialize()
+
+	#A session that could not start leaves its jobs to the others; when none are
+	#left every queued job fails with the error
+	def sessionFailed(self, error):
+		with self.lock:
+			self.errors.append(error)
+			self.live_sessions -= 1
+			if self.live_sessions > 0:
+				return
+		while True:
+			try:
+				item = self.jobs.get_nowait()
+			except queue.Empty:
+				break
+			if item is not None and item[3].set_running_or_notify_cancel():
+				item[3].set_exception(error)
+
+	#Runs job(oDesktop, *args, **kwargs) on the next free session
+	def submit(self, job, *args, **kwargs):
+		if self.closed:
+			raise RuntimeError('session pool is closed')
+		future = Future()
+		with self.lock:
+			if self.live_sessions == 0:
+				future.set_exception(self.errors[-1])
+				return future
+			self.jobs.put((job, args, kwargs, future))
+		return future
+
+	#Runs job once per item of iterable, results in the order of iterable
+	def map(self, job, iterable):
+		futures = [self.submit(job, item) for item in iterable]
+		return [future.result() for future in futures]
+
+	def close(self, wait=True):
+		if self.closed:
+			return
+		self.closed = True
+		for thread in self.threads:
+			self.jobs.put(None)
+		if wait:
+			for thread in self.threads:
+				thread.join()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+
+#Job building and solving one design in a new project of the session
+#build(oDesign, *args, **kwargs) draws the design, setup is solved if given, and
+#collect(oDesign) (default: return what build returned) gives the job result.
+#project_path, if given, is formatted with the job arguments and the project saved there.
+def designJob(build, setup=None, collect=None, design_name="HFSSDesign1", project_path=None):
+	def job(oDesktop, *args, **kwargs):
+		oProject = oDesktop.NewProject()
+		oDesign = None
+		try:
+			oDesign = oProject.InsertDesign("HFSS", design_name, "DrivenModal", "")
+			built = build(oDesign, *args, **kwargs)
+			if setup is not None:
+				oDesign.Analyze(setup)
+			result = collect(oDesign) if collect is not None else built
+			if project_path is not None:
+				oProject.SaveAs(project_path.format(*args, **kwargs), True)
+			return result
+		finally:
+			if oDesign is not None:
+				releaseDesignContext(oDesign)
+			oDesktop.CloseProject(oProject.GetName())
+	return job
@@ -0,0 +1,89 @@
+import functools
+import numpy as np
+
+#Units and HFSS value strings for whole arrays
+#convert scales arrays of values between units in one NumPy operation and
+#valueStrings turns them into HFSS value strings ("12.500000mm") in one string
+#formatting pass, the format per unit cached. The draw helpers, name_handler
+#and the device generators format their numbers through here, and the
+#expression evaluator reads its units from the same table.
+#
+#	coords = convert(coords_mil, "mil", "mm")		# (N, 3) array
+#	strings = valueStrings(coords, "mm")			# N lists of 3 strings
+
+#SI value of one of each unit
+UNITS = {
+	#Length
+	'm': 1.0, 'meter': 1.0, 'cm': 1e-2, 'mm': 1e-3, 'um': 1e-6, 'nm': 1e-9, 'km': 1e3,
+	'mil': 2.54e-5, 'mils': 2.54e-5, 'in': 2.54e-2, 'ft': 0.3048, 'uin': 2.54e-8,
+	#Angle
+	'rad': 1.0, 'deg': np.pi/180, 'degree': np.pi/180,
+	#Frequency
+	'Hz': 1.0, 'kHz': 1e3, 'MHz': 1e6, 'GHz': 1e9, 'THz': 1e12,
+	#Time
+	's': 1.0, 'ms': 1e-3, 'us': 1e-6, 'ns': 1e-9, 'ps': 1e-12, 'fs': 1e-15,
+	#Power, voltage, current, impedance
+	'W': 1.0, 'kW': 1e3, 'mW': 1e-3, 'uW': 1e-6,
+	'V': 1.0, 'kV': 1e3, 'mV': 1e-3, 'uV': 1e-6,
+	'A': 1.0, 'mA': 1e-3, 'uA': 1e-6,
+	'ohm': 1.0, 'kOhm': 1e3, 'MOhm': 1e6, 'mOhm': 1e-3,
+	#Capacitance, inductance, conductance
+	'F': 1.0, 'uF': 1e-6, 'nF': 1e-9, 'pF': 1e-12, 'fF': 1e-15,
+	'H': 1.0, 'uH': 1e-6, 'nH': 1e-9, 'pH': 1e-12,
+	'S': 1.0, 'mS': 1e-3, 'uS': 1e-6,
+}
+#Units are matched case-insensitively when the exact spelling is not known
+_UNITS_LOWER = dict((unit.lower(), scale) for unit, scale in UNITS.items())
+
+#Below this many values a list comprehension formats faster than one joined string
+_BULK_SIZE = 16
+
+#Separates the values of one joined format string
+_SEPARATOR = '\x00'
+
+
+def unitScale(unit):
+	scale = UNITS.get(unit)
+	if scale is None:
+		scale = _UNITS_LOWER.get(unit.lower())
+	if scale is None:
+		raise ValueError('unknown unit %r' % (unit))
+	return scale
+
+#values (number or array of any shape) in from_units expressed in to_units
+def convert(values, from_units, to_units):
+	factor = unitScale(from_units) / unitScale(to_units)
+	if np.ndim(values) == 0:
+		return float(values) * factor
+	return np.asarray(values, dtype=float) * factor
+
+#Format of a value with units, '%f' as HFSS has always been sent values
+@functools.lru_cache(maxsize=None)
+def valueFormat(units):
+	return '%f' + units.replace('%', '%%')
+
+@functools.lru_cache(maxsize=None)
+def _joinedFormat(units):
+	return valueFormat(units) + _SEPARATOR
+
+#HFSS value string of one number, e.g. valueString(12.5, "mm") is "12.500000mm"
+def valueString(value, units):
+	return valueFormat(units) % (value)
+
+#HFSS value strings of a list or array of numbers, nested like the array
+def valueStrings(values, units):
+	shape = np.shape(values)
+	if isinstance(values, np.ndarray):
+		flat = values.ravel().tolist()
+	elif len(shape) > 1:
+		flat = np.ravel(values).tolist()
+	else:
+		flat = list(values)
+	if len(flat) < _BULK_SIZE:
+		value_format = valueFormat(units)
+		strings = [value_format % (value) for value in flat]
+	else:
+		strings = (_joinedFormat(units) * len(flat) % tuple(flat)).split(_SEPARATOR)[:-1]
+	if len(shape) > 1:
+		return np.array(strings, dtype=object).reshape(shape).tolist()
+	return strings
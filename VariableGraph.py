@@ -0,0 +1,129 @@
+import re
+from collections import deque
+
+# from HFSS_Python.Expressions import expressionNames # <--- uncomment this if importing submodule
+from Expressions import expressionNames # <-- Comment this out if importing submodule
+
+#Dependencies between variables, found by tokenizing their values
+#"subXY*2" depends on subXY only, not on subX. order() gives the variables so
+#every one comes after the variables it uses (Kahn's algorithm, linear in
+#variables plus dependencies) and raises ValueError naming a cycle if there is one.
+#Names a value uses that are not in the graph are taken to be defined already.
+#
+#	graph = VariableGraph({'w': 'l*2', 'l': '3mm', 'gap': 'w-l'})
+#	graph.order()			# ['l', 'w', 'gap']
+#	graph.dependents('l')		# {'w', 'gap'}
+
+#Identifiers not preceded by a digit (those are units), for values the tokenizer does not parse
+_NAME = re.compile(r'(?<![\w.$])[$A-Za-z_]\w*')
+
+
+#Names a value refers to
+def dependencyNames(value):
+	if not isinstance(value, str):
+		return []
+	try:
+		return expressionNames(value)
+	except ValueError:
+		#Array values, quoted strings and other values that are not expressions
+		return list(dict.fromkeys(_NAME.findall(value)))
+
+
+class VariableGraph(object):
+
+	#variables is a dict of name -> value or a VariableCache
+	def __init__(self, variables=None):
+		#name -> names it uses, in insertion order of the names
+		self.dependencies = {}
+		if variables is not None:
+			self.update(variables)
+
+	def __contains__(self, name):
+		return name in self.dependencies
+
+	def __len__(self):
+		return len(self.dependencies)
+
+	def __iter__(self):
+		return iter(self.dependencies)
+
+	#A value naming the variable itself depends on nothing (localVar leaves it alone),
+	#an expression using the variable is a cycle of one
+	def add(self, name, value):
+		if value == name:
+			self.dependencies[name] = []
+		else:
+			self.dependencies[name] = dependencyNames(value)
+
+	def update(self, variables):
+		for name in variables:
+			self.add(name, variables.get(name))
+
+	def remove(self, name):
+		self.dependencies.pop(name, None)
+
+	#Variables of the graph name uses directly
+	def uses(self, name):
+		return [used for used in self.dependencies.get(name, ()) if used in self.dependencies]
+
+	#Variables that use name, directly or through others
+	def dependents(self, name):
+		users = self.users()
+		found = set()
+		pending = [name]
+		while pending:
+			for user in users.get(pending.pop(), ()):
+				if user not in found:
+					found.add(user)
+					pending.append(user)
+		return found
+
+	#name -> variables using it directly
+	def users(self):
+		users = {}
+		for name, used in self.dependencies.items():
+			for dependency in used:
+				if dependency in self.dependencies:
+					users.setdefault(dependency, []).append(name)
+		return users
+
+	#Variables in an order that defines every one after those it uses
+	#names limits the order to those variables (their dependencies outside names are taken as defined)
+	def order(self, names=None):
+		if names is None:
+			names = list(self.dependencies)
+		else:
+			names = [name for name in dict.fromkeys(names) if name in self.dependencies]
+		selected = set(names)
+		waiting = dict((name, 0) for name in names)
+		users = {}
+		for name in names:
+			for dependency in set(self.dependencies[name]):
+				if dependency in selected:
+					waiting[name] += 1
+					users.setdefault(dependency, []).append(name)
+		ready = deque(name for name in names if waiting[name] == 0)
+		ordered = []
+		while ready:
+			name = ready.popleft()
+			ordered.append(name)
+			for user in users.get(name, ()):
+				waiting[user] -= 1
+				if waiting[user] == 0:
+					ready.append(user)
+		if len(ordered) < len(names):
+			cycle = self.cycle([name for name in names if waiting[name] > 0])
+			raise ValueError('variables depend on each other: %s' % (' -> '.join(cycle)))
+		return ordered
+
+	#One cycle among names, the variables order() could not place
+	def cycle(self, names):
+		remaining = set(names)
+		path = []
+		position = {}
+		name = names[0]
+		while name not in position:
+			position[name] = len(path)
+			path.append(name)
+			name = next(used for used in self.dependencies[name] if used in remaining)
+		return path[position[name]:] + [name]
@@ -0,0 +1,118 @@
+#Stand-ins for the HFSS COM objects
+#Every call is appended to a shared log as (object, method, args); the few
+#methods whose answers the library reads (GetVariables, SetActiveEditor,
+#GetMatchedObjectName...) answer from plain Python state.
+
+
+class FakeComObject(object):
+
+	def __init__(self, log, name):
+		self._log = log
+		self._name = name
+
+	def __getattr__(self, method):
+		if method.startswith('_'):
+			raise AttributeError(method)
+		def call(*args):
+			self._log.append((self._name, method, args))
+			return self._answer(method, args)
+		call.__name__ = method
+		return call
+
+	def _answer(self, method, args):
+		return None
+
+	#Calls of method made on this object
+	def _calls(self, method):
+		return [args for [name, called, args] in self._log if name == self._name and called == method]
+
+
+#The modeler keeps the names of the objects it creates and duplicates, duplicates
+#named the way HFSS does (next free name_1, name_2...)
+class FakeEditor(FakeComObject):
+
+	def __init__(self, log, objects=()):
+		FakeComObject.__init__(self, log, 'oEditor')
+		self._objects = list(objects)
+
+	def _answer(self, method, args):
+		if method == 'GetMatchedObjectName':
+			return tuple(self._objects)
+		if method == 'GetFaceIDs':
+			return ('7', '8', '9')
+		if method.startswith('Create') and len(args) > 1 and 'Name:=' in args[1]:
+			self._objects.append(args[1][args[1].index('Name:=')+1])
+		if method in ('DuplicateAlongLine', 'DuplicateAroundAxis'):
+			selections = args[0][args[0].index('Selections:=')+1].split(',')
+			clones = args[1][args[1].index('NumClones:=')+1]
+			for k in range(int(clones)-1):
+				for name in selections:
+					self._objects.append(self._cloneName(name))
+		return None
+
+	def _cloneName(self, name):
+		suffix = 1
+		while '%s_%d' % (name, suffix) in self._objects:
+			suffix += 1
+		return '%s_%d' % (name, suffix)
+
+
+class FakeDesign(FakeComObject):
+
+	def __init__(self, log=None, objects=(), name='oDesign'):
+		FakeComObject.__init__(self, log if log is not None else [], name)
+		self._variables = {}
+		self._editor = FakeEditor(self._log, objects)
+		self._modules = {}
+
+	def _answer(self, method, args):
+		if method == 'GetVariables':
+			return tuple(self._variables)
+		if method == 'GetVariableValue':
+			return self._variables[args[0]]
+		if method == 'ChangeProperty':
+			for tab in args[0][1:]:
+				for group in tab[2:]:
+					for prop in group[1:]:
+						self._variables[prop[0][len('NAME:'):]] = prop[prop.index('Value:=')+1]
+		if method == 'SetActiveEditor':
+			return self._editor
+		if method == 'GetModule':
+			return self._modules.setdefault(args[0], FakeComObject(self._log, args[0]))
+		if method == 'GetName':
+			return self._name
+		return None
+
+
+class FakeProject(FakeComObject):
+
+	def __init__(self, log, name):
+		FakeComObject.__init__(self, log, name)
+		self._designs = []
+
+	def _answer(self, method, args):
+		if method == 'InsertDesign':
+			design = FakeDesign(self._log, name=args[1])
+			self._designs.append(design)
+			return design
+		if method == 'GetName':
+			return self._name
+		return None
+
+
+class FakeDesktop(FakeComObject):
+
+	def __init__(self, log=None, name='oDesktop'):
+		FakeComObject.__init__(self, log if log is not None else [], name)
+		self._projects = []
+
+	def _answer(self, method, args):
+		if method == 'NewProject':
+			project = FakeProject(self._log, 'Project%d' % (len(self._projects)+1))
+			self._projects.append(project)
+			return project
+		if method == 'GetProjects':
+			return tuple(self._projects)
+		if method == 'CloseProject':
+			self._projects = [project for project in self._projects if project._name != args[0]]
+		return None
@@ -0,0 +1,33 @@
+from ArrayBuilder import patchElement, linearArray, gridArray, circularArray, portNames
+from fakes import FakeDesign
+
+
+def element(oDesign):
+	return patchElement(oDesign, 28.6, 38, 8.3, 0, 60, 71, 1.5748, "FR4_epoxy", "mm", "Global", "Patch")
+
+
+def test_wave_port_sheet_is_copied():
+	oDesign = FakeDesign()
+	elements = linearArray(oDesign, element(oDesign), [60, 0, 0], 3, "mm")
+	modeler = oDesign._editor._objects
+	for port in portNames(elements):
+		assert port in modeler
+	assert portNames(elements) == ['Patch_feedline_wave_port', 'Patch_feedline_wave_port_1', 'Patch_feedline_wave_port_2']
+
+
+def test_copy_names_match_the_modeler():
+	#Objects already in the design push the suffixes of the copies up
+	oDesign = FakeDesign(objects=['Patch_1'])
+	rows = gridArray(oDesign, element(oDesign), [60, 0, 0], 2, [0, 70, 0], 2, "mm")
+	modeler = set(oDesign._editor._objects)
+	names = [name for row in rows for copy in row for name in copy.objects]
+	assert len(set(names)) == len(names) == 4*7
+	assert set(names) <= modeler
+	assert rows[0][1].objects[0] == 'Patch_2'
+
+
+def test_circular_array():
+	oDesign = FakeDesign()
+	elements = circularArray(oDesign, element(oDesign), "Z", 4)
+	assert [copy.objects[0] for copy in elements] == ['Patch', 'Patch_1', 'Patch_2', 'Patch_3']
+	assert set(name for copy in elements for name in copy.objects) <= set(oDesign._editor._objects)
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from Campaign import Campaign, product, runWorker, ERROR_KEY
+
+
+def area(row):
+	return {'area': row['length'] * row['width']}
+
+
+def test_run_local():
+	table = product(length=[1, 2, 3], width=[4, 5])
+	results = Campaign(table, chunk_size=2).runLocal(area, workers=3)
+	assert sorted((row['length'], row['width'], row['area']) for row in results) == \
+		sorted((row['length'], row['width'], row['length'] * row['width']) for row in table)
+
+
+def test_table_of_columns_and_list_results():
+	campaign = Campaign({'f': [1, 2]})
+	results = campaign.runLocal(lambda row: [{'s11': -row['f']}, {'s11': -2*row['f']}], workers=1)
+	assert results == [{'f': 1, 's11': -1}, {'f': 1, 's11': -2}, {'f': 2, 's11': -2}, {'f': 2, 's11': -4}]
+	assert campaign.progress()['done'] == 2
+
+
+def test_empty_table():
+	assert Campaign([]).runLocal(area, workers=2) == []
+
+
+def test_failing_job_is_retried_then_reported():
+	attempts = []
+	lock = threading.Lock()
+	def evaluate(row):
+		with lock:
+			attempts.append(row['x'])
+		if row['x'] == 2:
+			raise RuntimeError('mesh failed')
+		return row['x'] * 10
+	campaign = Campaign(product(x=[1, 2, 3]), max_retries=2)
+	results = campaign.runLocal(evaluate, workers=2)
+	assert attempts.count(2) == 3
+	assert [row for row in results if ERROR_KEY not in row] == [{'x': 1, 'result': 10}, {'x': 3, 'result': 30}]
+	[failed] = [row for row in results if ERROR_KEY in row]
+	assert failed['x'] == 2 and 'mesh failed' in failed[ERROR_KEY]
+	assert campaign.progress()['failed'] == 1
+
+
+def test_flaky_job_succeeds_on_retry():
+	failures = [1]
+	def evaluate(row):
+		if failures:
+			failures.pop()
+			raise RuntimeError('licence busy')
+		return row['x']
+	assert Campaign(product(x=[7]), max_retries=1).runLocal(evaluate, workers=1) == [{'x': 7, 'result': 7}]
+
+
+def test_serve_needs_an_authkey():
+	with pytest.raises(ValueError):
+		Campaign([]).serve(('localhost', 0))
+
+
+def test_worker_returns_when_the_campaign_is_gone():
+	campaign = Campaign([])
+	address = campaign.start()
+	campaign.wait()
+	#Nothing listens any more, the worker returns instead of raising
+	runWorker(address, campaign.authkey, area)
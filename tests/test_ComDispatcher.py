@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from ComDispatcher import ComDispatcher, PendingValue, PipelineError
+from fakes import FakeComObject
+
+
+#COM object whose methods run on the dispatcher thread
+class Modeler(FakeComObject):
+
+	def __init__(self):
+		FakeComObject.__init__(self, [], 'oEditor')
+		self.threads = set()
+		self.gate = threading.Event()
+		self.gate.set()
+
+	def _answer(self, method, args):
+		self.threads.add(threading.current_thread().name)
+		self.gate.wait(5)
+		if method == 'Fail':
+			raise RuntimeError('COM error')
+		if method == 'GetChildObject':
+			return Modeler()
+		if method == 'GetFaceIDs':
+			return ('7', '8')
+		return args[0] if args else None
+
+
+@pytest.fixture
+def dispatcher():
+	dispatcher = ComDispatcher()
+	yield dispatcher
+	dispatcher.close()
+
+
+def test_calls_are_made_in_order_on_the_worker(dispatcher):
+	oEditor = Modeler()
+	oEditor.gate.clear()
+	pending = [dispatcher.callMethod(oEditor, 'CreateBox', ['Box%d' % i]) for i in range(20)]
+	#Nothing waits for HFSS while the calls are queued
+	assert not any(value.done() for value in pending)
+	oEditor.gate.set()
+	dispatcher.drain()
+	assert [args[0] for [name, method, args] in oEditor._log] == ['Box%d' % i for i in range(20)]
+	assert [value.result() for value in pending] == ['Box%d' % i for i in range(20)]
+	assert oEditor.threads == {'HFSS COM dispatcher'}
+
+
+def test_pending_values_chain(dispatcher):
+	oEditor = Modeler()
+	child = dispatcher.callMethod(oEditor, 'GetChildObject', ['Box'])
+	assert isinstance(child, PendingValue)
+	#A method of a pending object, indexing and then are queued too
+	faces = child.GetFaceIDs('Box')
+	first = faces[0]
+	number = first.then(int)
+	assert isinstance(first, PendingValue) and isinstance(number, PendingValue)
+	assert number.result() == 7
+	assert list(faces) == ['7', '8']
+	assert len(faces) == 2
+	#Pending values passed as arguments are resolved on the worker
+	assert dispatcher.callMethod(oEditor, 'Echo', [[first, (number,)]]).result() == ['7', (7,)]
+
+
+def test_failure_is_raised_once_by_drain(dispatcher):
+	oEditor = Modeler()
+	dispatcher.callMethod(oEditor, 'Fail', [])
+	after = dispatcher.callMethod(oEditor, 'CreateBox', ['Box'])
+	with pytest.raises(PipelineError):
+		dispatcher.drain()
+	dispatcher.drain()
+	#Calls queued before the failure was seen still ran
+	assert after.result() == 'Box'
+
+
+def test_failure_seen_through_result_is_not_raised_again(dispatcher):
+	oEditor = Modeler()
+	failed = dispatcher.callMethod(oEditor, 'Fail', [])
+	with pytest.raises(RuntimeError):
+		failed.result()
+	dispatcher.drain()
+	assert dispatcher.callMethod(oEditor, 'CreateBox', ['Box']).result() == 'Box'
+
+
+def test_failure_is_raised_by_the_next_call(dispatcher):
+	oEditor = Modeler()
+	dispatcher.callMethod(oEditor, 'Fail', []).then(lambda value: None)
+	dispatcher.calls.join()
+	with pytest.raises(PipelineError):
+		dispatcher.callMethod(oEditor, 'CreateBox', ['Box'])
+	dispatcher.drain()
+
+
+def test_close_joins_the_worker():
+	dispatcher = ComDispatcher()
+	oEditor = Modeler()
+	pending = dispatcher.callMethod(oEditor, 'CreateBox', ['Box'])
+	dispatcher.close()
+	assert not dispatcher.thread.is_alive()
+	assert pending.done()
+	with pytest.raises(PipelineError):
+		dispatcher.callMethod(oEditor, 'CreateBox', ['Box2'])
+	#Closing again does nothing
+	dispatcher.close()
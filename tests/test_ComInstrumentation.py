@@ -0,0 +1,71 @@
+import csv
+import json
+
+from ComInstrumentation import HISTOGRAM_BUCKETS, ComProfiler, ComProxy, instrument
+from HFSSLibrary import drawBox
+from fakes import FakeDesign, FakeDesktop
+
+
+def build(attribution):
+	profiler = ComProfiler(attribution)
+	oDesign = instrument(FakeDesign(), profiler, 'oDesign')
+	drawBox(oDesign, 0, 0, 0, 1, 2, 3, "mm", "copper", "Global", ["", "", "", "bx", "by", "bz", "Box"], 0)
+	return profiler
+
+
+def test_calls_are_attributed_to_library_functions():
+	stats = build('innermost').stats
+	assert set(stats) == {('drawBox', 'oDesign.SetActiveEditor'), ('localVar', 'oDesign.GetVariables'),
+						  ('commitVariables', 'oDesign.ChangeProperty'), ('drawBox', 'oEditor.CreateBox')}
+	assert all(call.count == 1 for call in stats.values())
+
+
+def test_outermost_attribution_passes_through_with_blocks():
+	assert set(method for [caller, method] in build('outermost').stats) == {
+		'oDesign.SetActiveEditor', 'oDesign.GetVariables', 'oDesign.ChangeProperty', 'oEditor.CreateBox'}
+	assert set(caller for [caller, method] in build('outermost').stats) == {'drawBox'}
+
+
+def test_calls_from_scripts():
+	profiler = ComProfiler()
+	oDesktop = instrument(FakeDesktop(), profiler)
+	oDesktop.NewProject()
+	assert list(profiler.stats) == [('<script>', 'oDesktop.NewProject')]
+
+
+def test_objects_returned_in_tuples_are_wrapped():
+	profiler = ComProfiler()
+	oDesktop = instrument(FakeDesktop(), profiler)
+	oDesktop.NewProject()
+	[oProject] = oDesktop.GetProjects()
+	assert isinstance(oProject, ComProxy)
+	oProject.InsertDesign("HFSS", "Design1", "DrivenModal", "")
+	assert profiler.byMethod()['oProject.InsertDesign'][0] == 1
+
+
+def test_histogram():
+	profiler = ComProfiler()
+	for elapsed in (5e-5, 2e-4, 2e-4, 20.0):
+		profiler.record('drawBox', 'oEditor.CreateBox', elapsed)
+	[row] = profiler.rows()
+	assert row['count'] == 4
+	assert row['min_s'] == 5e-5 and row['max_s'] == 20.0
+	assert row['histogram'][:2] == [1, 2] and row['histogram'][-1] == 1
+	assert sum(row['histogram']) == 4
+
+
+def test_export(tmp_path):
+	profiler = ComProfiler()
+	profiler.record('drawBox', 'oEditor.CreateBox', 2e-3)
+	profiler.record('drawBox', 'oEditor.CreateBox', 4e-3)
+	profiler.record('localVar', 'oDesign.ChangeProperty', 1e-2)
+	report = json.loads(profiler.toJSON(str(tmp_path / 'profile.json')))
+	assert report == json.loads((tmp_path / 'profile.json').read_text())
+	assert report['buckets_s'] == list(HISTOGRAM_BUCKETS)
+	assert [row['method'] for row in report['calls']] == ['oDesign.ChangeProperty', 'oEditor.CreateBox']
+	profiler.toCSV(str(tmp_path / 'profile.csv'))
+	with open(str(tmp_path / 'profile.csv')) as csv_file:
+		rows = list(csv.reader(csv_file))
+	assert rows[0][:3] == ['function', 'method', 'count']
+	assert len(rows[0]) == 7 + len(HISTOGRAM_BUCKETS) + 1
+	assert rows[2][:3] == ['drawBox', 'oEditor.CreateBox', '2']
@@ -0,0 +1,62 @@
+import pytest
+
+from ComTape import TapeRecorder, TapeReplayer, TapeMismatch, ReplayObject
+from fakes import FakeDesktop
+
+
+def record(path):
+	desktop = FakeDesktop()
+	with TapeRecorder(path) as recorder:
+		oDesktop = recorder.wrap(desktop, 'oDesktop')
+		oProject = oDesktop.NewProject()
+		oDesign = oProject.InsertDesign("HFSS", "Patch", "DrivenModal", "")
+		oDesign.GetModule("BoundarySetup").AssignRadiation(["NAME:Rad1", "Objects:=", ["AirBox"]])
+		projects = oDesktop.GetProjects()
+		names = [project.GetName() for project in projects]
+	return [desktop, projects, names]
+
+
+@pytest.mark.parametrize('name', ['tape.jsonl', 'tape.jsonl.gz'])
+def test_round_trip(tmp_path, name):
+	path = str(tmp_path / name)
+	[desktop, projects, names] = record(path)
+	replayer = TapeReplayer(path)
+	oDesktop = replayer.object(0)
+	oProject = oDesktop.NewProject()
+	oDesign = oProject.InsertDesign("HFSS", "Patch", "DrivenModal", "")
+	oDesign.GetModule("BoundarySetup").AssignRadiation(["NAME:Rad1", "Objects:=", ["AirBox"]])
+	assert isinstance(oProject, ReplayObject)
+	assert oDesign is not oProject
+	assert replayer.remaining() == 2
+	#Objects inside a returned tuple replay as objects of their own
+	replayed_projects = oDesktop.GetProjects()
+	assert isinstance(replayed_projects, tuple) and len(replayed_projects) == len(projects) == 1
+	assert isinstance(replayed_projects[0], ReplayObject)
+	assert [project.GetName() for project in replayed_projects] == names == ['Project1']
+	assert replayer.remaining() == 0
+
+
+def test_tuple_of_com_objects_is_wrapped(tmp_path):
+	[desktop, projects, names] = record(str(tmp_path / 'tape.jsonl'))
+	assert isinstance(projects, tuple)
+	#Calls on a returned element went through the recorder like any other proxy
+	assert ('Project1', 'GetName', ()) in desktop._log
+
+
+def test_strict_replay_mismatch(tmp_path):
+	path = str(tmp_path / 'tape.jsonl')
+	record(path)
+	oDesktop = TapeReplayer(path).object(0)
+	oDesktop.NewProject()
+	with pytest.raises(TapeMismatch):
+		oDesktop.NewProject()
+
+
+def test_loose_replay_matches_on_arguments(tmp_path):
+	path = str(tmp_path / 'tape.jsonl')
+	record(path)
+	replayer = TapeReplayer(path, strict=False)
+	oDesktop = replayer.object(0)
+	assert len(oDesktop.GetProjects()) == 1
+	assert oDesktop.NewProject() is replayer.object(1)
+	assert oDesktop.Unknown() is None
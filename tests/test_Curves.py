@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from Curves import (archimedeanSpiral, circularSpiral, drawCurve, drawTaper, exponentialTaper, klopfensteinImpedance,
+					meander, microstripWidth, rectangularSpiral)
+from EmagDevices import square_spiral_inductor
+from fakes import FakeDesign
+
+
+def test_rectangular_spiral_turns_inward():
+	[points, segments] = rectangularSpiral(10, 10, 1, 2)
+	assert segments is None
+	assert points.shape == (9, 3)
+	assert np.allclose(points[:5], [[-5, -5, 0], [5, -5, 0], [5, 5, 0], [-5, 5, 0], [-5, -4, 0]])
+	#Every side after the third is pitch shorter than the one two before
+	sides = np.linalg.norm(np.diff(points, axis=0), axis=1)
+	assert np.allclose(sides[3:], sides[1:-2] - 1)
+
+
+def test_rectangular_spiral_stops_when_it_runs_out_of_room():
+	[points, segments] = rectangularSpiral(4, 4, 1, 10)
+	sides = np.linalg.norm(np.diff(points, axis=0), axis=1)
+	assert np.all(sides > 0)
+
+
+def test_circular_spiral_arcs_join():
+	[points, segments] = circularSpiral(1, 0.5, 2)
+	assert segments == [["Arc", 3]] * 4
+	assert len(points) == 2*len(segments) + 1
+	#Every arc point lies on its half circle
+	for half in range(4):
+		center = np.array([0.25 if half % 2 else 0, 0, 0])
+		radii = np.linalg.norm(points[2*half:2*half+3] - center, axis=1)
+		assert np.allclose(radii, 1 + half*0.25)
+
+
+def test_archimedean_spiral_radius_grows_by_pitch_per_turn():
+	[points, segments] = archimedeanSpiral(1, 0.5, 3, samples_per_turn=12)
+	assert segments == "Spline"
+	assert len(points) == 37
+	radii = np.linalg.norm(points, axis=1)
+	assert radii[0] == pytest.approx(1)
+	assert radii[12] == pytest.approx(1.5)
+	assert radii[-1] == pytest.approx(2.5)
+
+
+def test_meander():
+	[points, segments] = meander(1, 2, 3, start=(1, 1, 0))
+	assert np.allclose(points[:, :2], [[1, 1], [1, 3], [2, 3], [2, 1], [3, 1], [3, 3]])
+
+
+def test_exponential_taper_outline():
+	[outline, segments] = exponentialTaper(10, 1, 4, samples=5)
+	assert outline.shape == (10, 3)
+	widths = outline[:5, 1]*2
+	assert widths[0] == pytest.approx(1) and widths[-1] == pytest.approx(4)
+	assert widths[2] == pytest.approx(2)
+	assert np.allclose(outline[5:, 1], -outline[4::-1, 1])
+
+
+def test_klopfenstein_impedance_rises_monotonically():
+	pytest.importorskip('scipy')
+	[positions, impedances] = klopfensteinImpedance(100, 50, 100, 0.02, samples=11)
+	assert positions[0] == 0 and positions[-1] == pytest.approx(100)
+	assert np.all(np.diff(impedances) > 0)
+	assert impedances[5] == pytest.approx(np.sqrt(50*100))
+	assert 50 < impedances[0] < 55 and 95 < impedances[-1] < 100
+
+
+def test_microstrip_width():
+	#50 ohm on 1.6 mm FR4 is close to 3 mm; higher impedances are narrower
+	assert microstripWidth(50, 1.6, 4.4) == pytest.approx(3.06, abs=0.05)
+	widths = microstripWidth([30, 50, 100], 1.6, 4.4)
+	assert np.all(np.diff(widths) < 0)
+
+
+def test_curves_are_drawn_as_one_polyline():
+	oDesign = FakeDesign()
+	drawCurve(oDesign, meander(1, 2, 3), "mm", "Meander", 0.2)
+	drawTaper(oDesign, exponentialTaper(10, 1, 4), "mm", "Taper")
+	assert len(oDesign._editor._calls('CreatePolyline')) == 2
+	assert oDesign._editor._objects == ['Meander', 'Taper']
+
+
+def test_constant_width_square_spiral_keeps_its_material():
+	oDesign = FakeDesign()
+	assert square_spiral_inductor(oDesign, 0, 0, 10, 0.5, 1, 1, 2) == "Spiral"
+	[args] = oDesign._editor._calls('CreatePolyline')
+	attributes = args[1]
+	assert attributes[attributes.index("MaterialValue:=")+1] == '"vacuum"'
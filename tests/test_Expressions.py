@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from Expressions import ExpressionEvaluator, expressionNames, tokenize
+
+
+def evaluator():
+	return ExpressionEvaluator({'length': '2mm', 'width': 'length*3', 'angle': '90deg', 'n': '3'})
+
+
+def test_values_in_si_and_in_units():
+	variables = evaluator()
+	assert variables.evaluate("5mm+6mm*length") == pytest.approx(0.005012)
+	assert variables.evaluate("width", "mm") == pytest.approx(6.0)
+	assert variables.evaluate("angle", "deg") == pytest.approx(90.0)
+
+
+def test_unitless_values_are_left_alone():
+	variables = evaluator()
+	assert variables.evaluate("n*2", "mm") == pytest.approx(6.0)
+	assert not variables.hasUnits("n*2")
+
+
+def test_angles_inside_trig_functions():
+	variables = evaluator()
+	assert variables.evaluate("sin(90deg)", "mm") == pytest.approx(1.0)
+	assert variables.evaluate("cos(angle)*length", "mm") == pytest.approx(0.0, abs=1e-12)
+	assert variables.evaluate("sin(angle)*length", "mm") == pytest.approx(2.0)
+	assert not variables.hasUnits("if(length > 1mm, 1, 0)")
+
+
+def test_whitespace_between_number_and_unit():
+	variables = evaluator()
+	assert variables.evaluate("1 mm", "mm") == pytest.approx(1.0)
+	assert variables.evaluate("1 mm + 2mm", "mm") == pytest.approx(3.0)
+	#A name that is not a unit stays a name
+	assert tokenize("2 n")[1] == ('name', 'n', None)
+	with pytest.raises(ValueError):
+		variables.evaluate("2 n")
+
+
+def test_precedence():
+	variables = ExpressionEvaluator({})
+	assert variables.evaluate("-2^2") == -4
+	assert variables.evaluate("2^3^2") == 512
+	assert variables.evaluate("1+2*3") == 7
+
+
+def test_errors():
+	variables = ExpressionEvaluator({'a': 'b', 'b': 'a'})
+	with pytest.raises(ValueError):
+		variables.evaluate("a")
+	with pytest.raises(KeyError):
+		variables.evaluate("c")
+	with pytest.raises(ValueError):
+		variables.evaluate("foo(1)")
+
+
+def test_names():
+	assert expressionNames("sin(angle)*length+length+pi") == ['angle', 'length', 'pi']
+
+
+def test_evaluate_many_matches_evaluate():
+	variables = evaluator()
+	expressions = ["%fmm+width" % x for x in range(20)] + ["n*%d" % x for x in range(20)] + [1.5]
+	values = variables.evaluateMany(expressions, "mm")
+	assert np.allclose(values, [variables.evaluate(expression, "mm") for expression in expressions])
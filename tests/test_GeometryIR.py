@@ -0,0 +1,188 @@
+import pytest
+
+import HFSSLibrary
+from EmagDevices import rectangular_patch
+from GeometryIR import (GeometryIR, IRPrimitive, IRBoolean, IRVariableBlock, IRCoordinateSystem, IRQuery, applyIncremental,
+						compileIR, mergeVariables, dedupeCoordinateSystems, dropRedundantCalls, groupBooleans, saveSnapshot, loadSnapshot)
+from fakes import FakeDesign
+
+
+def patchBuild(length=28.6, count=1, sweep_stop=3e9):
+	ir = GeometryIR()
+	oDesign = ir.design()
+	for i in range(count):
+		HFSSLibrary.createRelativeCS(oDesign, 60*i, 0, 0, [1, 0, 0], [0, 1, 0], 'mm', 'CS%d' % i)
+		rectangular_patch(oDesign, length, 38, 8.3, 0, 60, 71, 1.5748, "FR4_epoxy", "mm", 'CS%d' % i, 'P%d' % i)
+	HFSSLibrary.globalCS(oDesign)
+	HFSSLibrary.insertSetup(oDesign, 2.45e9, 1, 1, 10, 30, "Setup1")
+	HFSSLibrary.LinearFrequencySweep(oDesign, 2e9, sweep_stop, 1e7, "Setup1", "Sweep")
+	return ir
+
+
+def methods(oDesign, start):
+	return [method for [name, method, args] in oDesign._log[start:]]
+
+
+def boxBuild(size):
+	ir = GeometryIR()
+	HFSSLibrary.drawBox(ir.design(), 0, 0, 0, size, 1, 1, 'mm', 'vacuum', 'Global', ['', '', '', 'boxX', '', '', 'Box'], .5)
+	return ir
+
+
+def test_modes(tmp_path):
+	path = str(tmp_path / 'snapshot.json')
+	oDesign = FakeDesign()
+	assert applyIncremental(boxBuild(1), oDesign, path)['mode'] == 'full'
+	start = len(oDesign._log)
+	assert applyIncremental(boxBuild(1), oDesign, path)['mode'] == 'unchanged'
+	assert len(oDesign._log) == start
+	#Only the variable behind the box size changed
+	result = applyIncremental(boxBuild(2), oDesign, path)
+	assert result['mode'] == 'variables' and result['variables'] == ['boxX']
+	assert methods(oDesign, start) == ['ChangeProperty']
+	result = applyIncremental(patchBuild(), oDesign, path)
+	assert result['mode'] == 'partial' and 'Box' in result['deleted']
+
+
+def test_added_element_only_sends_the_difference(tmp_path):
+	path = str(tmp_path / 'snapshot.json')
+	oDesign = FakeDesign()
+	applyIncremental(patchBuild(count=1), oDesign, path)
+	start = len(oDesign._log)
+	result = applyIncremental(patchBuild(count=2), oDesign, path)
+	assert result['mode'] == 'partial'
+	sent = methods(oDesign, start)
+	#The first element is left alone, setup and sweep are deleted and sent again after the new one
+	assert sent.count('CreateBox') == 1
+	assert sent.index('DeleteSweep') < sent.index('DeleteSetups') < sent.index('InsertSetup') < sent.index('InsertFrequencySweep')
+
+
+def test_sweep_change_deletes_the_old_sweep(tmp_path):
+	path = str(tmp_path / 'snapshot.json')
+	oDesign = FakeDesign()
+	applyIncremental(patchBuild(), oDesign, path)
+	start = len(oDesign._log)
+	result = applyIncremental(patchBuild(sweep_stop=4e9), oDesign, path)
+	assert result['deleted'] == ['Sweep']
+	log = oDesign._log[start:]
+	assert [(method, args) for [name, method, args] in log if method.startswith('Delete')] == [('DeleteSweep', ('Setup1', 'Sweep'))]
+	assert methods(oDesign, start)[-1] == 'InsertFrequencySweep'
+
+
+def test_deleted_objects_are_named_once(tmp_path):
+	path = str(tmp_path / 'snapshot.json')
+	oDesign = FakeDesign()
+	applyIncremental(patchBuild(count=1), oDesign, path)
+	start = len(oDesign._log)
+	#A different probe position rebuilds the element, booleans included
+	ir = GeometryIR()
+	rectangular_patch(ir.design(), 28.6, 38, 9, 0, 60, 71, 1.5748, "FR4_epoxy", "mm", 'Global', 'P0')
+	result = applyIncremental(ir, oDesign, path)
+	assert len(result['deleted']) == len(set(result['deleted']))
+	[selections] = [args[0] for [name, method, args] in oDesign._log[start:] if method == 'Delete']
+	names = selections[selections.index('Selections:=')+1].split(',')
+	assert 'P0_feedline_wave_port' in names
+	assert len(names) == len(set(names))
+
+
+def test_undeletable_module_items_stop_the_reapply(tmp_path):
+	path = str(tmp_path / 'snapshot.json')
+	def build(radius):
+		ir = GeometryIR()
+		oDesign = ir.design()
+		HFSSLibrary.drawSphere(oDesign, 0, 0, 0, radius, 'mm', 'vacuum', 'Global', 'air', .5)
+		oDesign.GetModule("Optimetrics").InsertOptimization(["NAME:Optimization1"])
+		return ir
+	oDesign = FakeDesign()
+	applyIncremental(build(100), oDesign, path)
+	start = len(oDesign._log)
+	with pytest.raises(ValueError):
+		applyIncremental(build(120), oDesign, path)
+	assert not [method for method in methods(oDesign, start) if method.startswith('Delete')]
+
+
+#####Recording and compiling#####
+
+def editorCalls(oDesign, method):
+	return [args for [name, called, args] in oDesign._log if name == 'oEditor' and called == method]
+
+
+def test_recording():
+	ir = patchBuild(count=2)
+	kinds = set(type(record).__name__ for record in ir.records)
+	assert {'IRPrimitive', 'IRBoolean', 'IRVariable', 'IRQuery', 'IRAssignment', 'IRCoordinateSystem'} <= kinds
+	names = [record.name for record in ir.records if isinstance(record, IRPrimitive)]
+	assert 'P1_feedline_wave_port' in names
+	#The stand-in modeler answers from what was drawn
+	assert HFSSLibrary.getEditor(ir.design()).GetMatchedObjectName("*") == tuple(ir.objects)
+
+
+def test_compile_matches_a_direct_build():
+	direct = FakeDesign()
+	rectangular_patch(direct, 28.6, 38, 8.3, 0, 60, 71, 1.5748, "FR4_epoxy", "mm", "Global", "P0")
+	ir = GeometryIR()
+	rectangular_patch(ir.design(), 28.6, 38, 8.3, 0, 60, 71, 1.5748, "FR4_epoxy", "mm", "Global", "P0")
+	compiled = FakeDesign()
+	compileIR(ir, compiled)
+	for method in ('CreateBox', 'CreateRectangle', 'CreateCylinder', 'CreateCircle'):
+		assert editorCalls(compiled, method) == editorCalls(direct, method)
+	#Face ids are asked for at emit time and passed on to the boundary
+	assert editorCalls(compiled, 'GetFaceIDs') == editorCalls(direct, 'GetFaceIDs')
+	assert len(editorCalls(compiled, 'Subtract')) <= len(editorCalls(direct, 'Subtract'))
+	assert compiled._variables == direct._variables
+
+
+def test_merge_variables_keeps_final_values_in_dependency_order():
+	ir = GeometryIR()
+	oDesign = ir.design()
+	HFSSLibrary.localVar(oDesign, 'w', '2mm')
+	HFSSLibrary.localVar(oDesign, 'l', '3mm')
+	HFSSLibrary.localVar(oDesign, 'w', 'l*2')
+	[block] = mergeVariables(ir.records)
+	assert isinstance(block, IRVariableBlock)
+	assert list(block.values.items()) == [('l', '3mm'), ('w', 'l*2')]
+
+
+def test_identical_coordinate_systems_are_merged():
+	ir = GeometryIR()
+	oDesign = ir.design()
+	for name in ('CS1', 'CS2'):
+		HFSSLibrary.globalCS(oDesign)
+		HFSSLibrary.createRelativeCS(oDesign, 5, 0, 0, [1, 0, 0], [0, 1, 0], 'mm', name)
+		HFSSLibrary.drawBox(oDesign, 0, 0, 0, 1, 1, 1, 'mm', 'vacuum', name, 'Box_' + name, .5)
+	records = dropRedundantCalls(dedupeCoordinateSystems(ir.records))
+	assert [record.name for record in records if isinstance(record, IRCoordinateSystem)] == ['CS1']
+	assert [record.cs for record in records if isinstance(record, IRPrimitive)] == ['CS1', 'CS1']
+	#The recorded boxes are left alone
+	assert [record.cs for record in ir.records if isinstance(record, IRPrimitive)] == ['CS1', 'CS2']
+
+
+def test_subtractions_are_grouped():
+	ir = GeometryIR()
+	oDesign = ir.design()
+	for name in ('A', 'B', 'C', 'D'):
+		HFSSLibrary.drawBox(oDesign, 0, 0, 0, 1, 1, 1, 'mm', 'vacuum', 'Global', name, .5)
+	HFSSLibrary.binarySubtraction(oDesign, 'A', 'C', True)
+	HFSSLibrary.binarySubtraction(oDesign, 'B', 'C', True)
+	HFSSLibrary.binarySubtraction(oDesign, 'A', 'D', False)
+	records = groupBooleans(ir.records)
+	booleans = [record for record in records if isinstance(record, IRBoolean)]
+	assert len(booleans) < 3
+	assert set(name for record in booleans for name in record.blanks) == {'A', 'B'}
+
+
+def test_snapshot_round_trip(tmp_path):
+	path = str(tmp_path / 'snapshot.json')
+	ir = patchBuild()
+	saveSnapshot(ir.records, path)
+	loaded = loadSnapshot(path)
+	assert [type(record) for record in loaded] == [type(record) for record in ir.records]
+	assert [record.index for record in loaded if isinstance(record, IRQuery)] == \
+		[record.index for record in ir.records if isinstance(record, IRQuery)]
+	first = FakeDesign()
+	second = FakeDesign()
+	compileIR(ir, first)
+	loaded_ir = GeometryIR()
+	loaded_ir.records = loaded
+	compileIR(loaded_ir, second)
+	assert first._log == second._log
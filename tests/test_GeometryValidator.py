@@ -0,0 +1,91 @@
+import itertools
+
+import numpy as np
+
+import HFSSLibrary
+from EmagDevices import rectangular_patch
+from GeometryIR import GeometryIR
+from GeometryValidator import validateIR, _overlappingPairs
+
+
+def box(oDesign, name, x, y=0, z=0, size=1, material='copper', cs='Global'):
+	HFSSLibrary.drawBox(oDesign, x, y, z, size, size, size, 'mm', material, cs, name, 0)
+
+
+def kinds(issues):
+	return sorted((issue.kind, tuple(issue.objects)) for issue in issues)
+
+
+def test_overlapping_solids():
+	ir = GeometryIR()
+	oDesign = ir.design()
+	box(oDesign, 'A', 0)
+	box(oDesign, 'B', 0.5)
+	box(oDesign, 'C', 1)		# touches B, does not overlap A
+	box(oDesign, 'Air', 0, material='vacuum')
+	assert kinds(validateIR(ir)) == [('overlap', ('A', 'B')), ('overlap', ('B', 'C'))]
+
+
+def test_subtracted_pairs_are_exempt():
+	ir = GeometryIR()
+	oDesign = ir.design()
+	box(oDesign, 'A', 0)
+	box(oDesign, 'B', 0.5)
+	HFSSLibrary.binarySubtraction(oDesign, 'A', 'B', True)
+	assert validateIR(ir) == []
+
+
+def test_tool_missing_its_blank():
+	ir = GeometryIR()
+	oDesign = ir.design()
+	box(oDesign, 'A', 0)
+	box(oDesign, 'B', 5)
+	HFSSLibrary.binarySubtraction(oDesign, 'A', 'B', False)
+	assert kinds(validateIR(ir)) == [('tool_miss', ('B', 'A'))]
+
+
+def test_patch_antenna_is_clean():
+	ir = GeometryIR()
+	rectangular_patch(ir.design(), 28.6, 38, 8.3, 0, 60, 71, 1.5748, "FR4_epoxy", "mm", "Global", "P")
+	assert validateIR(ir) == []
+
+
+def test_relative_cs_and_radiation_sphere():
+	ir = GeometryIR()
+	oDesign = ir.design()
+	HFSSLibrary.createRelativeCS(oDesign, 100, 0, 0, [1, 0, 0], [0, 1, 0], 'mm', 'Far')
+	box(oDesign, 'Inside', 0)
+	box(oDesign, 'Outside', 0, cs='Far')
+	HFSSLibrary.globalCS(oDesign)
+	HFSSLibrary.drawSphere(oDesign, 0, 0, 0, 50, 'mm', 'vacuum', 'Global', 'AirSphere', .5)
+	HFSSLibrary.RadiationBoundary(oDesign, 'AirSphere', 'Rad')
+	assert kinds(validateIR(ir)) == [('outside', ('Outside', 'AirSphere'))]
+
+
+def test_duplicates_are_checked():
+	ir = GeometryIR()
+	oDesign = ir.design()
+	box(oDesign, 'A', 0, size=2)
+	#Copies 1 mm apart overlap the 2 mm box they are copied from
+	HFSSLibrary.duplicate_along_line(oDesign, [1, 0, 0], 'mm', 'A', 2)
+	assert kinds(validateIR(ir)) == [('overlap', ('A', 'A_1'))]
+
+
+def test_unknown_variables_are_reported():
+	ir = GeometryIR()
+	ir.design().SetActiveEditor("3D Modeler").CreateBox(
+		["NAME:BoxParameters", "XPosition:=", "gap", "YPosition:=", "0mm", "ZPosition:=", "0mm",
+		 "XSize:=", "1mm", "YSize:=", "1mm", "ZSize:=", "1mm"],
+		["NAME:Attributes", "Name:=", "A", "MaterialValue:=", "\"copper\""])
+	[issue] = validateIR(ir)
+	assert issue.kind == 'unresolved' and issue.objects == ['A']
+
+
+def test_grid_finds_the_same_pairs_as_brute_force():
+	random = np.random.RandomState(7)
+	lows = random.uniform(0, 20, (300, 3))
+	highs = lows + random.uniform(0.1, 2, (300, 3))
+	expected = [(i, j) for [i, j] in itertools.combinations(range(len(lows)), 2)
+				if np.all(lows[i] < highs[j] - 1e-9) and np.all(lows[j] < highs[i] - 1e-9)]
+	assert _overlappingPairs(lows, highs) == expected
+	assert _overlappingPairs(lows, highs, cell_size=0.5) == expected
@@ -0,0 +1,391 @@
+import gc
+
+import pytest
+
+from HFSSLibrary import (BooleanQueue, _design_contexts, applySources, applySourceStates, binarySubtraction, booleanBatch,
+						 commitVariables, drawPolygon, drawPolyline, duplicate_along_line, edit_sources, evaluateExpression,
+						 getDesignContext, getEditor, getFaceIDs, getModule, getObjectRegistry, getVariableCache,
+						 invalidateFaceIDs, invalidateSources, invalidateVariableCache, localVar, move,
+						 refreshDesignContext, releaseDesignContext, rotate, sweep_along_vector, unite, variableBatch)
+from fakes import FakeDesign
+
+
+def test_duplicate_along_line_names_match_the_modeler():
+	oDesign = FakeDesign(objects=['Box'])
+	assert duplicate_along_line(oDesign, [1, 0, 0], "mm", "Box", 3) == ['Box', 'Box_1', 'Box_2']
+	assert oDesign._editor._objects == ['Box', 'Box_1', 'Box_2']
+	assert 'Box_2' in getObjectRegistry(oDesign)
+
+
+def test_duplicate_along_line_skips_taken_names():
+	oDesign = FakeDesign(objects=['A', 'B', 'A_1'])
+	names = duplicate_along_line(oDesign, [0, 1, 0], "mm", ['A', 'B'], 2)
+	assert names == ['A', 'B', 'A_2', 'B_1']
+	assert set(names) <= set(oDesign._editor._objects)
+
+
+def polylineSegments(oDesign):
+	[args] = oDesign._editor._calls('CreatePolyline')
+	segments = [item for item in args[0] if isinstance(item, list) and item[0] == 'NAME:PolylineSegments'][0][1:]
+	return [[segment[2], segment[4], segment[6]] for segment in segments]
+
+
+def test_polyline_segments_cover_the_points():
+	oDesign = FakeDesign()
+	points = [[0, 0, 0], [1, 0, 0], [1, 1, 0], [2, 1, 0], [3, 1, 0]]
+	drawPolyline(oDesign, points, "mm", "Trace", [["Line", 2], ["Arc", 3], ["Line", 2]])
+	assert polylineSegments(oDesign) == [['Line', 0, 2], ['Arc', 1, 3], ['Line', 3, 2]]
+	assert 'Trace' in getObjectRegistry(oDesign)
+
+
+def test_polyline_segments_are_checked():
+	points = [[0, 0, 0], [1, 0, 0], [1, 1, 0], [2, 1, 0]]
+	for segments in ([["Line", 2], ["Line", 2]], [["Arc", 2], ["Line", 2], ["Line", 2]], [["Line", 1], ["Line", 2], ["Line", 2], ["Line", 2]]):
+		with pytest.raises(ValueError):
+			drawPolyline(FakeDesign(), points, "mm", "Trace", segments)
+	with pytest.raises(ValueError):
+		drawPolyline(FakeDesign(), [[0, 0, 0]], "mm", "Trace")
+
+
+def test_closed_polyline_repeats_its_first_point():
+	oDesign = FakeDesign()
+	drawPolyline(oDesign, [[0, 0, 0], [1, 0, 0], [1, 1, 0]], "mm", "Sheet", closed=True, covered=True)
+	assert polylineSegments(oDesign) == [['Line', 0, 2], ['Line', 1, 2], ['Line', 2, 2]]
+
+
+def test_draw_polygon_leaves_its_arguments_alone():
+	coords = [[0, 0, 0], [1, 0, 0], [1, 1, 0]]
+	node_ids = [1, 2, 3]
+	drawPolygon(FakeDesign(), coords, "mm", ["", "", "Poly"], node_id_list=node_ids)
+	assert coords == [[0, 0, 0], [1, 0, 0], [1, 1, 0]]
+	assert node_ids == [1, 2, 3]
+
+
+def test_variables_are_read_from_hfss_once():
+	oDesign = FakeDesign()
+	oDesign._variables['length'] = '2mm'
+	assert localVar(oDesign, 'width', 'length*2') == 'width'
+	assert localVar(oDesign, 'gap', '1mm') == 'gap'
+	assert 'length' in getVariableCache(oDesign)
+	assert len(oDesign._calls('GetVariables')) == 1
+	assert evaluateExpression(oDesign, 'width', 'mm') == pytest.approx(4)
+	assert len(oDesign._calls('GetVariableValue')) == 1
+
+
+def test_unchanged_value_is_not_sent_again():
+	oDesign = FakeDesign()
+	localVar(oDesign, 'width', '3mm')
+	localVar(oDesign, 'width', '3mm')
+	assert len(oDesign._calls('ChangeProperty')) == 1
+	localVar(oDesign, 'width', '4mm')
+	[new, changed] = [args[0][1][2][0] for args in oDesign._calls('ChangeProperty')]
+	assert [new, changed] == ['NAME:NewProps', 'NAME:ChangedProps']
+	assert oDesign._variables['width'] == '4mm'
+
+
+def test_invalidated_cache_sees_external_changes():
+	oDesign = FakeDesign()
+	localVar(oDesign, 'width', '3mm')
+	#Edited in the GUI
+	oDesign._variables['width'] = '5mm'
+	oDesign._variables['height'] = '1mm'
+	assert 'height' not in getVariableCache(oDesign)
+	invalidateVariableCache(oDesign)
+	assert 'height' in getVariableCache(oDesign)
+	assert getVariableCache(oDesign).get('width') == '5mm'
+	#The value HFSS has is 5mm, writing 3mm again is sent
+	localVar(oDesign, 'width', '3mm')
+	assert oDesign._variables['width'] == '3mm'
+
+
+#ChangeProperty fails while fail is set, like HFSS rejecting a value
+class FailingDesign(FakeDesign):
+
+	fail = False
+
+	def _answer(self, method, args):
+		if method == 'ChangeProperty' and self.fail:
+			raise RuntimeError('ChangeProperty failed')
+		return FakeDesign._answer(self, method, args)
+
+
+def sentProps(oDesign):
+	return [[args[0][1][2][0]] + [prop[0] for prop in args[0][1][2][1:]] for args in oDesign._calls('ChangeProperty')]
+
+
+def test_batch_queues_and_sends_new_before_changed():
+	oDesign = FakeDesign()
+	oDesign._variables['gap'] = '1mm'
+	with variableBatch(oDesign):
+		localVar(oDesign, 'gap', '2mm')
+		localVar(oDesign, 'width', 'length*2')
+		localVar(oDesign, 'length', '3mm')
+		assert oDesign._calls('ChangeProperty') == []
+	assert sentProps(oDesign) == [['NAME:NewProps', 'NAME:length', 'NAME:width'], ['NAME:ChangedProps', 'NAME:gap']]
+
+
+def test_nested_batches_send_when_the_outermost_exits():
+	oDesign = FakeDesign()
+	with variableBatch(oDesign):
+		with variableBatch(oDesign):
+			localVar(oDesign, 'a', '1mm')
+		assert oDesign._calls('ChangeProperty') == []
+		localVar(oDesign, 'b', 'a*2')
+	assert sentProps(oDesign) == [['NAME:NewProps', 'NAME:a', 'NAME:b']]
+
+
+def test_batch_that_raises_sends_nothing():
+	oDesign = FakeDesign()
+	with pytest.raises(ValueError):
+		with variableBatch(oDesign):
+			localVar(oDesign, 'a', '1mm')
+			raise ValueError('device failed')
+	assert oDesign._calls('ChangeProperty') == []
+	assert 'a' not in getVariableCache(oDesign)
+	#Nothing is left queued for the next batch
+	with variableBatch(oDesign):
+		localVar(oDesign, 'b', '2mm')
+	assert sentProps(oDesign) == [['NAME:NewProps', 'NAME:b']]
+
+
+def test_failed_commit_keeps_the_queue():
+	oDesign = FailingDesign()
+	oDesign.fail = True
+	with pytest.raises(RuntimeError):
+		with variableBatch(oDesign):
+			localVar(oDesign, 'a', '1mm')
+	#The cache does not believe a exists
+	assert 'a' not in getVariableCache(oDesign)
+	oDesign.fail = False
+	commitVariables(oDesign)
+	assert oDesign._variables == {'a': '1mm'}
+	assert getVariableCache(oDesign).new_props == {}
+
+
+def test_editor_and_modules_are_fetched_once_per_design():
+	oDesign = FakeDesign()
+	assert getEditor(oDesign) is getEditor(oDesign)
+	assert getModule(oDesign, 'BoundarySetup') is getModule(oDesign, 'BoundarySetup')
+	assert len(oDesign._calls('SetActiveEditor')) == 1
+	assert len(oDesign._calls('GetModule')) == 1
+	refreshDesignContext(oDesign)
+	getEditor(oDesign)
+	assert len(oDesign._calls('SetActiveEditor')) == 2
+
+
+def test_designs_have_their_own_context():
+	first = FakeDesign(name='Design1')
+	second = FakeDesign(name='Design2')
+	assert getDesignContext(first) is not getDesignContext(second)
+	assert getEditor(first) is first._editor
+	assert getEditor(second) is second._editor
+	localVar(first, 'a', '1mm')
+	assert 'a' in getVariableCache(first)
+	assert 'a' not in getVariableCache(second)
+
+
+def test_context_is_dropped_with_its_design():
+	oDesign = FakeDesign()
+	key = id(oDesign)
+	context = getDesignContext(oDesign)
+	assert _design_contexts[key] is context
+	del oDesign
+	gc.collect()
+	assert _design_contexts.get(key) is not context
+	assert context.oDesign is None
+
+
+def test_released_context_is_not_reused():
+	oDesign = FakeDesign()
+	context = getDesignContext(oDesign)
+	releaseDesignContext(oDesign)
+	assert getDesignContext(oDesign) is not context
+	assert not context.finalizer.alive
+
+
+def faceQueries(oDesign):
+	return [args[0] for args in oDesign._editor._calls('GetFaceIDs')]
+
+
+def test_face_ids_are_cached():
+	oDesign = FakeDesign(objects=['Box'])
+	faces = getFaceIDs(oDesign, 'Box')
+	assert faces == [7, 8, 9]
+	#The caller's copy can be changed without touching the cache
+	faces.append(10)
+	assert getFaceIDs(oDesign, 'Box') == [7, 8, 9]
+	assert faceQueries(oDesign) == ['Box']
+
+
+@pytest.mark.parametrize('operation, changed', [
+	(lambda oDesign: binarySubtraction(oDesign, 'A', 'B', True), ['A']),
+	(lambda oDesign: binarySubtraction(oDesign, ['A'], ['B'], False), ['A', 'B']),
+	(lambda oDesign: unite(oDesign, ['A', 'B']), ['A', 'B']),
+	(lambda oDesign: move(oDesign, [1, 0, 0], "mm", 'A'), ['A']),
+	(lambda oDesign: rotate(oDesign, "Z", 90, "deg", 'B'), ['B']),
+	(lambda oDesign: sweep_along_vector(oDesign, [0, 0, 1], 0, "Round", "mm", 'A'), ['A']),
+])
+def test_topology_changes_invalidate_face_ids(operation, changed):
+	oDesign = FakeDesign(objects=['A', 'B', 'C'])
+	for name in ('A', 'B', 'C'):
+		getFaceIDs(oDesign, name)
+	operation(oDesign)
+	for name in ('A', 'B', 'C'):
+		getFaceIDs(oDesign, name)
+	assert faceQueries(oDesign) == ['A', 'B', 'C'] + changed
+
+
+def test_invalidate_face_ids():
+	oDesign = FakeDesign(objects=['A', 'B'])
+	getFaceIDs(oDesign, 'A')
+	getFaceIDs(oDesign, 'B')
+	invalidateFaceIDs(oDesign, 'A,')
+	getFaceIDs(oDesign, 'A')
+	getFaceIDs(oDesign, 'B')
+	invalidateFaceIDs(oDesign)
+	getFaceIDs(oDesign, 'B')
+	assert faceQueries(oDesign) == ['A', 'B', 'A', 'B']
+
+
+def queued(booleans):
+	return [[group.kind, group.blanks, group.tools] for group in booleans.groups]
+
+
+def test_subtractions_with_the_same_tools_or_blanks_merge():
+	booleans = BooleanQueue()
+	booleans.add("Subtract", ['A'], ['T'], False)
+	booleans.add("Subtract", ['B'], ['T'], False)
+	booleans.add("Subtract", ['C'], ['T1'], False)
+	booleans.add("Subtract", ['C'], ['T2'], False)
+	assert queued(booleans) == [["Subtract", ['A', 'B'], ['T']], ["Subtract", ['C'], ['T1', 'T2']]]
+
+
+def test_unions_into_the_same_object_merge():
+	booleans = BooleanQueue()
+	booleans.add("Unite", ['A'], ['B'], False)
+	booleans.add("Unite", ['A'], ['C'], False)
+	booleans.add("Unite", ['D'], ['E'], False)
+	assert queued(booleans) == [["Unite", ['A'], ['B', 'C']], ["Unite", ['D'], ['E']]]
+
+
+def test_blank_that_is_a_tool_of_the_group_does_not_merge():
+	booleans = BooleanQueue()
+	booleans.assume_disjoint = True
+	booleans.add("Subtract", ['A'], ['B'], True)
+	booleans.add("Subtract", ['B'], ['C'], True)
+	booleans.add("Subtract", ['D'], ['A'], True)
+	assert queued(booleans) == [["Subtract", ['A'], ['B']], ["Subtract", ['B', 'D'], ['C', 'A']]]
+
+
+def test_order_after_a_touching_group_is_kept():
+	booleans = BooleanQueue()
+	booleans.add("Subtract", ['A'], ['T'], False)
+	booleans.add("Unite", ['A'], ['B'], False)
+	#Uses A, which the union changes, so it can not join the first subtraction
+	booleans.add("Subtract", ['A'], ['T2'], False)
+	#Does not touch the union, joins the first subtraction
+	booleans.add("Subtract", ['C'], ['T'], False)
+	assert queued(booleans) == [["Subtract", ['A', 'C'], ['T']], ["Unite", ['A'], ['B']], ["Subtract", ['A'], ['T2']]]
+
+
+def test_assume_disjoint_merges_any_subtractions():
+	for [assume_disjoint, count] in [(False, 2), (True, 1)]:
+		booleans = BooleanQueue()
+		booleans.assume_disjoint = assume_disjoint
+		booleans.add("Subtract", ['A'], ['T1'], False)
+		booleans.add("Subtract", ['B'], ['T2'], False)
+		assert len(booleans.groups) == count
+	#Kept and consumed tools never merge
+	booleans.add("Subtract", ['C'], ['T3'], True)
+	assert len(booleans.groups) == 2
+
+
+def test_batch_sends_merged_subtractions():
+	oDesign = FakeDesign(objects=['A', 'B', 'T'])
+	with booleanBatch(oDesign):
+		binarySubtraction(oDesign, 'A', 'T', True)
+		binarySubtraction(oDesign, 'B', 'T', True)
+		assert oDesign._editor._calls('Subtract') == []
+	[args] = oDesign._editor._calls('Subtract')
+	assert args[0] == ["NAME:Selections", "Blank Parts:=", "A,B", "Tool Parts:=", "T"]
+
+
+@pytest.mark.parametrize('operation, method', [
+	(lambda oDesign: getFaceIDs(oDesign, 'A'), 'GetFaceIDs'),
+	(lambda oDesign: move(oDesign, [1, 0, 0], "mm", 'A'), 'Move'),
+	(lambda oDesign: duplicate_along_line(oDesign, [1, 0, 0], "mm", 'A', 2), 'DuplicateAlongLine'),
+])
+def test_geometry_operations_flush_the_queue_first(operation, method):
+	oDesign = FakeDesign(objects=['A', 'C', 'T'])
+	with booleanBatch(oDesign):
+		binarySubtraction(oDesign, 'A', 'T', True)
+		#C is not queued, nothing is sent for it
+		getFaceIDs(oDesign, 'C')
+		assert oDesign._editor._calls('Subtract') == []
+		operation(oDesign)
+		methods = [method for [name, method, args] in oDesign._log if name == 'oEditor']
+		assert methods.index('Subtract') < methods.index(method, methods.index('GetFaceIDs')+1)
+	assert len(oDesign._editor._calls('Subtract')) == 1
+
+
+def test_batch_that_raises_sends_nothing_queued():
+	oDesign = FakeDesign(objects=['A', 'T'])
+	with pytest.raises(ValueError):
+		with booleanBatch(oDesign):
+			binarySubtraction(oDesign, 'A', 'T', False)
+			raise ValueError('device failed')
+	assert oDesign._editor._calls('Subtract') == []
+	assert not getDesignContext(oDesign).booleans.pending()
+	assert 'T' in getObjectRegistry(oDesign)
+
+
+def sentSources(oDesign):
+	return [[args[1][1:], args[3][1:], args[4][1:]] for args in getModule(oDesign, "Solutions")._calls('EditSources')]
+
+
+def test_only_changed_sources_are_sent():
+	oDesign = FakeDesign()
+	ports = ['P1', 'P2', 'P3']
+	assert applySources(oDesign, ports, [1, 1, 1], [1, 1, 1], [0, 90, 180], "W", "deg") == ports
+	assert applySources(oDesign, ports, [1, 1, 1], [1, 1, 1], [0, 45, 180], "W", "deg") == ['P2']
+	assert sentSources(oDesign)[1] == [['P2'], ['1.000000W'], ['45.000000deg']]
+	#edit_sources records what it sent as well
+	edit_sources(oDesign, ['P1'], [1], [2], [0], "W", "deg")
+	assert applySources(oDesign, ports, [1, 1, 1], [1, 1, 1], [0, 45, 180], "W", "deg") == ['P1']
+
+
+def test_same_state_makes_no_call():
+	oDesign = FakeDesign()
+	applySources(oDesign, ['P1', 'P2'], [1, 1], [1, 1], [0, 90], "W", "deg")
+	assert applySources(oDesign, ['P1', 'P2'], [1, 1], [1, 1], [0, 90], "W", "deg") == []
+	assert len(sentSources(oDesign)) == 1
+	invalidateSources(oDesign)
+	assert applySources(oDesign, ['P1', 'P2'], [1, 1], [1, 1], [0, 90], "W", "deg") == ['P1', 'P2']
+
+
+def test_states_are_exported_in_order():
+	oDesign = FakeDesign()
+	ports = ['P1', 'P2']
+	states = [([1, 1], [0, 0]), ([1, 1], [0, 90]), ([1, 1], [0, 90]), ([1, 1], [0, 180])]
+	exported = []
+	def export(oDesign, index):
+		exported.append([index, len(sentSources(oDesign))])
+		return 'beam%d' % index
+	assert applySourceStates(oDesign, ports, states, export, "W", "deg") == ['beam0', 'beam1', 'beam2', 'beam3']
+	#Every export sees its own state sent, the repeated state sends nothing
+	assert exported == [[0, 1], [1, 2], [2, 2], [3, 3]]
+	assert [phases for [names, amplitudes, phases] in sentSources(oDesign)] == [
+		['0.000000deg', '0.000000deg'], ['90.000000deg'], ['180.000000deg']]
+	assert getModule(oDesign, "Solutions")._calls('EditSources')[0][2] == ["NAME:Modes", '1', '1']
+
+
+def test_polygon_variables_exist_before_the_polygon():
+	oDesign = FakeDesign()
+	with variableBatch(oDesign):
+		drawPolygon(oDesign, [[0, 0, 0], [1, 0, 0], [1, 1, 0]], "mm", ["", "", "Poly"], node_id_list=[1, 2, 3])
+		methods = [method for [name, method, args] in oDesign._log if method in ('ChangeProperty', 'CreatePolyline')]
+		assert methods == ['ChangeProperty', 'CreatePolyline']
+	assert set(oDesign._variables) == set('%s%d' % (axis, node) for axis in 'xyz' for node in (1, 2, 3))
+	[args] = oDesign._editor._calls('CreatePolyline')
+	points = [item for item in args[0][0] if isinstance(item, list) and item[0] == 'NAME:PolylinePoints'][0][1:]
+	assert points[0] == ["NAME:PLPoint", "X:=", "x1", "Y:=", "y1", "Z:=", "z1"]
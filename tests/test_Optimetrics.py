@@ -0,0 +1,47 @@
+import pytest
+
+from HFSSLibrary import localVar
+from Optimetrics import parametricSetup
+from fakes import FakeDesign
+
+
+def design():
+	oDesign = FakeDesign()
+	localVar(oDesign, 'patchL', '28.6mm')
+	localVar(oDesign, 'eps', '4.4')
+	localVar(oDesign, 'patchW', 'patchL*1.3')
+	return oDesign
+
+
+def sweep(oDesign):
+	[args] = oDesign._modules['Optimetrics']._calls('InsertSetup')
+	setup = args[1]
+	definitions = [item for item in setup if isinstance(item, list) and item[0] == 'NAME:Sweeps'][0][1:]
+	operations = [item for item in setup if isinstance(item, list) and item[0] == 'NAME:Sweep Operations'][0]
+	first = [definition[definition.index('Data:=')+1] for definition in definitions]
+	return [first] + operations[2::2]
+
+
+def test_units_come_from_the_variables():
+	oDesign = design()
+	parametricSetup(oDesign, {'patchL': [28, 29], 'eps': [4.4, 4.5]}, "Setup1")
+	assert sweep(oDesign) == [['28.000000mm', '4.400000'], ['29.000000mm', '4.500000']]
+
+
+def test_given_units_win():
+	oDesign = design()
+	parametricSetup(oDesign, [[1.1], [1.2]], "Setup1", units={'patchL': 'in'}, columns=['patchL'])
+	assert sweep(oDesign) == [['1.100000in'], ['1.200000in']]
+
+
+def test_expression_variables_need_units():
+	oDesign = design()
+	with pytest.raises(ValueError):
+		parametricSetup(oDesign, {'patchW': [38, 39]}, "Setup1")
+	#Expressions in the table are written as they are
+	parametricSetup(design(), {'patchW': ['patchL*1.2', 'patchL*1.4']}, "Setup1")
+
+
+def test_unknown_variables():
+	with pytest.raises(KeyError):
+		parametricSetup(design(), {'gap': [1]}, "Setup1", units="mm")
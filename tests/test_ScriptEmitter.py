@@ -0,0 +1,47 @@
+import os
+
+from ScriptEmitter import ScriptEmitter, ScriptValue
+from HFSSLibrary import openHFSS
+from EmagDevices import rectangular_patch
+
+#Set UPDATE_GOLDEN=1 to rewrite the golden scripts after an intended change
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+
+def patchAntennaScript():
+	emitter = ScriptEmitter()
+	[oAnsys, oDesktop] = openHFSS(emitter=emitter)
+	oProject = oDesktop.NewProject()
+	oDesign = oProject.InsertDesign("HFSS", "Patch", "DrivenModal", "")
+	rectangular_patch(oDesign, 28.6, 38, 8.3, 0, 60, 71, 1.5748, "FR4_epoxy", "mm", "Global", "Patch")
+	return emitter
+
+
+def test_patch_antenna_script():
+	script = patchAntennaScript().script()
+	path = os.path.join(GOLDEN, 'patch_antenna.txt')
+	if os.environ.get('UPDATE_GOLDEN'):
+		with open(path, 'w') as golden_file:
+			golden_file.write(script)
+	with open(path) as golden_file:
+		assert script == golden_file.read()
+
+
+def test_same_build_same_digest():
+	assert patchAntennaScript().digest() == patchAntennaScript().digest()
+
+
+def test_save_keeps_identical_script(tmp_path):
+	emitter = patchAntennaScript()
+	path = str(tmp_path / 'build.py')
+	assert emitter.save(path)
+	assert not patchAntennaScript().save(path)
+
+
+def test_queries_are_script_values():
+	emitter = ScriptEmitter()
+	oEditor = emitter.desktop().NewProject().InsertDesign("HFSS", "x", "DrivenModal", "").SetActiveEditor("3D Modeler")
+	faces = oEditor.GetFaceIDs("Box1")
+	assert isinstance(faces, ScriptValue)
+	assert repr(faces[0]) == '_query1[0]'
+	assert emitter.lines[-1] == '_query1 = [int(face) for face in oEditor.GetFaceIDs("Box1")]'
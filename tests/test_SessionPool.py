@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+import HFSSLibrary
+from SessionPool import SessionPool, designJob
+from fakes import FakeDesktop
+
+
+class DesktopFactory(object):
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.desktops = []
+
+	def __call__(self):
+		desktop = FakeDesktop(name='oDesktop%d' % len(self.desktops))
+		with self.lock:
+			self.desktops.append(desktop)
+		return desktop
+
+
+def test_sessions_are_limited_to_the_pool_size():
+	factory = DesktopFactory()
+	lock = threading.Lock()
+	running = [0, 0]
+	def job(oDesktop, index):
+		with lock:
+			running[0] += 1
+			running[1] = max(running)
+		time.sleep(0.01)
+		with lock:
+			running[0] -= 1
+		return [index, oDesktop]
+	with SessionPool(3, factory) as pool:
+		results = pool.map(job, range(12))
+	assert [index for [index, oDesktop] in results] == list(range(12))
+	assert len(factory.desktops) == 3
+	assert running[1] <= 3
+	#Sessions go back to the pool after each job and run the next one
+	assert set(oDesktop for [index, oDesktop] in results) <= set(factory.desktops)
+
+
+def test_close_quits_every_desktop():
+	factory = DesktopFactory()
+	pool = SessionPool(2, factory)
+	pool.close()
+	assert all(desktop._calls('QuitApplication') == [()] for desktop in factory.desktops)
+	with pytest.raises(RuntimeError):
+		pool.submit(lambda oDesktop: None)
+
+
+def test_job_errors_reach_the_future():
+	def job(oDesktop):
+		raise ValueError('no licence')
+	with SessionPool(1, DesktopFactory()) as pool:
+		future = pool.submit(job)
+		with pytest.raises(ValueError):
+			future.result(5)
+		#The session survives a failed job
+		assert pool.submit(lambda oDesktop: 42).result(5) == 42
+
+
+def test_sessions_that_do_not_start_fail_the_jobs():
+	def factory():
+		raise OSError('HFSS did not start')
+	pool = SessionPool(2, factory)
+	future = pool.submit(lambda oDesktop: None)
+	with pytest.raises(OSError):
+		future.result(5)
+	pool.close()
+
+
+def test_design_job_closes_its_project():
+	def build(oDesign, length):
+		HFSSLibrary.getEditor(oDesign)
+		return length * 2
+	factory = DesktopFactory()
+	contexts = len(HFSSLibrary._design_contexts)
+	with SessionPool(2, factory) as pool:
+		assert pool.map(designJob(build, setup="Setup1"), [1, 2, 3]) == [2, 4, 6]
+	for desktop in factory.desktops:
+		assert desktop._projects == []
+		assert len(desktop._calls('CloseProject')) == len(desktop._calls('NewProject'))
+	analyzed = [args for desktop in factory.desktops for [name, method, args] in desktop._log if method == 'Analyze']
+	assert analyzed == [("Setup1",)] * 3
+	assert len(HFSSLibrary._design_contexts) == contexts
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from Units import convert, unitScale, valueString, valueStrings
+
+
+def test_unit_scale():
+	assert unitScale('mm') == 1e-3
+	assert unitScale('MM') == 1e-3
+	assert unitScale('deg') == pytest.approx(np.pi/180)
+	with pytest.raises(ValueError):
+		unitScale('furlong')
+
+
+def test_convert():
+	assert convert(1, 'in', 'mil') == pytest.approx(1000)
+	values = convert([[1, 2, 3]], 'mil', 'mm')
+	assert isinstance(values, np.ndarray)
+	assert values.shape == (1, 3)
+	assert np.allclose(values, [[0.0254, 0.0508, 0.0762]])
+
+
+def test_small_and_bulk_strings_agree():
+	values = np.linspace(-3, 7, 40)
+	for count in (0, 1, 15, 16, 40):
+		assert valueStrings(values[:count], 'mm') == [valueString(value, 'mm') for value in values[:count]]
+	assert valueStrings([1, 2.5], 'mm') == ['1.000000mm', '2.500000mm']
+
+
+def test_nested_strings_keep_their_shape():
+	coords = np.arange(60, dtype=float).reshape(20, 3)
+	strings = valueStrings(coords, 'mil')
+	assert len(strings) == 20 and all(len(point) == 3 for point in strings)
+	assert strings[19] == ['57.000000mil', '58.000000mil', '59.000000mil']
+	assert valueStrings([[1, 2], [3, 4]], '') == [['1.000000', '2.000000'], ['3.000000', '4.000000']]
+
+
+def test_units_with_percent():
+	assert valueStrings([50] * 20, '%')[0] == '50.000000%'
@@ -0,0 +1,52 @@
+import pytest
+
+from HFSSLibrary import variable_ordering
+from VariableGraph import VariableGraph, dependencyNames
+
+
+def test_order_puts_variables_after_those_they_use():
+	graph = VariableGraph({'gap': 'w-l', 'w': 'l*2', 'l': '3mm'})
+	order = graph.order()
+	assert sorted(order) == ['gap', 'l', 'w']
+	assert order.index('l') < order.index('w') < order.index('gap')
+
+
+def test_whole_names_only():
+	#subXY*2 uses subXY, not subX
+	graph = VariableGraph({'subXY': 'subX*2', 'subX': '1mm', 'top': 'subXY*2'})
+	assert graph.uses('top') == ['subXY']
+	assert dependencyNames('5mm+subXY') == ['subXY']
+	order = graph.order()
+	assert order.index('subX') < order.index('subXY') < order.index('top')
+
+
+def test_cycle_is_named():
+	graph = VariableGraph({'a': 'b+1mm', 'b': 'c*2', 'c': 'a', 'd': '1mm'})
+	with pytest.raises(ValueError) as error:
+		graph.order()
+	assert 'a -> b -> c -> a' in str(error.value)
+	with pytest.raises(ValueError):
+		VariableGraph({'a': 'a+1mm'}).order()
+
+
+def test_alias_of_itself_is_no_cycle():
+	#localVar leaves a variable whose value is its own name alone
+	graph = VariableGraph({'a': 'a', 'b': 'a*2'})
+	assert graph.order() == ['a', 'b']
+
+
+def test_dependents_and_limited_order():
+	graph = VariableGraph({'l': '3mm', 'w': 'l*2', 'gap': 'w-l', 'h': '1mm'})
+	assert graph.dependents('l') == {'w', 'gap'}
+	assert graph.dependents('h') == set()
+	#Dependencies outside names are taken as defined
+	assert graph.order(['gap', 'w']) == ['w', 'gap']
+
+
+def test_values_that_are_not_expressions():
+	assert dependencyNames('[1, 2, length]') == ['length']
+	assert dependencyNames(3.5) == []
+
+
+def test_variable_ordering_indices():
+	assert variable_ordering(['w*2', '3mm', '1mm', '5mm'], ['gap', 'w', 'l', '']) == [3, 1, 2, 0]